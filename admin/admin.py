@@ -1,12 +1,36 @@
-from flask import Blueprint, redirect, flash, url_for, render_template, current_app
-from flask_security import roles_required
-from models.models import db, User, Role, ParkingLots, ParkingSpot, ReservedSpots
+from flask import (Blueprint, redirect, flash, url_for, render_template, current_app, request, jsonify, Response,
+                   stream_with_context)
+from flask_security import roles_required, auth_required
+from models.models import db, User, Role, ParkingLots, ParkingSpot, ReservedSpots, ReservationHistory, LotTariff, AnprEvent
 from sqlalchemy.exc import SQLAlchemyError
-from forms.forms import ParkingLotForm, DeleteForm, ViewSpotForm, LotSearchForm
-from datetime import datetime
+from forms.forms import ParkingLotForm, DeleteForm, ViewSpotForm, LotSearchForm, ResetMetricsForm
+from datetime import datetime, timedelta
 from pytz import timezone, UTC
 from decimal import Decimal
+import json
+import time
 from sqlalchemy import func, case, and_
+from services.availability import adjust_counts, reset_counts, reconcile
+from services.revenue import backfill
+from services.search import search_lots, lot_changed, lot_removed, rebuild
+from services.pagination import keyset_page, page_size, InvalidCursor
+from services.provisioning import provision_lot, resize_lot, reactivate_lot, ProvisioningError
+from services.querystats import route_stats, reset_stats
+from services.livefeed import publish_spot, publish_lot, prune
+from services.spotmap import spot_bitmaps, MAX_LOTS
+from services.tariff import tariff_for, charge, settle_day
+from services.checkout import checkout, CheckoutError
+from services.metrics import release_outcome, anpr_outcome
+from services.replica import read_replica
+from services.versions import conditional, tag, lot_versions
+from services.summarycache import invalidate, cache as summary_cache
+from services.archive import archive_closed, BATCH_SIZE as ARCHIVE_BATCH
+from services.export import export, filename, parse_day, ExportError, DATASETS, FORMATS
+from services.onboarding import (import_lots, read_rows, format_for, OnboardingError, FORMATS as LOT_FORMATS,
+                                 BATCH_SIZE as IMPORT_BATCH)
+from services.anpr import pipeline, parse_event, EventError, QueueFull, ShuttingDown, MAX_EVENTS
+import click
+import io
 
 
 ist = timezone('Asia/Kolkata')
@@ -16,35 +40,41 @@ admin_bp = Blueprint('admin', __name__, url_prefix='/admin' , template_folder='t
 
 @admin_bp.route('/dashboard' , methods = ['Get' , 'POST'])
 @roles_required('admin')
+@read_replica
 def dashboard():
-    lots_query = (
-        db.session.query(
-            ParkingLots,
-            func.count(
-                case((ParkingSpot.status == 'O', 1))
-            ).label('occupied')
-        )
-        .outerjoin(ParkingSpot, and_(ParkingLots.id == ParkingSpot.lot_id,
-                                     ParkingSpot.active == True))
-        .filter(ParkingLots.active == True)   # only active lots
-        .group_by(ParkingLots.id)
-        .all()
-    )
+    try:
+        lots, next_cursor = keyset_page(ParkingLots.query.filter_by(active = True), [ParkingLots.id],   # only active lots
+                                        request.args.get('cursor'), page_size(request.args.get('size')))
+    except InvalidCursor:
+        return redirect(url_for('admin.dashboard'))
 
+    # spots are drawn in the browser from admin.spot_bitmap, the page only carries lot level data
+    return render_template('admin_dash.html' , parking_lots = lots ,
+                           next_cursor = next_cursor , paged = 'cursor' in request.args)
 
 
 
-    filtered_spots = {}
-    lots = []
+def _requested_lots():
+    return list(dict.fromkeys(int(lot_id) for lot_id in request.args.get('lots', '').split(',')
+                              if lot_id.strip().isdigit()))
 
-    for lot_obj, occupied in lots_query:
-        lot_obj.occupied = occupied
-        filtered_spots[lot_obj] = [s for s in lot_obj.spots if s.active]
-        lots.append(lot_obj)
 
+def _spot_bitmap_etag():
+    lot_ids = _requested_lots()
+    versions = lot_versions(lot_ids)   # the lots' own counters, parking_spot is not read
+    return tag('spot-bitmaps', [(lot_id, versions.get(lot_id)) for lot_id in lot_ids])
 
 
-    return render_template('admin_dash.html' , parking_lots = lots , spots = filtered_spots)
+@admin_bp.route('/api/spot-bitmaps' , methods = ['GET'])
+@roles_required('admin')
+@conditional(_spot_bitmap_etag)
+def spot_bitmap():
+    lot_ids = _requested_lots()
+
+    if not lot_ids or len(lot_ids) > MAX_LOTS:
+        return jsonify({"error": f"lots must list 1 to {MAX_LOTS} lot ids"}), 400
+
+    return jsonify({"lots": spot_bitmaps(lot_ids)})
 
 
 
@@ -64,6 +94,9 @@ def spot_view(spot_id):
                 if lot and lot.maxspots > 0:
                     lot.maxspots -= 1
 
+                adjust_counts(spot.lot_id, available = -1)
+                publish_spot(spot.lot_id, spot.id, spot.spot_no, None)
+
                 db.session.commit()
                 flash("Spot Deleted", 'success')
                 return redirect(url_for('admin.dashboard'))
@@ -89,22 +122,16 @@ def spot_details(spot_id):
 
     spot = ParkingSpot.query.filter_by(id=spot_id, active=True).first_or_404()
 
-    reservation = (ReservedSpots.query.filter(ReservedSpots.spot_id == spot_id,ReservedSpots.spot.has(active=True))
+    reservation = (ReservedSpots.query.filter(ReservedSpots.spot_id == spot_id, ReservedSpots.leaving_time == None)
     .first_or_404())
 
-    now_utc = UTC.localize(datetime.utcnow())
-
     if reservation.parking_time.tzinfo is None:
         parking_time_utc = UTC.localize(reservation.parking_time)
     else:
         parking_time_utc = reservation.parking_time
 
-
     ist_parked = parking_time_utc.astimezone(ist)
-    #ist_parked = reservation.parking_time.astimezone(ist)
-    now_ist = now_utc.astimezone(ist)
-    elapsed_time = now_ist - ist_parked
-    cost = (Decimal(elapsed_time.total_seconds()) / Decimal(3600)) * reservation.rate_at_booking
+    cost = charge(tariff_for(spot.lot_id, reservation.rate_at_booking), parking_time_utc, datetime.now(UTC))
     form = ViewSpotForm(obj=reservation)
     form.parking_time.data = ist_parked  
     form.spot_no.data = spot.spot_no
@@ -117,8 +144,14 @@ def spot_details(spot_id):
 @admin_bp.route('/user-list' , methods = [ 'GET'])
 @roles_required('admin')
 def user_list():
-    users = User.query.filter(~User.roles.any(Role.name == 'admin')).all()
-    return render_template ('registered_users.html' , users = users )
+    try:
+        users, next_cursor = keyset_page(User.query.filter(~User.roles.any(Role.name == 'admin')), [User.id],
+                                         request.args.get('cursor'), page_size(request.args.get('size')))
+    except InvalidCursor:
+        return redirect(url_for('admin.user_list'))
+
+    return render_template ('registered_users.html' , users = users , next_cursor = next_cursor ,
+                            paged = 'cursor' in request.args)
 
 
 @admin_bp.route('/parking-lot/delete/<int:lot_id>' , methods = [ 'GET'])
@@ -138,6 +171,9 @@ def lot_delete(lot_id = None):
             spot.active = False
 
         lot.active = False
+        reset_counts(lot.id)
+        lot_removed(lot.id)
+        publish_lot(lot.id)
         db.session.commit()
         flash("Parking lot deleted successfully.", "success")
 
@@ -151,6 +187,7 @@ def lot_delete(lot_id = None):
 
 @admin_bp.route('/lot-search' , methods = ['GET', 'POST'])
 @roles_required('admin')
+@read_replica
 def lot_search():
     form = LotSearchForm()
 
@@ -163,21 +200,18 @@ def lot_search():
         query_data = form.query.data.strip()
 
         if selected_option ==  'user_id':
-            lots = db.session.query(ParkingLots).join(ParkingSpot).join(ReservedSpots).filter(ReservedSpots.user_id == query_data)\
-            .distinct().all()
+            lots = db.session.query(ParkingLots).join(ParkingSpot).join(ReservationHistory, ReservationHistory.spot_id == ParkingSpot.id)\
+            .filter(ReservationHistory.user_id == query_data).distinct().all()
             data['header'] = "Parking Lots Used By User-"
 
         elif selected_option == 'address':
-            lots = ParkingLots.query.filter(ParkingLots.address.ilike(f"%{query_data}%")).all()
+            lots = search_lots(query_data)
             data['header'] = "Parking Lot At Following Address-"
 
         elif selected_option == 'pincode':
             data['header'] = "Parking Lots With Pincode-"
             lots = ParkingLots.query.filter(ParkingLots.pincode == query_data ).all()
 
-        for lot in lots:
-            lot.occupied = sum(1 for spot in lot.spots if spot.status == 'O')
-
 
     return render_template('admin_search.html' , form = form , lots = lots , data = data )
 
@@ -196,53 +230,24 @@ def edit_lot(lot_id = None):
         form = ParkingLotForm(obj = lot)
 
         if form.validate_on_submit():
-            occupied_count = ParkingSpot.query.filter_by(lot_id=lot.id, status='O', active = True).count()
-            new_max_spots = form.maxspots.data
-
-            if new_max_spots < occupied_count:
-                flash("Cannot set max spots below number of occupied spots.", "danger")
-                return render_template('edit_lot.html', form=form, data = _data )
-
-
             lot.primename = form.primename.data.strip()
             lot.address = form.address.data.strip()
             lot.pincode = form.pincode.data.strip()
             lot.price = round(form.price.data,2)
 
             try:
-                if new_max_spots < lot.maxspots:
-                    excess_spots = (ParkingSpot.query.filter_by(lot_id=lot.id, status='A', active = True) .order_by(ParkingSpot.spot_no.desc())
-                    .limit(lot.maxspots - new_max_spots).all())
-
-                    for spot in excess_spots:
-                        spot.active = False
-
-
-                elif new_max_spots > lot.maxspots:  # check for adition
-                    last_spot = ParkingSpot.query.filter_by(lot_id=lot_id).order_by(ParkingSpot.spot_no.desc()).first() #all spots required active and deactivated
-                    deactivated_spots = ParkingSpot.query.filter_by(lot_id=lot_id , active = False).order_by(ParkingSpot.spot_no.desc()).all()
-                    total_spots = ParkingSpot.query.filter_by(lot_id=lot_id , active = True).count()
-                    spots_to_add = new_max_spots - total_spots
-
-                    for deac_spot in deactivated_spots:  #consume deactivated spots first
-                        if spots_to_add <= 0:
-                            break 
-                        deac_spot.active = True 
-                        spots_to_add -= 1 
-
-                    if spots_to_add > 0:
-                        start_no = last_spot.spot_no + 1 if last_spot else 1
-                        for spot_no in range(start_no, start_no + spots_to_add):
-                            new_spot = ParkingSpot(lot_id=lot_id, spot_no=spot_no, status='A', active=True)
-                            db.session.add(new_spot)
-
-
-
-                lot.maxspots = new_max_spots
+                resize_lot(lot, form.maxspots.data)
+                lot_changed(lot)
+                invalidate('lots', 'usage')   # chart labels carry the lot name
                 db.session.commit()
                 flash('Parking lot Updated', 'success')
                 return redirect(url_for('admin.dashboard'))
 
+            except ProvisioningError as error:
+                db.session.rollback()
+                flash(str(error), "danger")
+                return render_template('edit_lot.html', form=form, data = _data )
+
             except SQLAlchemyError:
                 current_app.logger.exception("Failed to update parking lot")
                 db.session.rollback()
@@ -274,15 +279,8 @@ def edit_lot(lot_id = None):
             try:
                 db.session.add(new_lot)
                 db.session.flush()
-
-                for i in range(1 , new_lot.maxspots+1):
-                    spot = ParkingSpot(
-                        lot_id = new_lot.id,
-                        spot_no = i,
-                        status = 'A'
-                    ) 
-                    db.session.add(spot)
-
+                lot_changed(new_lot)
+                provision_lot(new_lot)
                 db.session.commit()
                 flash("Created new lot and Spots", "success")
                 return redirect(url_for('admin.dashboard'))
@@ -297,3 +295,378 @@ def edit_lot(lot_id = None):
 
     return render_template('edit_lot.html', form = form, data = _data)
 
+
+
+@admin_bp.route('/api/checkout', methods = ['POST'])
+@auth_required('token', 'session')
+@roles_required('admin')
+def bulk_checkout():
+    data = request.get_json(silent = True) or {}
+
+    try:
+        results = checkout(data.get('items'))
+        db.session.commit()
+
+    except CheckoutError as error:
+        db.session.rollback()
+        return jsonify({"error": str(error)}), 400
+
+    except SQLAlchemyError:
+        current_app.logger.exception("Bulk checkout failed")
+        db.session.rollback()
+        release_outcome('error', len(data.get('items') or []))
+        return jsonify({"error": "Checkout failed, nothing was released"}), 500
+
+    released = [result for result in results if result['status'] == 'released']
+    release_outcome('success', len(released))
+    if len(released) < len(results):
+        release_outcome('not_found', len(results) - len(released))
+
+    return jsonify({"released": len(released), "results": results,
+                    "total_cost": str(sum((Decimal(result['cost']) for result in released), Decimal('0.00')))})
+
+
+
+@admin_bp.route('/api/lots/import', methods = ['POST'])
+@auth_required('token', 'session')
+@roles_required('admin')
+def import_lots_upload():
+    upload = request.files.get('file')
+    start_row = request.form.get('start_row', '1')
+    if upload is None:
+        return jsonify({"error": "Upload the lots as the file field"}), 400
+    if not start_row.isdigit():
+        return jsonify({"error": "start_row must be a row number"}), 400
+
+    try:
+        rows = read_rows(io.TextIOWrapper(upload.stream, encoding = 'utf-8-sig', newline = ''),
+                         format_for(upload.filename, request.form.get('format')))
+        report = import_lots(rows, start_row = int(start_row), dry_run = request.form.get('dry_run') in ('1', 'true'))
+
+    except OnboardingError as error:
+        db.session.rollback()
+        return jsonify({"error": str(error)}), 400
+
+    except UnicodeDecodeError:
+        db.session.rollback()
+        return jsonify({"error": "The file must be UTF-8 text"}), 400
+
+    if report['resume_from'] is not None:
+        current_app.logger.error("Lot import stopped at row %s: %s", report['resume_from'], report['failure'])
+        return jsonify(report), 500
+
+    return jsonify(report)
+
+
+@admin_bp.route('/api/export/<dataset>', methods = ['GET'])
+@roles_required('admin')
+@read_replica
+def export_data(dataset):
+    fmt = request.args.get('format', 'csv')
+    compress = request.args.get('gzip', '') in ('1', 'true')
+    lot = request.args.get('lot', '')
+
+    try:
+        if lot and not lot.isdigit():
+            raise ExportError("lot must be a lot id")
+        start, end = parse_day(request.args.get('from'), 'from'), parse_day(request.args.get('to'), 'to')
+        lot_id = int(lot) if lot else None
+        chunks = export(dataset, fmt, start, end, lot_id, compress)
+    except ExportError as error:
+        return jsonify({"error": str(error)}), 400
+
+    # the context stays open while the body streams, the rows are read as the client downloads them
+    return Response(stream_with_context(chunks), mimetype = 'application/gzip' if compress else FORMATS[fmt],
+                    headers = {'Content-Disposition': f'attachment; filename="{filename(dataset, fmt, start, end, lot_id, compress)}"',
+                               'X-Accel-Buffering': 'no'})
+
+
+@admin_bp.route('/api/anpr/events', methods = ['POST'])
+@auth_required('token', 'session')
+@roles_required('admin')
+def anpr_events():
+    data = request.get_json(silent = True)
+    items = data.get('events') if isinstance(data, dict) and 'events' in data else [data]   # one event or a batch
+
+    if not isinstance(items, list) or not items or len(items) > MAX_EVENTS:
+        return jsonify({"error": f"send one event or 1 to {MAX_EVENTS} under \"events\""}), 400
+
+    received = datetime.now(UTC)
+    try:
+        events = [parse_event(item, received) for item in items]
+        duplicates = pipeline.offer(current_app._get_current_object(), events)
+
+    except EventError as error:
+        return jsonify({"error": str(error)}), 400
+
+    except QueueFull:
+        anpr_outcome('throttled', len(events))
+        return jsonify({"error": "Ingestion queue is full, retry"}), 429, {'Retry-After': '1'}
+
+    except ShuttingDown:
+        return jsonify({"error": "Shutting down, retry"}), 503, {'Retry-After': '1'}
+
+    anpr_outcome('accepted', len(events) - duplicates)
+    anpr_outcome('duplicate', duplicates)
+    return jsonify({"accepted": len(events) - duplicates, "duplicates": duplicates, "queued": pipeline.depth()}), 202
+
+
+@admin_bp.route('/api/anpr/events/<path:event_id>', methods = ['GET'])
+@auth_required('token', 'session')
+@roles_required('admin')
+def anpr_event(event_id):
+    event = AnprEvent.query.filter_by(event_key = event_id).first()
+    if event is None:   # unknown, or still queued
+        return jsonify({"event_id": event_id, "status": "unknown"}), 404
+
+    return jsonify({"event_id": event.event_key, "type": event.kind, "vehicle_number": event.vehicle_number,
+                    "lot_id": event.lot_id, "status": event.status, "detail": event.detail,
+                    "reservation_id": event.reservation_id})
+
+
+
+@admin_bp.route('/metrics', methods = ['GET', 'POST'])
+@roles_required('admin')
+def metrics():
+    form = ResetMetricsForm()
+
+    if form.validate_on_submit():
+        reset_stats()
+        flash("Metrics reset", "success")
+        return redirect(url_for('admin.metrics'))
+
+    return render_template('metrics.html', routes = route_stats(), form = form,
+                           warn_statements = current_app.config['SQL_WARN_STATEMENTS'],
+                           warn_repeats = current_app.config['SQL_WARN_REPEATS'])
+
+
+
+@admin_bp.cli.command('reconcile-availability')
+@click.option('--dry-run', is_flag = True, help = 'Only report drift, do not rewrite the counters.')
+def reconcile_availability(dry_run):
+    """Rebuild per-lot availability counters from parking_spot."""
+    drift = reconcile(fix = not dry_run)
+
+    for lot_id, (available, occupied), (actual_available, actual_occupied) in drift:
+        click.echo(f"Lot {lot_id}: stored {available} available/{occupied} occupied, "
+                   f"actual {actual_available}/{actual_occupied}")
+
+    if not drift:
+        click.echo("Availability counters are in sync.")
+    elif dry_run:
+        click.echo(f"{len(drift)} lot(s) drifted, run without --dry-run to fix.")
+    else:
+        click.echo(f"Fixed {len(drift)} lot(s).")
+
+
+@admin_bp.cli.command('backfill-revenue')
+@click.option('--batch-size', default = 5000, show_default = True)
+def backfill_revenue(batch_size):
+    """Rebuild the daily revenue rollups from all closed reservations."""
+    read = backfill(batch_size = batch_size)
+    click.echo(f"Rebuilt revenue rollups from {read} closed reservation(s).")
+
+
+@admin_bp.cli.command('archive-reservations')
+@click.option('--days', type = int, help = 'Archive reservations closed more than this many days ago '
+                                          '(default ARCHIVE_AFTER_DAYS).')
+@click.option('--batch-size', default = ARCHIVE_BATCH, show_default = True)
+def archive_reservations(days, batch_size):
+    """Move old closed reservations from reserved_spots to reserved_spots_archive."""
+    before = None if days is None else datetime.now(UTC) - timedelta(days = days)
+    moved = archive_closed(before, batch_size = batch_size)
+    click.echo(f"Archived {moved} reservation(s).")
+
+
+@admin_bp.cli.command('export')
+@click.argument('dataset', type = click.Choice(DATASETS))
+@click.option('--format', 'fmt', type = click.Choice(list(FORMATS)), default = 'csv', show_default = True)
+@click.option('--from', 'start', type = click.DateTime(['%Y-%m-%d']), help = 'First IST day to include.')
+@click.option('--to', 'end', type = click.DateTime(['%Y-%m-%d']), help = 'Last IST day to include.')
+@click.option('--lot', 'lot_id', type = int, help = 'Only this lot.')
+@click.option('--gzip', 'compress', is_flag = True, help = 'Gzip the output, implied by an --output ending in .gz.')
+@click.option('--output', '-o', type = click.Path(dir_okay = False), help = 'File to write (default: stdout).')
+def export_command(dataset, fmt, start, end, lot_id, compress, output):
+    """Stream reservations, lot-revenue or user-usage as CSV or NDJSON."""
+    compress = compress or (output or '').endswith('.gz')
+    try:
+        chunks = export(dataset, fmt, start and start.date(), end and end.date(), lot_id, compress)
+    except ExportError as error:
+        raise click.BadParameter(str(error))
+
+    stream = open(output, 'wb') if output else click.get_binary_stream('stdout')
+    try:
+        for chunk in chunks:
+            stream.write(chunk)
+    finally:
+        if output:
+            stream.close()
+
+    if output:
+        click.echo(f"Wrote {output}.", err = True)
+
+
+@admin_bp.cli.command('import-lots')
+@click.argument('path', type = click.Path(exists = True, dir_okay = False))
+@click.option('--format', 'fmt', type = click.Choice(LOT_FORMATS), help = 'Default: from the file extension.')
+@click.option('--start-row', default = 1, show_default = True, help = 'Skip the rows before this one, to resume.')
+@click.option('--batch-size', default = IMPORT_BATCH, show_default = True)
+@click.option('--dry-run', is_flag = True, help = 'Only validate the rows and check for existing addresses.')
+def import_lots_command(path, fmt, start_row, batch_size, dry_run):
+    """Create parking lots and their spots from a CSV or JSON file."""
+    try:
+        with open(path, encoding = 'utf-8-sig', newline = '') as stream:
+            report = import_lots(read_rows(stream, format_for(path, fmt)), start_row, batch_size, dry_run)
+    except OnboardingError as error:
+        raise click.ClickException(str(error))
+
+    for error in report['errors']:
+        click.echo(f"Row {error['row']}: {error['error']}", err = True)
+    if report['error_count'] > len(report['errors']):
+        click.echo(f"... and {report['error_count'] - len(report['errors'])} more rejected row(s)", err = True)
+
+    click.echo(f"{'Would import' if dry_run else 'Imported'} {report['imported']} lot(s) with {report['spots']} "
+               f"spot(s) from {report['rows']} row(s); {report['error_count']} rejected.")
+    if report['resume_from'] is not None:
+        raise click.ClickException(f"Stopped at row {report['resume_from']}: {report['failure']}. The rows before it "
+                                   f"are imported, rerun with --start-row {report['resume_from']}.")
+
+
+@admin_bp.cli.command('rebuild-search-index')
+def rebuild_search_index():
+    """Repopulate the lot search index from parking_lots."""
+    rebuild()
+    click.echo("Lot search index rebuilt.")
+
+
+@admin_bp.cli.command('clear-summary-cache')
+def clear_summary_cache():
+    """Drop every cached /summary dataset, e.g. after changing data with raw SQL."""
+    summary_cache.clear()
+    click.echo("Summary cache cleared.")
+
+
+@admin_bp.cli.command('prune-availability-events')
+def prune_availability_events():
+    """Delete live feed events older than the replay window."""
+    click.echo(f"Deleted {prune()} availability event(s).")
+
+
+@admin_bp.cli.command('set-tariff')
+@click.argument('lot_id', type = int)
+@click.option('--first-hour', type = Decimal, help = 'Flat charge for the first hour.')
+@click.option('--daily-cap', type = Decimal, help = 'Most charged per 24 hours parked.')
+@click.option('--night-rate', type = Decimal, help = 'Hourly rate during the night window.')
+@click.option('--night-start', type = click.IntRange(0, 23), default = 22, show_default = True)
+@click.option('--night-end', type = click.IntRange(0, 23), default = 6, show_default = True)
+@click.option('--clear', is_flag = True, help = 'Back to flat hourly billing at the lot price.')
+def set_tariff(lot_id, first_hour, daily_cap, night_rate, night_start, night_end, clear):
+    """Set the tariff rules of a lot on top of its hourly price."""
+    lot = db.session.get(ParkingLots, lot_id)
+    if lot is None:
+        raise click.ClickException(f"Lot {lot_id} does not exist.")
+
+    tariff = LotTariff.query.filter_by(lot_id = lot_id).first()
+    if clear:
+        if tariff is not None:
+            db.session.delete(tariff)
+        db.session.commit()
+        click.echo(f"Lot {lot_id} bills flat {lot.price}/hour.")
+        return
+
+    if tariff is None:
+        tariff = LotTariff(lot_id = lot_id)
+        db.session.add(tariff)
+
+    tariff.first_hour_rate = first_hour
+    tariff.daily_cap = daily_cap
+    tariff.night_rate = night_rate
+    tariff.night_start = night_start
+    tariff.night_end = night_end
+    db.session.commit()
+    click.echo(f"Lot {lot_id}: {lot.price}/hour, first hour {first_hour or '-'}, daily cap {daily_cap or '-'}, "
+               f"night {night_rate or '-'}/hour {night_start}:00-{night_end}:00")
+
+
+@admin_bp.cli.command('settle-day')
+@click.option('--day', type = click.DateTime(['%Y-%m-%d']), help = 'IST date to settle (default: yesterday).')
+def settle_day_command(day):
+    """Re-bill a day's closed reservations and compare with what was charged and rolled up."""
+    day = day.date() if day else datetime.now(UTC).astimezone(ist).date() - timedelta(days = 1)
+    lots = settle_day(day)
+
+    click.echo(f"Settlement for {day}")
+    for lot in lots:
+        flags = []
+        if lot['mismatched']:
+            flags.append(f"{len(lot['mismatched'])} charge(s) differ from the tariff, e.g. reservation {lot['mismatched'][0]}")
+        if lot['rollup_revenue'] != lot['billed'] or lot['rollup_sessions'] != lot['sessions']:
+            flags.append(f"rollup has {lot['rollup_revenue']} over {lot['rollup_sessions']} session(s)")
+        click.echo(f"Lot {lot['lot_id']}: {lot['sessions']} session(s), charged {lot['billed']}, "
+                   f"tariff {lot['computed']}" + ''.join(f"; {flag}" for flag in flags))
+
+    click.echo(f"Total charged {sum(lot['billed'] for lot in lots)} over {sum(lot['sessions'] for lot in lots)} session(s).")
+
+
+@admin_bp.cli.command('provision-lots')
+@click.argument('spec', type = click.File('r'))
+def provision_lots(spec):
+    """Create, resize or reactivate lots from a JSON spec.
+
+    SPEC is a list of {"primename", "address", "pincode", "price", "maxspots"} objects; lots are matched
+    on address.
+    """
+
+    for entry in json.load(spec):
+        started = time.perf_counter()
+        address = entry['address'].strip()
+        lot = ParkingLots.query.filter_by(address = address).order_by(ParkingLots.active.desc()).first()
+
+        try:
+            if lot is None:
+                lot = ParkingLots(primename = entry['primename'].strip(), address = address,
+                                  pincode = str(entry['pincode']).strip(), price = round(Decimal(str(entry['price'])), 2),
+                                  maxspots = int(entry['maxspots']))
+                db.session.add(lot)
+                db.session.flush()
+                provision_lot(lot)
+                action = 'created'
+
+            elif not lot.active:
+                reactivate_lot(lot, int(entry['maxspots']))
+                action = 'reactivated'
+
+            else:
+                resize_lot(lot, int(entry['maxspots']))
+                action = 'resized'
+
+            lot_changed(lot)
+            db.session.commit()
+            click.echo(f"{action} lot {lot.id} ({address}) with {lot.maxspots} spots in {time.perf_counter() - started:.2f}s")
+
+        except (ProvisioningError, SQLAlchemyError) as error:
+            db.session.rollback()
+            click.echo(f"failed {address}: {error}", err = True)
+
+
+@admin_bp.cli.command('resize-lot')
+@click.argument('lot_id', type = int)
+@click.argument('maxspots', type = int)
+def resize_lot_command(lot_id, maxspots):
+    """Set the number of active spots of a lot."""
+    lot = db.session.get(ParkingLots, lot_id)
+    if lot is None:
+        raise click.ClickException(f"No lot {lot_id}")
+
+    try:
+        if lot.active:
+            resize_lot(lot, maxspots)
+        else:
+            reactivate_lot(lot, maxspots)
+        lot_changed(lot)
+        db.session.commit()
+    except ProvisioningError as error:
+        db.session.rollback()
+        raise click.ClickException(str(error))
+
+    click.echo(f"Lot {lot_id} now has {maxspots} active spots.")
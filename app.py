@@ -1,186 +1,144 @@
 import os
-from flask import Flask, redirect, flash, url_for, render_template
-from flask_security import Security, SQLAlchemyUserDatastore, auth_required, current_user
-from flask_migrate import Migrate
-from flask_security.utils import hash_password
-from models.models import db, User, Role, ParkingLots, ParkingSpot, ReservedSpots
-from sqlalchemy.exc import SQLAlchemyError
-from user.user import user_bp
-from admin.admin import admin_bp
-from forms.forms import ExtendedForm, EditProfileForm
-from collections import Counter
-from sqlalchemy import func, inspect
-from dotenv import load_dotenv
-
-load_dotenv()
-
-app = Flask(__name__)
-
-
-app.register_blueprint(user_bp)  
-app.register_blueprint(admin_bp)
-
-app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'fallback_secret')
-app.config['SECURITY_PASSWORD_HASH'] = 'argon2'
-app.config['SECURITY_PASSWORD_SALT'] = os.getenv('SECURITY_PASSWORD_SALT', 'fallback_salt')
-app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URI' , 'sqlite:///users.db')
-app.config['SECURITY_REGISTERABLE'] = True
-app.config['SECURITY_RECOVERABLE'] = True
-app.config['SECURITY_REGISTER_FORM'] = ExtendedForm
-app.config['SECURITY_SEND_REGISTER_EMAIL'] = False
-app.config['SECURITY_LOGIN_URL'] = '/login'
-app.config['SECURITY_LOGOUT_URL'] = '/logout'
-
-debug_mode = os.getenv('FLASK_DEBUG', '0') == '1'
-
-
-db.init_app(app)
-
-migrate = Migrate(app, db)
-
-user_datastore = SQLAlchemyUserDatastore(db, User, Role)
-security = Security(app, user_datastore)  
-
-
-#create users 
-with app.app_context():
-    def create_users():
-        if not user_datastore.find_role("admin"):
-            user_datastore.create_role(
-                name="admin", 
-                description="Administrator with full access", 
-                permissions={"read": True, "write": True, "delete": True}
-            )
-        
-        if not user_datastore.find_role("user"):
-            user_datastore.create_role(
-                name="user", 
-                description="Regular user with limited access", 
-                permissions={"read": True}
-            )
-        
-        db.session.commit()
-        
-        # Create users with hashed passwords
-        if not user_datastore.find_user(email="admin@example.com"):
-            user_datastore.create_user(
-                email="admin@example.com", 
-                password= hash_password("password"),
-                name = "admin",
-                roles=[user_datastore.find_role("admin")],
-                address = "admin example address",
-                pincode = "400000"
-            )
-                
-        db.session.commit()
+import click
+from flask import Flask
+from flask.cli import with_appcontext
+
+
+# Application factory. Importing this module does no database work and loads nothing beyond Flask: the
+# blueprints, forms, models and services are imported when create_app() runs, and create_app() only binds
+# the database, it never connects. Roles and the default admin are created by `flask seed`.
+#
+#   flask --app app run / flask --app app db upgrade   (Flask finds create_app on its own)
+#   gunicorn -c gunicorn.conf.py 'app:create_app()'
+
+
+def create_app(config = None):
+    """Build the app from the environment (and .env); config overrides individual keys."""
+    from dotenv import load_dotenv
+    from flask_security import Security, SQLAlchemyUserDatastore
+    from models.models import db, User, Role
+    from forms.forms import ExtendedForm
+    from services import querystats, metrics, anpr, engine, summarycache, archive
+    from services.replica import STICKY
+    from main.main import main_bp
+    from user.user import user_bp
+    from admin.admin import admin_bp
+
+    load_dotenv()
+
+    app = Flask(__name__)
+    querystats.init_app(app)   # first, so statements issued by other before_request hooks are counted too
+    metrics.init_app(app)
+
+
+    app.register_blueprint(main_bp)
+    app.register_blueprint(user_bp)
+    app.register_blueprint(admin_bp)
+
+    app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'fallback_secret')
+    app.config['SECURITY_PASSWORD_HASH'] = 'argon2'
+    app.config['SECURITY_PASSWORD_SALT'] = os.getenv('SECURITY_PASSWORD_SALT', 'fallback_salt')
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URI' , 'sqlite:///users.db')
+    if os.getenv('DATABASE_REPLICA_URI'):   # read-only copy for reporting views, see services.replica
+        app.config['SQLALCHEMY_BINDS'] = {'replica': os.getenv('DATABASE_REPLICA_URI')}
+    app.config['READ_REPLICA_STICKY'] = float(os.getenv('READ_REPLICA_STICKY', STICKY))
+    app.config['SECURITY_REGISTERABLE'] = True
+    app.config['SECURITY_RECOVERABLE'] = True
+    app.config['SECURITY_REGISTER_FORM'] = ExtendedForm
+    app.config['SECURITY_SEND_REGISTER_EMAIL'] = False
+    app.config['SECURITY_LOGIN_URL'] = '/login'
+    app.config['SECURITY_LOGOUT_URL'] = '/logout'
+
+    app.config['SQL_WARN_STATEMENTS'] = int(os.getenv('SQL_WARN_STATEMENTS', querystats.WARN_STATEMENTS))
+    app.config['SQL_WARN_REPEATS'] = int(os.getenv('SQL_WARN_REPEATS', querystats.WARN_REPEATS))
+
+    app.config['METRICS_TOKEN'] = os.getenv('METRICS_TOKEN')
+
+    app.config['ANPR_QUEUE_SIZE'] = int(os.getenv('ANPR_QUEUE_SIZE', anpr.QUEUE_SIZE))
+    app.config['ANPR_BATCH_SIZE'] = int(os.getenv('ANPR_BATCH_SIZE', anpr.BATCH_SIZE))
+    app.config['ANPR_BATCH_WAIT'] = float(os.getenv('ANPR_BATCH_WAIT', anpr.BATCH_WAIT))
+
+    app.config['SUMMARY_CACHE'] = os.getenv('SUMMARY_CACHE', 'memory')   # 'sqlite' to share entries between workers
+    app.config['SUMMARY_CACHE_TTL'] = float(os.getenv('SUMMARY_CACHE_TTL', summarycache.TTL))
+    app.config['SUMMARY_CACHE_SIZE'] = int(os.getenv('SUMMARY_CACHE_SIZE', summarycache.MAX_ENTRIES))
+    app.config['SUMMARY_CACHE_PATH'] = os.getenv('SUMMARY_CACHE_PATH')   # default: instance/summary-cache.db
+
+    app.config['ARCHIVE_AFTER_DAYS'] = int(os.getenv('ARCHIVE_AFTER_DAYS', archive.AFTER_DAYS))
+
+    app.config['DB_ENGINE_PROFILE'] = os.getenv('DB_ENGINE_PROFILE', 'tuned')   # 'stock' for SQLAlchemy defaults
+    app.config['SQLITE_BUSY_TIMEOUT'] = int(os.getenv('SQLITE_BUSY_TIMEOUT', engine.BUSY_TIMEOUT))
+    app.config['SQLITE_CACHE_SIZE'] = int(os.getenv('SQLITE_CACHE_SIZE', engine.CACHE_SIZE))
+    app.config['SQLITE_MMAP_SIZE'] = int(os.getenv('SQLITE_MMAP_SIZE', engine.MMAP_SIZE))
+    app.config['SQLITE_SYNCHRONOUS'] = os.getenv('SQLITE_SYNCHRONOUS', engine.SYNCHRONOUS)
+    app.config['DB_POOL_SIZE'] = int(os.getenv('DB_POOL_SIZE', engine.POOL_SIZE))
+    app.config['DB_MAX_OVERFLOW'] = int(os.getenv('DB_MAX_OVERFLOW', engine.MAX_OVERFLOW))
+    app.config['DB_POOL_TIMEOUT'] = int(os.getenv('DB_POOL_TIMEOUT', engine.POOL_TIMEOUT))
+    app.config['DB_POOL_RECYCLE'] = int(os.getenv('DB_POOL_RECYCLE', engine.POOL_RECYCLE))
+
+    if config:
+        app.config.update(config)
+
+
+    engine.init_app(app, db)   # db.init_app with the engine profile above
+    summarycache.init_app(app)
+
+    if click.get_current_context(silent = True) is not None:   # loaded by the flask command, e.g. `flask db`
+        from flask_migrate import Migrate   # Alembic is only needed there, workers skip importing it
+        Migrate(app, db)
+
+    Security(app, SQLAlchemyUserDatastore(db, User, Role))
+    app.cli.add_command(seed)
+
+    return app
+
+
+def create_users(admin_email = 'admin@example.com', admin_password = 'password'):
+    """Create the admin and user roles and the default admin, unless they exist. Needs an app context."""
+    from flask import current_app
+    from flask_security.utils import hash_password
+    from models.models import db
+
+    user_datastore = current_app.extensions['security'].datastore
+
+    if not user_datastore.find_role("admin"):
+        user_datastore.create_role(
+            name="admin",
+            description="Administrator with full access",
+            permissions={"read": True, "write": True, "delete": True}
+        )
+
+    if not user_datastore.find_role("user"):
+        user_datastore.create_role(
+            name="user",
+            description="Regular user with limited access",
+            permissions={"read": True}
+        )
+
+    db.session.commit()
+
+    # Create users with hashed passwords
+    if not user_datastore.find_user(email=admin_email):
+        user_datastore.create_user(
+            email=admin_email,
+            password= hash_password(admin_password),
+            name = "admin",
+            roles=[user_datastore.find_role("admin")],
+            address = "admin example address",
+            pincode = "400000"
+        )
+
+    db.session.commit()
+
 
-    if inspect(db.engine).has_table('role'):
-        create_users()
-
-
-
-@app.route('/')
-def home():
-    if current_user.is_authenticated:
-        if current_user.has_role('admin'):
-            return redirect(url_for('admin.dashboard'))
-        else:
-            return redirect(url_for('user.user_dashboard'))
-
-    return redirect(url_for('security.login'))
-
-
-@app.route('/edit-profile' , methods = ['GET' , 'POST'])
-@auth_required()
-def edit_profile():
-    form = EditProfileForm(obj = current_user)
-
-
-    if form.validate_on_submit():
-        new_email = form.email.data.strip()
-
-        if new_email != current_user.email:
-            existing_email= User.query.filter_by(email=new_email).first()
-
-            if existing_email:
-                flash("Email already in use.", "danger")
-                return render_template('edit_profile.html', form=form)
-
-        current_user.email = new_email
-        current_user.pincode = form.pincode.data.strip()
-        current_user.name =  form.name.data.strip()
-        current_user.address = form.address.data.strip()
-
-        try:
-            db.session.commit()
-            flash("Details Updated Successfully" , 'success')
-
-            if current_user.has_role('admin'):
-                return redirect(url_for('admin.dashboard'))
-
-            else:
-                return redirect(url_for('user.user_dashboard'))
-
-        except SQLAlchemyError:
-            app.logger.exception("Failed to update profile")
-            db.session.rollback()
-            flash("Error Occurred Please Try Again", 'danger')
-
-    return render_template('edit_profile.html' , form = form)
-
-
-@app.route('/summary', methods = ['GET'])
-@auth_required()
-def parking_summary():
-
-    if current_user.has_role('admin'):
-        spot_revenue = (
-        db.session.query(ParkingSpot.id,func.sum(ReservedSpots.rate_at_booking).label('total_revenue')).
-        join(ReservedSpots).group_by(ParkingSpot.id).all())
-
-        revenue_labels = [f"Spot {spot_id}" for spot_id, _ in spot_revenue]
-        revenue_values = [float(revenue or 0) for _, revenue in spot_revenue]
-
-        lots = ParkingLots.query.all()
-        lot_labels = []
-        available_counts = []
-        occupied_counts = []
-
-        for lot in lots:
-            lot_labels.append(lot.primename.split()[0])  # First word of lot name
-            spots = lot.spots
-
-            occupied = 0
-            available = 0
-
-            for spot in spots:
-                active_reservations = ReservedSpots.query.filter_by(spot_id=spot.id, leaving_time= None).count()
-                if active_reservations > 0:
-                    occupied += 1
-                else:
-                    available += 1
-
-            available_counts.append(available)
-            occupied_counts.append(occupied)
-
-        return render_template("summary.html",revenue_labels=revenue_labels,revenue_values=revenue_values,
-                lot_labels=lot_labels,available_counts=available_counts,occupied_counts=occupied_counts,user=current_user)
-
-
-
-    else:
-        reservations = ReservedSpots.query.filter(ReservedSpots.user_id == current_user.id).all()
-
-        spot_ids = [f"{r.spot.id}-{r.spot.lot.primename.split(' ')[0]}" for r in reservations]
-        spot_usage = Counter(spot_ids)
-
-        labels = list(spot_usage.keys())
-        values = list(spot_usage.values())
-
-        max_value = max(values) if values else 1 
-
-        return render_template('summary.html' ,labels = labels , max_value = max_value  , values = values , user = current_user)
+@click.command('seed')
+@click.option('--admin-email', default = 'admin@example.com', show_default = True)
+@click.option('--admin-password', default = 'password', show_default = True)
+@with_appcontext
+def seed(admin_email, admin_password):
+    """Create the roles and the default admin account (run after `flask db upgrade`)."""
+    create_users(admin_email, admin_password)
+    click.echo(f"Roles and admin {admin_email} are in place.")
 
 
 if __name__ == '__main__':
-    app.run(debug=debug_mode)
\ No newline at end of file
+    create_app().run(debug = os.getenv('FLASK_DEBUG', '0') == '1')
@@ -0,0 +1,86 @@
+"""Hammer book_spot from many threads and check that no spot is ever handed out twice.
+
+    python benchmarks/allocation_contention.py --threads 16 --spots 50 --attempts 10
+
+Exits non-zero if any spot ends up with more than one open reservation or the counters disagree.
+"""
+import argparse
+import sys
+import time
+from threading import Barrier, Thread
+
+from support import make_app, create_user, create_lot, login
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--threads', type = int, default = 16)
+    parser.add_argument('--spots', type = int, default = 50)
+    parser.add_argument('--attempts', type = int, default = 10, help = 'bookings attempted by each thread')
+    args = parser.parse_args()
+
+    app, db_path = make_app()
+    lot_id = create_lot(app, args.spots)
+
+    emails = [f"gate{i}@example.com" for i in range(args.threads)]
+    for email in emails:
+        create_user(app, email)
+    clients = [login(app, email) for email in emails]
+
+    barrier = Barrier(args.threads)
+    outcomes = []
+
+    def worker(index, client):
+        barrier.wait()
+        for attempt in range(args.attempts):
+            vehicle = f"MH{index % 100:02d}AB{attempt:04d}"
+            response = client.post(f"/user/spot/book/{lot_id}", data = {'vehicle_number': vehicle})
+            outcomes.append(response.status_code)
+
+    started = time.perf_counter()
+    threads = [Thread(target = worker, args = (i, c)) for i, c in enumerate(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    from models.models import db, ParkingLots, ParkingSpot, ReservedSpots
+    from sqlalchemy import func
+
+    with app.app_context():
+        open_reservations = ReservedSpots.query.filter(ReservedSpots.leaving_time == None)
+        doubled = (db.session.query(ReservedSpots.spot_id, func.count())
+                   .filter(ReservedSpots.leaving_time == None)
+                   .group_by(ReservedSpots.spot_id)
+                   .having(func.count() > 1)
+                   .all())
+        booked = open_reservations.count()
+        occupied = ParkingSpot.query.filter_by(lot_id = lot_id, status = 'O').count()
+        lot = db.session.get(ParkingLots, lot_id)
+
+        print(f"{len(outcomes)} requests from {args.threads} threads in {elapsed:.2f}s "
+              f"({len(outcomes) / elapsed:.1f} req/s)")
+        print(f"open reservations {booked}, occupied spots {occupied}, "
+              f"counters {lot.available_spots} available/{lot.occupied_spots} occupied")
+
+        failures = []
+        if doubled:
+            failures.append(f"double bookings: {doubled}")
+        if booked != occupied:
+            failures.append("reservations and occupied spots disagree")
+        if booked != min(args.spots, args.threads * args.attempts):
+            failures.append(f"expected {min(args.spots, args.threads * args.attempts)} bookings")
+        if (lot.available_spots, lot.occupied_spots) != (args.spots - occupied, occupied):
+            failures.append("availability counters drifted")
+
+    for failure in failures:
+        print("FAIL:", failure)
+    if not failures:
+        print("OK: zero double bookings")
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
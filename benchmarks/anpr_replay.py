@@ -0,0 +1,202 @@
+"""Replay recorded gate camera events through POST /admin/api/anpr/events for load testing.
+
+A recording is NDJSON, one camera payload per line (see services.anpr.parse_event). Against a running server,
+authenticated with an admin's token:
+
+    python benchmarks/anpr_replay.py events.ndjson --url http://127.0.0.1:8000 --token <token>
+
+Without --url the events go to an in-process app on a throwaway database with --lots lots of --spots spots,
+and the run fails if an event was lost or applied twice or the availability counters drifted. --generate N
+first writes a synthetic recording of N events to the file (entries and exits on lots 1..--lots, with some
+camera retries and misread plates). A 429 is retried after its Retry-After, like a camera would.
+
+    python benchmarks/anpr_replay.py /tmp/gate.ndjson --generate 20000 --queue-size 2000
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+from support import make_app, login
+from dataset import generate, vehicle_number
+
+
+def record(path, events, lots, seed):
+    """Write a synthetic recording: vehicles arrive at random lots and leave 10 minutes to 5 hours later."""
+    rng = random.Random(seed)
+    clock = datetime.now(timezone.utc) - timedelta(days = 1)
+    parked, leaving, lines = set(), [], []
+
+    while len(lines) < events:
+        clock += timedelta(seconds = rng.randint(1, 5))
+        leaving.sort()
+        if leaving and (leaving[0][0] <= clock or rng.random() < 0.3):
+            _, plate = leaving.pop(0)
+            parked.discard(plate)
+            payload = {'type': 'exit', 'vehicle_number': plate}
+        else:
+            plate = vehicle_number(rng)
+            if plate in parked:
+                continue
+            parked.add(plate)
+            leaving.append((clock + timedelta(minutes = rng.randint(10, 300)), plate))
+            payload = {'type': 'entry', 'vehicle_number': plate, 'lot_id': rng.randint(1, lots)}
+            if rng.random() < 0.01:
+                payload['vehicle_number'] = plate[:-2] + '??'   # misread, rejected by the writer
+
+        payload.update(event_id = f"gate{rng.randint(1, 8)}-{len(lines):07d}", timestamp = clock.isoformat())
+        lines.append(payload)
+        if rng.random() < 0.02:
+            lines.append(dict(payload))   # camera retry, same event_id
+
+    with open(path, 'w') as out:
+        for payload in lines[:events]:
+            out.write(json.dumps(payload) + '\n')
+
+
+def read(path):
+    with open(path) as recording:
+        return [json.loads(line) for line in recording if line.strip()]
+
+
+def http_poster(url, token):
+    def post(events):
+        request = urllib.request.Request(url.rstrip('/') + '/admin/api/anpr/events', method = 'POST',
+                                         data = json.dumps({'events': events}).encode(),
+                                         headers = {'Content-Type': 'application/json', 'Authentication-Token': token})
+        try:
+            with urllib.request.urlopen(request, timeout = 30) as response:
+                return response.status, response.headers.get('Retry-After')
+        except urllib.error.HTTPError as error:
+            return error.code, error.headers.get('Retry-After')
+    return lambda: post
+
+
+def client_poster(app):
+    def make():
+        client = login(app, 'admin@example.com')   # one test client per sending thread
+
+        def post(events):
+            response = client.post('/admin/api/anpr/events', json = {'events': events})
+            return response.status_code, response.headers.get('Retry-After')
+        return post
+    return make
+
+
+def replay(events, make_post, batch, concurrency, rate):
+    """Send events in batches from several threads; returns (requests, throttled, failed, seconds)."""
+    batches = [events[start:start + batch] for start in range(0, len(events), batch)]
+    stats = Counter()
+    lock = threading.Lock()
+    started = time.perf_counter()
+
+    def worker(index):
+        post = make_post()
+        for number in range(index, len(batches), concurrency):
+            if rate:   # hold the recording's pace: batch number n is due at n * batch / rate seconds
+                delay = started + number * batch / rate - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            while True:
+                status, retry_after = post(batches[number])
+                with lock:
+                    stats['requests'] += 1
+                if status != 429:
+                    break
+                with lock:
+                    stats['throttled'] += 1
+                time.sleep(float(retry_after or 1))
+            if status != 202:
+                with lock:
+                    stats['failed'] += 1
+                print(f"batch {number}: HTTP {status}")
+
+    threads = [threading.Thread(target = worker, args = (index,)) for index in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return stats['requests'], stats['throttled'], stats['failed'], time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('recording', help = 'NDJSON file of camera events')
+    parser.add_argument('--generate', type = int, metavar = 'N', help = 'first write a synthetic recording of N events')
+    parser.add_argument('--url', help = 'server to replay against (default: an in-process app)')
+    parser.add_argument('--token', help = 'admin authentication token for --url')
+    parser.add_argument('--batch', type = int, default = 50, help = 'events per request')
+    parser.add_argument('--concurrency', type = int, default = 4, help = 'sending threads')
+    parser.add_argument('--rate', type = float, default = 0, help = 'events per second, 0 for as fast as possible')
+    parser.add_argument('--lots', type = int, default = 4)
+    parser.add_argument('--spots', type = int, default = 500, help = 'per lot, in-process only')
+    parser.add_argument('--queue-size', type = int, help = 'ANPR_QUEUE_SIZE of the in-process app')
+    parser.add_argument('--seed', type = int, default = 42)
+    args = parser.parse_args()
+
+    if args.generate:
+        record(args.recording, args.generate, args.lots, args.seed)
+    events = read(args.recording)
+
+    if args.url:
+        requests, throttled, failed, seconds = replay(events, http_poster(args.url, args.token), args.batch,
+                                                      args.concurrency, args.rate)
+        print(f"{len(events)} events in {requests} requests, {seconds:.2f}s ({len(events) / seconds:.0f} events/s), "
+              f"{throttled} throttled, {failed} failed")
+        return 1 if failed else 0
+
+    app, _ = make_app()
+    if args.queue_size:
+        app.config['ANPR_QUEUE_SIZE'] = args.queue_size
+    generate(app, lots = args.lots, spots = args.spots, users = 1, history = 0, open_ratio = 0,
+             log = lambda message: None)
+
+    from models.models import db, AnprEvent, ReservedSpots
+    from services.anpr import pipeline
+    from services.availability import reconcile
+
+    requests, throttled, failed, seconds = replay(events, client_poster(app), args.batch, args.concurrency, args.rate)
+    started = time.perf_counter()
+    pipeline.flush()
+    drained = time.perf_counter() - started
+    print(f"{len(events)} events in {requests} requests, {seconds:.2f}s ({len(events) / seconds:.0f} events/s), "
+          f"{throttled} throttled, {failed} failed; writer drained {drained:.2f}s later")
+
+    with app.app_context():
+        outcomes = Counter((status, detail) for status, detail in
+                           db.session.query(AnprEvent.status, AnprEvent.detail))
+        stored = db.session.query(AnprEvent.event_key).count()
+        entries = AnprEvent.query.filter_by(kind = 'entry', status = 'processed').count()
+        exits = AnprEvent.query.filter_by(kind = 'exit', status = 'processed').count()
+        opened = ReservedSpots.query.filter(ReservedSpots.user_id == None).count()
+        still_open = ReservedSpots.query.filter(ReservedSpots.leaving_time == None).count()
+        drift = reconcile(fix = False)
+
+    for (status, detail), count in sorted(outcomes.items(), key = lambda item: (item[0][0], item[0][1] or '')):
+        print(f"  {status:<9} {detail or '':<22} {count}")
+
+    failures = 0
+    distinct = len({event['event_id'] for event in events})
+    if stored != distinct:
+        print(f"FAIL: {distinct} distinct events sent, {stored} stored")
+        failures += 1
+    if opened != entries or still_open != entries - exits:
+        print(f"FAIL: {entries} entries and {exits} exits processed, but {opened} reservations opened "
+              f"and {still_open} still open")
+        failures += 1
+    if drift:
+        print(f"FAIL: availability counters drifted for {len(drift)} lot(s)")
+        failures += 1
+
+    return 1 if failures or failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
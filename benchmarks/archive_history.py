@@ -0,0 +1,143 @@
+"""Booking and release latency as reservation history grows, with and without the monthly archive job.
+
+    python benchmarks/archive_history.py --history 100000 1000000 10000000 --cycles 200
+
+Two databases receive the same closed history; after each step one of them runs services.archive. Prints
+book and release p50/p95 for both at every size. Fails if latency on the archived database grows by more
+than --tolerance from the first size to the last, or if reservation history reads differently on the two.
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from support import make_app, login
+from dataset import generate, vehicle_number
+from routes import percentile
+
+CHUNK = 100000
+COLUMNS = ('spot_id', 'user_id', 'vehicle_number', 'parking_time', 'leaving_time', 'rate_at_booking', 'total_cost',
+           'location_at_booking', 'primename_at_booking')
+
+
+def _append_history(paths, count, rng, spots, users):
+    """Insert count closed reservations, 60 days to 3 years old, into every database."""
+    now = datetime.utcnow()
+    insert = f"INSERT INTO reserved_spots ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})"
+    connections = [sqlite3.connect(path) for path in paths]
+    written = 0
+    while written < count:
+        rows = []
+        for _ in range(min(CHUNK, count - written)):
+            parked = now - timedelta(days = rng.uniform(60, 1095))
+            hours = rng.uniform(0.25, 12)
+            rows.append((rng.choice(spots), rng.choice(users), vehicle_number(rng),
+                         parked.strftime('%Y-%m-%d %H:%M:%S.%f'),
+                         (parked + timedelta(hours = hours)).strftime('%Y-%m-%d %H:%M:%S.%f'),
+                         20, round(hours * 20, 2), 'bench address', 'Bench Lot'))
+        for conn in connections:
+            conn.executemany(insert, rows)
+            conn.commit()
+        written += len(rows)
+    for conn in connections:
+        conn.close()
+
+
+def _cycles(client, db_path, count, first_plate):
+    """Book a spot and release it again, count times; returns (booking latencies, release latencies)."""
+    conn = sqlite3.connect(db_path)
+    booking, release = [], []
+    for number in range(first_plate, first_plate + count):
+        plate = f"MH{number // 10000 % 100:02d}ZZ{number % 10000:04d}"
+        started = time.perf_counter()
+        client.post('/user/spot/book/1', data = {'vehicle_number': plate})
+        booking.append(time.perf_counter() - started)
+
+        reservation_id = conn.execute("SELECT id FROM reserved_spots WHERE vehicle_number = ? AND leaving_time IS NULL",
+                                      (plate,)).fetchone()[0]
+        started = time.perf_counter()
+        client.post(f"/user/spot/release/{reservation_id}", data = {})
+        release.append(time.perf_counter() - started)
+    conn.close()
+    return booking, release
+
+
+def _history(app, user_id):
+    from models.models import ReservationHistory
+
+    with app.app_context():
+        # the measured cycles close at slightly different times on the two databases
+        return [(row.id, row.spot_id, row.vehicle_number, row.leaving_time is None) for row in
+                ReservationHistory.query.filter_by(user_id = user_id).order_by(ReservationHistory.id)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--history', type = int, nargs = '+', default = [100000, 1000000])
+    parser.add_argument('--cycles', type = int, default = 200, help = 'book/release cycles measured per step')
+    parser.add_argument('--tolerance', type = float, default = 1.5, help = 'allowed p50 growth factor')
+    parser.add_argument('--dir', help = 'where to create the database files (default: the temp directory)')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix = 'parking-bench-', dir = args.dir)
+    apps = {}
+    for name in ('plain', 'archived'):
+        app, db_path = make_app(os.path.join(directory, f"{name}.db"))
+        generate(app, lots = 5, spots = 200, users = 200, history = 0, open_ratio = 0, log = lambda message: None)
+        apps[name] = (app, db_path, login(app, 'user0@example.com'))
+
+    from services.archive import archive_closed
+
+    with sqlite3.connect(apps['plain'][1]) as conn:
+        spots = [spot_id for spot_id, in conn.execute("SELECT id FROM parking_spot")]
+        users = [user_id for user_id, in conn.execute("SELECT id FROM user WHERE email LIKE 'user%'")]
+        booking_user = conn.execute("SELECT id FROM user WHERE email = 'user0@example.com'").fetchone()[0]
+
+    rng = random.Random(7)
+    total, plate = 0, 0
+    first_p50, last_p50 = None, None
+    print(f"{'history':>10} {'database':>9} {'hot rows':>10} {'book p50':>9} {'book p95':>9} {'release p50':>11} "
+          f"{'release p95':>11}  ms")
+    for size in args.history:
+        _append_history([db_path for _, db_path, _ in apps.values()], size - total, rng, spots, users)
+        total = size
+
+        app, db_path, _ = apps['archived']
+        started = time.perf_counter()
+        with app.app_context():
+            moved = archive_closed()
+        archive_s = time.perf_counter() - started
+
+        for name, (app, db_path, client) in apps.items():
+            with sqlite3.connect(db_path) as conn:
+                hot = conn.execute("SELECT count(*) FROM reserved_spots").fetchone()[0]
+            booking, release = _cycles(client, db_path, args.cycles, plate)
+            p50 = percentile(booking, 50) + percentile(release, 50)
+            print(f"{size:>10} {name:>9} {hot:>10} {percentile(booking, 50) * 1000:>9.2f} "
+                  f"{percentile(booking, 95) * 1000:>9.2f} {percentile(release, 50) * 1000:>11.2f} "
+                  f"{percentile(release, 95) * 1000:>11.2f}")
+            if name == 'archived':
+                first_p50 = first_p50 or p50
+                last_p50 = p50
+        plate += args.cycles
+        print(f"{'':>10} archive job moved {moved} reservation(s) in {archive_s:.1f}s")
+
+    failures = []
+    if last_p50 > first_p50 * args.tolerance:
+        failures.append(f"book+release p50 on the archived database grew from {first_p50 * 1000:.2f} ms "
+                        f"to {last_p50 * 1000:.2f} ms")
+    for user_id in (booking_user, users[1]):
+        if _history(apps['plain'][0], user_id) != _history(apps['archived'][0], user_id):
+            failures.append(f"reservation history of user {user_id} differs once archived")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
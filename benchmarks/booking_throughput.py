@@ -0,0 +1,92 @@
+"""Booking throughput with several worker processes on one SQLite file, like gunicorn workers, for the stock
+SQLAlchemy engine and the tuned profile from services.engine (WAL, synchronous=NORMAL, busy_timeout, ...).
+
+    python benchmarks/booking_throughput.py --workers 1 4 8 --bookings 200
+
+Each worker process books --bookings spots through user.book_spot with its own user. Fails if the tuned
+profile loses bookings to errors (typically "database is locked"). Use --dir to put the database on the
+disk production uses: on tmpfs fsync is free and synchronous=NORMAL makes little difference.
+"""
+import argparse
+import multiprocessing
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+from support import make_app, create_user, create_lot, login
+from routes import percentile
+
+
+def _prepare(db_path, workers, bookings):
+    app, _ = make_app(db_path)
+    create_lot(app, workers * bookings)
+    for index in range(workers):
+        create_user(app, f"worker{index}@example.com")
+
+
+def _worker(db_path, index, bookings, lot_id, barrier, results):
+    app, _ = make_app(db_path)
+    app.logger.disabled = True   # slow-request warnings are expected under contention
+    client = login(app, f"worker{index}@example.com")
+
+    barrier.wait()
+    started = time.perf_counter()
+    latencies = []
+    for number in range(bookings):
+        sent = time.perf_counter()
+        client.post(f"/user/spot/book/{lot_id}", data = {'vehicle_number': f"MH{index:02d}AB{number:04d}"})
+        latencies.append(time.perf_counter() - sent)
+    results.put((started, time.perf_counter(), latencies))
+
+
+def run(profile, workers, bookings, directory = None):
+    """Bookings per second, p95 latency and failed bookings for one profile and worker count, on a fresh database."""
+    db_path = os.path.join(tempfile.mkdtemp(prefix = 'parking-bench-', dir = directory), 'bench.db')
+    os.environ['DB_ENGINE_PROFILE'] = profile   # inherited by the worker processes
+
+    context = multiprocessing.get_context('spawn')   # each worker imports the app on its own, like gunicorn
+    setup = context.Process(target = _prepare, args = (db_path, workers, bookings))
+    setup.start()
+    setup.join()
+    lot_id = 1   # the only lot of the fresh database
+
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+    processes = [context.Process(target = _worker, args = (db_path, index, bookings, lot_id, barrier, results))
+                 for index in range(workers)]
+    for process in processes:
+        process.start()
+    timings = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    elapsed = max(end for _, end, _ in timings) - min(start for start, _, _ in timings)
+    latencies = [latency for _, _, worker_latencies in timings for latency in worker_latencies]
+
+    booked = sqlite3.connect(db_path).execute("SELECT count(*) FROM reserved_spots").fetchone()[0]
+    return booked / elapsed, percentile(latencies, 95), workers * bookings - booked
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type = int, nargs = '+', default = [1, 4, 8])
+    parser.add_argument('--bookings', type = int, default = 200, help = 'per worker')
+    parser.add_argument('--dir', help = 'where to create the database files (default: the temp directory)')
+    args = parser.parse_args()
+
+    print(f"{'workers':>7} {'profile':>7} {'bookings/s':>10} {'p95 ms':>7} {'failed':>6}")
+    failures = 0
+    for workers in args.workers:
+        for profile in ('stock', 'tuned'):
+            rate, p95, failed = run(profile, workers, args.bookings, args.dir)
+            print(f"{workers:>7} {profile:>7} {rate:>10.1f} {p95 * 1000:>7.1f} {failed:>6}")
+            if profile == 'tuned' and failed:
+                failures += 1
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
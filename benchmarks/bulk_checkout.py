@@ -0,0 +1,66 @@
+"""Release many parked vehicles: one user.spot_release form post per vehicle against one call to the
+/admin/api/checkout batch endpoint. Fails if the availability counters drift or a vehicle is not released.
+
+    python benchmarks/bulk_checkout.py --vehicles 500
+"""
+import argparse
+import sys
+import time
+
+from support import make_app, login
+from dataset import generate
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--vehicles', type = int, default = 500, help = 'released by each method')
+    args = parser.parse_args()
+
+    app, _ = make_app()
+    generate(app, lots = 4, spots = args.vehicles, users = 1, history = 0, open_ratio = 0.6, log = lambda message: None)
+
+    from models.models import ReservedSpots
+    from services.availability import reconcile
+    from services.querystats import track_queries
+
+    with app.app_context():
+        open_rows = (ReservedSpots.query.with_entities(ReservedSpots.id, ReservedSpots.vehicle_number)
+                     .filter(ReservedSpots.leaving_time == None).order_by(ReservedSpots.id).all())
+    single, batch = open_rows[:args.vehicles], open_rows[args.vehicles:2 * args.vehicles]
+
+    user = login(app, 'user0@example.com')
+    with track_queries() as log:
+        started = time.perf_counter()
+        for reservation_id, _ in single:
+            user.post(f"/user/spot/release/{reservation_id}", data = {})
+        single_s = time.perf_counter() - started
+
+    admin = login(app, 'admin@example.com')
+    items = [{'vehicle_number': plate} for _, plate in batch[::2]] + [{'reservation_id': rid} for rid, _ in batch[1::2]]
+    with track_queries() as batch_log:
+        started = time.perf_counter()
+        response = admin.post('/admin/api/checkout', json = {'items': items})
+        batch_s = time.perf_counter() - started
+
+    result = response.get_json()
+    print(f"form releases: {len(single)} in {single_s:.2f}s, {log.count} statements")
+    print(f"bulk checkout: {result['released']} in {batch_s:.3f}s, {batch_log.count} statements, "
+          f"total {result['total_cost']}")
+
+    failures = 0
+    with app.app_context():
+        still_open = ReservedSpots.query.filter(ReservedSpots.id.in_([rid for rid, _ in single + batch]),
+                                                ReservedSpots.leaving_time == None).count()
+        drift = reconcile(fix = False)
+    if still_open or result['released'] != len(batch):
+        print(f"FAIL: {still_open} reservation(s) still open")
+        failures += 1
+    if drift:
+        print(f"FAIL: availability counters drifted for {len(drift)} lot(s)")
+        failures += 1
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,72 @@
+"""Revalidate /summary, the lot search API and the spot bitmaps with If-None-Match, before and after a booking.
+
+    python benchmarks/conditional_requests.py --lots 50 --spots 200
+
+Prints the SQL statements and time of a full response against a 304. Fails if an unchanged resource is not
+answered with 304, if a 304 reads parking_spot or reserved_spots, or if a booking leaves a stale ETag valid.
+"""
+import argparse
+import sys
+import time
+
+from support import make_app, login
+from dataset import generate
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--lots', type = int, default = 50)
+    parser.add_argument('--spots', type = int, default = 200)
+    parser.add_argument('--history', type = int, default = 20000)
+    args = parser.parse_args()
+
+    app, _ = make_app()
+    generate(app, lots = args.lots, spots = args.spots, users = 20, history = args.history, log = lambda message: None)
+
+    from services.querystats import track_queries
+
+    admin = login(app, 'admin@example.com')
+    user = login(app, 'user0@example.com')
+    resources = [(admin, '/summary'), (user, '/summary'), (user, '/user/api/parking-search?query=mumbai'),
+                 (admin, '/admin/api/spot-bitmaps?lots=1,2,3')]
+
+    def fetch(client, path, etag = None):
+        headers = {'If-None-Match': f'"{etag}"'} if etag else {}
+        with track_queries() as log:
+            started = time.perf_counter()
+            response = client.get(path, headers = headers)
+            elapsed = time.perf_counter() - started
+        heavy = [shape for shape in log.shapes if 'parking_spot' in shape or 'reserved_spots' in shape]
+        return response, log.count, elapsed, heavy
+
+    failures = []
+    etags = {}
+    print(f"{'resource':<42} {'200 stmts':>9} {'200 ms':>7} {'304 stmts':>9} {'304 ms':>7}")
+    for client, path in resources:
+        response, full_count, full_s, _ = fetch(client, path)
+        etag = response.headers.get('ETag', '').strip('"')
+        revalidated, count, elapsed, heavy = fetch(client, path, etag)
+        print(f"{path:<42} {full_count:>9} {full_s * 1000:>7.1f} {count:>9} {elapsed * 1000:>7.1f}")
+        etags[(client, path)] = etag
+
+        if not etag or revalidated.status_code != 304:
+            failures.append(f"{path}: unchanged resource answered {revalidated.status_code}, not 304")
+        if heavy:
+            failures.append(f"{path}: the 304 read {heavy}")
+
+    booking = user.post('/user/spot/book/1', data = {'vehicle_number': 'MH01ZZ0001'})
+    if booking.status_code != 302:
+        failures.append(f"booking failed: {booking.status_code}")
+
+    for client, path in resources:
+        response, _, _, _ = fetch(client, path, etags[(client, path)])
+        if response.status_code != 200:
+            failures.append(f"{path}: still {response.status_code} after a booking in lot 1")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
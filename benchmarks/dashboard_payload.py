@@ -0,0 +1,35 @@
+"""Bytes sent to draw the admin dashboard for large lots: the HTML page plus the spot bitmaps it fetches.
+
+    python benchmarks/dashboard_payload.py --lots 5 --spots 10000
+"""
+import argparse
+import time
+
+from support import make_app, login, create_lot
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--lots', type = int, default = 5)
+    parser.add_argument('--spots', type = int, default = 10000)
+    args = parser.parse_args()
+
+    app, _ = make_app()
+    lot_ids = [create_lot(app, args.spots, primename = f"Lot{i} Bench", address = f"lot {i}") for i in range(args.lots)]
+    admin = login(app, 'admin@example.com')
+
+    started = time.perf_counter()
+    page = admin.get('/admin/dashboard')
+    page_ms = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    bitmaps = admin.get('/admin/api/spot-bitmaps?lots=' + ','.join(map(str, lot_ids)))
+    bitmap_ms = (time.perf_counter() - started) * 1000
+
+    print(f"{args.lots} lots x {args.spots} spots")
+    print(f"  dashboard HTML   {len(page.data):>10,} bytes  {page_ms:>8.1f} ms")
+    print(f"  spot bitmaps     {len(bitmaps.data):>10,} bytes  {bitmap_ms:>8.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+"""Seeded synthetic data: lots, spots, users and reservation history at realistic volumes.
+
+    python benchmarks/dataset.py --db /tmp/parking.db --lots 50 --spots 500 --users 1000 --history 1000000
+
+Rows go in through the model tables with batched executemany inserts. Afterwards the derived state the app
+maintains (availability counters, revenue rollups, search index) is rebuilt with the app's own services.
+The same seed always produces the same data.
+"""
+import argparse
+import random
+import time
+import uuid
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from support import make_app
+
+
+BATCH = 20000
+PASSWORD = 'password'
+
+STREETS = ['MG Road', 'FC Road', 'Linking Road', 'Station Road', 'Park Street', 'Brigade Road', 'Marine Drive',
+           'Hill Road', 'Nehru Nagar', 'Gandhi Chowk', 'Church Street', 'Residency Road', 'Anna Salai']
+CITIES = [('Mumbai', '400'), ('Pune', '411'), ('Bengaluru', '560'), ('Chennai', '600'), ('Kolkata', '700'),
+          ('Hyderabad', '500'), ('Ahmedabad', '380'), ('Jaipur', '302'), ('Nagpur', '440'), ('Kochi', '682')]
+NAMES = ['Central', 'Metro', 'City', 'Plaza', 'Mall', 'Tower', 'Market', 'Junction', 'Square', 'Terminal']
+STATES = ['MH', 'KA', 'TN', 'DL', 'GJ', 'RJ', 'KL', 'TS', 'WB', 'UP']
+
+
+def vehicle_number(rng):
+    return f"{rng.choice(STATES)}{rng.randint(1, 99):02d}{rng.choice('ABCDEFGHJKLMNPRSTUVWXYZ')}" \
+           f"{rng.choice('ABCDEFGHJKLMNPRSTUVWXYZ')}{rng.randint(1, 9999):04d}"
+
+
+def _insert(db, table, rows):
+    for start in range(0, len(rows), BATCH):
+        db.session.execute(table.insert(), rows[start:start + BATCH])
+
+
+def generate(app, lots = 50, spots = 500, users = 1000, history = 100000, open_ratio = 0.3, seed = 42, log = print):
+    from flask_security.utils import hash_password
+    from models.models import db, User, Role, UserRoles, ParkingLots, ParkingSpot, ReservedSpots
+    from services import availability, revenue, search
+
+    rng = random.Random(seed)
+    now = datetime.utcnow().replace(microsecond = 0)
+
+    with app.app_context():
+        started = time.perf_counter()
+        lot_rows = []
+        for i in range(lots):
+            city, pin_prefix = rng.choice(CITIES)
+            lot_rows.append({'primename': f"{rng.choice(NAMES)} {city} {i}", 'price': Decimal(rng.randint(10, 80)),
+                             'address': f"{i} {rng.choice(STREETS)}, {city}", 'pincode': f"{pin_prefix}{rng.randint(0, 999):03d}",
+                             'maxspots': spots, 'active': True})
+        _insert(db, ParkingLots.__table__, lot_rows)
+        lot_ids = [lot_id for lot_id, in db.session.query(ParkingLots.id).order_by(ParkingLots.id)]
+        lot_info = {lot_id: (price, address, primename) for lot_id, price, address, primename
+                    in db.session.query(ParkingLots.id, ParkingLots.price, ParkingLots.address, ParkingLots.primename)}
+
+        for lot_id in lot_ids:
+            _insert(db, ParkingSpot.__table__, [{'lot_id': lot_id, 'spot_no': n, 'status': 'A', 'active': True}
+                                                for n in range(1, spots + 1)])
+        spot_rows = db.session.query(ParkingSpot.id, ParkingSpot.lot_id).order_by(ParkingSpot.id).all()
+        log(f"{lots} lots, {len(spot_rows)} spots in {time.perf_counter() - started:.1f}s")
+
+        started = time.perf_counter()
+        hashed = hash_password(PASSWORD)   # one hash shared by every generated user
+        role_id = db.session.query(Role.id).filter_by(name = 'user').scalar()
+        first_user = (db.session.query(db.func.max(User.id)).scalar() or 0) + 1
+        _insert(db, User.__table__, [{'email': f"user{i}@example.com", 'name': f"User {i}", 'address': 'generated',
+                                      'pincode': '400001', 'password': hashed, 'active': True,
+                                      'fs_uniquifier': uuid.UUID(int = rng.getrandbits(128)).hex}
+                                     for i in range(users)])
+        user_ids = list(range(first_user, first_user + users))
+        _insert(db, UserRoles.__table__, [{'user_id': user_id, 'role_id': role_id} for user_id in user_ids])
+        log(f"{users} users in {time.perf_counter() - started:.1f}s")
+
+        started = time.perf_counter()
+        written = 0
+        while written < history:
+            batch = []
+            for _ in range(min(BATCH, history - written)):
+                spot_id, lot_id = rng.choice(spot_rows)
+                parked = now - timedelta(days = rng.uniform(1, 365))
+                hours = rng.uniform(0.25, 12)
+                price, address, primename = lot_info[lot_id]
+                batch.append({'spot_id': spot_id, 'user_id': rng.choice(user_ids), 'vehicle_number': vehicle_number(rng),
+                              'parking_time': parked, 'leaving_time': parked + timedelta(hours = hours),
+                              'rate_at_booking': price, 'total_cost': (Decimal(hours) * price).quantize(Decimal('0.01')),
+                              'location_at_booking': address, 'primename_at_booking': primename})
+            db.session.execute(ReservedSpots.__table__.insert(), batch)
+            written += len(batch)
+            db.session.commit()
+        log(f"{history} closed reservations in {time.perf_counter() - started:.1f}s")
+
+        started = time.perf_counter()
+        occupied = rng.sample(spot_rows, int(len(spot_rows) * open_ratio))
+        plates = set()
+        open_rows = []
+        for spot_id, lot_id in occupied:
+            plate = vehicle_number(rng)
+            while plate in plates:
+                plate = vehicle_number(rng)
+            plates.add(plate)
+            price, address, primename = lot_info[lot_id]
+            open_rows.append({'spot_id': spot_id, 'user_id': rng.choice(user_ids), 'vehicle_number': plate,
+                              'parking_time': now - timedelta(hours = rng.uniform(0.1, 20)), 'leaving_time': None,
+                              'rate_at_booking': price, 'total_cost': None,
+                              'location_at_booking': address, 'primename_at_booking': primename})
+        _insert(db, ReservedSpots.__table__, open_rows)
+        occupied_ids = [spot_id for spot_id, _ in occupied]
+        for start in range(0, len(occupied_ids), 900):
+            db.session.execute(ParkingSpot.__table__.update()
+                               .where(ParkingSpot.__table__.c.id.in_(occupied_ids[start:start + 900]))
+                               .values(status = 'O'))
+        db.session.commit()
+        log(f"{len(open_rows)} open reservations in {time.perf_counter() - started:.1f}s")
+
+        started = time.perf_counter()
+        availability.reconcile(fix = True)
+        revenue.backfill()
+        search.rebuild()
+        log(f"rebuilt counters, revenue rollups and search index in {time.perf_counter() - started:.1f}s")
+
+    return {'lots': lots, 'spots': spots, 'users': users, 'history': history, 'open_ratio': open_ratio, 'seed': seed}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--db', help = 'SQLite file to fill (default: a new temporary file)')
+    parser.add_argument('--lots', type = int, default = 50)
+    parser.add_argument('--spots', type = int, default = 500, help = 'spots per lot')
+    parser.add_argument('--users', type = int, default = 1000)
+    parser.add_argument('--history', type = int, default = 100000, help = 'closed reservations')
+    parser.add_argument('--open-ratio', type = float, default = 0.3, help = 'share of spots currently occupied')
+    parser.add_argument('--seed', type = int, default = 42)
+    args = parser.parse_args()
+
+    app, db_path = make_app(args.db)
+    generate(app, args.lots, args.spots, args.users, args.history, args.open_ratio, args.seed)
+    print(f"database: {db_path} (users user0..user{args.users - 1}@example.com, password '{PASSWORD}')")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""Memory and throughput of the streaming exports as reservation history grows.
+
+    python benchmarks/export_stream.py --history 100000 1000000 --format csv ndjson
+
+Fills a database with closed reservations, archives part of them, and streams the reservations export
+through the admin endpoint (optionally gzipped) and `flask admin export`, measuring the Python heap peak with
+tracemalloc. Fails if an export is missing rows, if the gzip body does not decompress to the plain one, or if
+the peak grows by more than --tolerance from the first size to the last. Rows/s are measured under
+tracemalloc, which slows the encoding several times over.
+"""
+import argparse
+import csv
+import gzip
+import io
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from support import make_app, login
+from dataset import generate
+from archive_history import _append_history
+
+
+def _measure(consume):
+    """Run consume() under tracemalloc; returns (its result, peak bytes, seconds)."""
+    tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        result = consume()
+        return result, tracemalloc.get_traced_memory()[1], time.perf_counter() - started
+    finally:
+        tracemalloc.stop()
+
+
+def _rows(body, fmt):
+    if fmt == 'csv':
+        return sum(1 for _ in csv.reader(io.StringIO(body.decode()))) - 1
+    return sum(1 for line in body.splitlines() if json.loads(line))
+
+
+def _stream(client, path):
+    """Read the response chunk by chunk, keeping only its size, like a client writing it to disk."""
+    response = client.get(path, buffered = False)
+    assert response.status_code == 200, (path, response.status_code, response.get_data(as_text = True))
+    size = 0
+    for chunk in response.response:
+        size += len(chunk)
+    response.close()
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--history', type = int, nargs = '+', default = [50000, 500000])
+    parser.add_argument('--format', nargs = '+', default = ['csv', 'ndjson'], choices = ['csv', 'ndjson'])
+    parser.add_argument('--tolerance', type = float, default = 1.5, help = 'allowed growth of the memory peak')
+    parser.add_argument('--dir', help = 'where to create the database file (default: the temp directory)')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix = 'parking-bench-', dir = args.dir)
+    app, db_path = make_app(os.path.join(directory, 'export.db'))
+    generate(app, lots = 5, spots = 200, users = 200, history = 0, open_ratio = 0, log = lambda message: None)
+    client = login(app, 'admin@example.com')
+
+    from services.archive import archive_closed
+    from admin.admin import export_command
+
+    with sqlite3.connect(db_path) as conn:
+        spots = [spot_id for spot_id, in conn.execute("SELECT id FROM parking_spot")]
+        users = [user_id for user_id, in conn.execute("SELECT id FROM user WHERE email LIKE 'user%'")]
+
+    failures = []
+    peaks = {}
+    rng = random.Random(11)
+    total = 0
+    print(f"{'history':>10} {'export':>22} {'MB out':>8} {'peak MB':>8} {'rows/s':>9}")
+    for size in args.history:
+        _append_history([db_path], size - total, rng, spots, users)
+        total = size
+        with app.app_context():
+            # half of the history in the archive, so the export reads both sides of reservation_history
+            archive_closed(before = datetime.utcnow() - timedelta(days = 600))
+
+        for fmt in args.format:
+            path = f"/admin/api/export/reservations?format={fmt}"
+            runs = {
+                'endpoint': lambda: _stream(client, path),
+                'endpoint gzip': lambda: _stream(client, path + '&gzip=1'),
+                'cli': lambda: app.test_cli_runner().invoke(export_command, ['reservations', '--format', fmt,
+                                                                             '-o', output]).exit_code,
+            }
+            output = os.path.join(directory, f"reservations.{fmt}")
+            for label, consume in runs.items():
+                result, peak, seconds = _measure(consume)
+                peaks.setdefault((fmt, label), []).append(peak)
+                written = os.path.getsize(output) if label == 'cli' else result
+                if label == 'cli' and result != 0:
+                    failures.append(f"flask admin export --format {fmt} exited with {result}")
+                print(f"{size:>10} {fmt + ' ' + label:>22} {written / 2 ** 20:>8.1f} "
+                      f"{peak / 2 ** 20:>8.2f} {size / seconds:>9.0f}")
+
+            with open(output, 'rb') as exported:
+                body = exported.read()
+            if _rows(body, fmt) != size:
+                failures.append(f"{fmt} export of {size} reservations has {_rows(body, fmt)} rows")
+            if gzip.decompress(client.get(path + '&gzip=1').data) != body:
+                failures.append(f"gzipped {fmt} export differs from the plain one at {size} reservations")
+            del body
+
+    bad = client.get('/admin/api/export/reservations?from=yesterday')
+    if bad.status_code != 400:
+        failures.append(f"an invalid from date answered {bad.status_code}, not 400")
+
+    for (fmt, label), values in peaks.items():
+        if values[-1] > values[0] * args.tolerance:
+            failures.append(f"{fmt} {label} peak grew from {values[0] / 2 ** 20:.2f} MB "
+                            f"to {values[-1] / 2 ** 20:.2f} MB")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,130 @@
+"""Onboarding many lots: one admin form submit per lot against `flask admin import-lots`.
+
+    python benchmarks/lot_onboarding.py --lots 500 --spots 50
+
+Writes a CSV of lots, with an invalid row and a repeated address every --bad-every rows, and loads it into
+fresh databases through the form and through the bulk import, counting time and SQL statements. A third
+database has a lot insert fail halfway and resumes the import from the row the report names. Fails if the
+three databases end up with different lots or spots, if a lot's spots disagree with its counters, if the
+rejected rows are not the bad ones, or if rerunning the file imports anything twice.
+"""
+import argparse
+import csv
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+from support import make_app, login
+
+
+def _write_lots(path, lots, spots, bad_every):
+    """The CSV, and the row numbers that should be rejected."""
+    bad = set()
+    with open(path, 'w', newline = '') as out:
+        writer = csv.writer(out)
+        writer.writerow(['primename', 'address', 'pincode', 'price', 'maxspots'])
+        for number in range(1, lots + 1):
+            if number % bad_every == 0:
+                writer.writerow([f"Bench Lot {number}", f"{number} Bench Road", '4000', '20', spots])   # short pincode
+                bad.add(number)
+            elif number % bad_every == 2:
+                writer.writerow([f"Bench Lot {number}", f"{number - 1} Bench Road", f"{400000 + number}", '20',
+                                 spots])   # repeats the previous row's address
+                bad.add(number)
+            else:
+                writer.writerow([f"Bench Lot {number}", f"{number} Bench Road", f"{400000 + number}",
+                                 f"{15 + number % 10}.50", spots])
+    return bad
+
+
+def _state(db_path):
+    with sqlite3.connect(db_path) as conn:
+        lots = conn.execute("SELECT primename, address, pincode, price, maxspots, available_spots FROM parking_lots "
+                            "ORDER BY address").fetchall()
+        spots = conn.execute("SELECT l.address, count(s.id) FROM parking_lots l LEFT JOIN parking_spot s "
+                             "ON s.lot_id = l.id AND s.active GROUP BY l.id ORDER BY l.address").fetchall()
+    return lots, spots
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--lots', type = int, default = 500)
+    parser.add_argument('--spots', type = int, default = 50, help = 'spots per lot')
+    parser.add_argument('--bad-every', type = int, default = 25)
+    parser.add_argument('--batch-size', type = int, default = 200)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix = 'parking-bench-')
+    path = os.path.join(directory, 'lots.csv')
+    bad = _write_lots(path, args.lots, args.spots, args.bad_every)
+
+    from services.querystats import track_queries
+    from services.onboarding import import_lots, read_rows
+    from admin.admin import import_lots_command
+
+    failures = []
+    print(f"{'path':<22} {'lots':>6} {'statements':>10} {'seconds':>8}")
+
+    form_app, form_db = make_app(os.path.join(directory, 'form.db'))
+    client = login(form_app, 'admin@example.com')
+    with open(path, newline = '') as lots, track_queries() as log:
+        started = time.perf_counter()
+        for row in csv.DictReader(lots):
+            client.post('/admin/parking-lot', data = row)
+        seconds = time.perf_counter() - started
+    print(f"{'form, one per lot':<22} {len(_state(form_db)[0]):>6} {log.count:>10} {seconds:>8.2f}")
+
+    bulk_app, bulk_db = make_app(os.path.join(directory, 'bulk.db'))
+    with track_queries() as log:
+        started = time.perf_counter()
+        result = bulk_app.test_cli_runner().invoke(import_lots_command, [path, '--batch-size', str(args.batch_size)])
+        seconds = time.perf_counter() - started
+    print(f"{'flask admin import-lots':<22} {len(_state(bulk_db)[0]):>6} {log.count:>10} {seconds:>8.2f}")
+    if result.exit_code != 0:
+        failures.append(f"import-lots exited with {result.exit_code}: {result.output.strip()}")
+
+    rejected = {int(line.split(':')[0].split()[1]) for line in result.output.splitlines() if line.startswith('Row ')}
+    if rejected != bad:
+        failures.append(f"rejected rows {sorted(rejected ^ bad)[:10]} differ from the bad ones")
+
+    again = bulk_app.test_cli_runner().invoke(import_lots_command, [path])
+    if 'Imported 0 lot(s)' not in again.output:
+        failures.append(f"rerunning the file imported lots again: {again.output.strip().splitlines()[-1]}")
+
+    # the insert of a lot in the middle of the file fails once; the import resumes from the row it names
+    resumed_app, resumed_db = make_app(os.path.join(directory, 'resumed.db'))
+    middle = next(number for number in range(args.lots // 2, args.lots) if number not in bad)
+    with sqlite3.connect(resumed_db) as conn:
+        conn.execute(f"CREATE TRIGGER fail_once BEFORE INSERT ON parking_lots WHEN NEW.address = '{middle} Bench Road' "
+                     f"BEGIN SELECT RAISE(ABORT, 'injected failure'); END")
+    with resumed_app.app_context(), open(path, newline = '') as lots:
+        report = import_lots(read_rows(lots, 'csv'), batch_size = args.batch_size)
+    with sqlite3.connect(resumed_db) as conn:
+        conn.execute("DROP TRIGGER fail_once")
+    if report['resume_from'] is None:
+        failures.append("the injected failure did not stop the import")
+    else:
+        result = resumed_app.test_cli_runner().invoke(import_lots_command, [path, '--start-row',
+                                                                            str(report['resume_from'])])
+        print(f"{'resumed':<22} {len(_state(resumed_db)[0]):>6} {'':>10} {'':>8}  stopped at row "
+              f"{report['resume_from']} ({report['failure']})")
+
+    form_state, bulk_state, resumed_state = _state(form_db), _state(bulk_db), _state(resumed_db)
+    if bulk_state != form_state:
+        failures.append("bulk import and form submits created different lots or spots")
+    if resumed_state != bulk_state:
+        failures.append("the resumed import differs from the uninterrupted one")
+    for lots, spots in (bulk_state, resumed_state):
+        if [lot[4] for lot in lots] != [count for _, count in spots] or any(lot[4] != lot[5] for lot in lots):
+            failures.append("a lot's spots or available count differ from its maxspots")
+            break
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,93 @@
+"""Time creating and resizing large lots: one ORM object per spot (the old edit_lot path) against
+services.provisioning.
+
+    python benchmarks/provisioning.py --spots 10000
+"""
+import argparse
+import time
+
+from support import make_app
+
+
+def orm_create(db, ParkingLots, ParkingSpot, address, spots):
+    lot = ParkingLots(primename = 'ORM Garage', price = 20, address = address, pincode = '400001', maxspots = spots)
+    db.session.add(lot)
+    db.session.flush()
+    for spot_no in range(1, spots + 1):
+        db.session.add(ParkingSpot(lot_id = lot.id, spot_no = spot_no, status = 'A'))
+    db.session.commit()
+    return lot
+
+
+def orm_resize(db, ParkingSpot, lot, new_max):
+    if new_max < lot.maxspots:
+        for spot in (ParkingSpot.query.filter_by(lot_id = lot.id, status = 'A', active = True)
+                     .order_by(ParkingSpot.spot_no.desc()).limit(lot.maxspots - new_max).all()):
+            spot.active = False
+    else:
+        last_spot = ParkingSpot.query.filter_by(lot_id = lot.id).order_by(ParkingSpot.spot_no.desc()).first()
+        to_add = new_max - ParkingSpot.query.filter_by(lot_id = lot.id, active = True).count()
+        for spot in ParkingSpot.query.filter_by(lot_id = lot.id, active = False).order_by(ParkingSpot.spot_no.desc()).all():
+            if to_add <= 0:
+                break
+            spot.active = True
+            to_add -= 1
+        for spot_no in range(last_spot.spot_no + 1, last_spot.spot_no + 1 + max(to_add, 0)):
+            db.session.add(ParkingSpot(lot_id = lot.id, spot_no = spot_no, status = 'A', active = True))
+    lot.maxspots = new_max
+    db.session.commit()
+
+
+def timed(label, fn):
+    started = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - started
+    print(f"  {label:<28}{elapsed:>8.3f}s")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--spots', type = int, default = 10000)
+    args = parser.parse_args()
+
+    app, _ = make_app()
+    from models.models import db, ParkingLots, ParkingSpot
+    from services.provisioning import provision_lot, resize_lot
+
+    spots = args.spots
+    steps = [('grow to {}', spots * 3 // 2), ('shrink to {}', spots // 2), ('regrow to {}', spots)]
+
+    with app.app_context():
+        print(f"ORM objects, {spots}-spot lot")
+        holder = {}
+        timed(f"create {spots}", lambda: holder.setdefault('lot', orm_create(db, ParkingLots, ParkingSpot, 'orm lot', spots)))
+        for label, size in steps:
+            timed(label.format(size), lambda size = size: orm_resize(db, ParkingSpot, holder['lot'], size))
+
+        print(f"bulk provisioning, {spots}-spot lot")
+
+        def bulk_create():
+            lot = ParkingLots(primename = 'Bulk Garage', price = 20, address = 'bulk lot', pincode = '400001', maxspots = spots)
+            db.session.add(lot)
+            db.session.flush()
+            provision_lot(lot)
+            db.session.commit()
+            holder['bulk'] = lot
+
+        def bulk_resize(size):
+            resize_lot(holder['bulk'], size)
+            db.session.commit()
+
+        timed(f"create {spots}", bulk_create)
+        for label, size in steps:
+            timed(label.format(size), lambda size = size: bulk_resize(size))
+
+        lot = holder['bulk']
+        active = ParkingSpot.query.filter_by(lot_id = lot.id, active = True).count()
+        db.session.refresh(lot)
+        print(f"bulk lot ends with {active} active spots, counters {lot.available_spots} available")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""Check read/write routing with two SQLite files: the primary, and a read-only snapshot copy as the replica.
+
+    python benchmarks/read_replica.py
+
+The reporting views must read from the replica, a booking must land on the primary, the booking user must
+see it right away (read-your-writes), and once READ_REPLICA_STICKY has passed they read the stale snapshot
+again. Exits non-zero if any of that does not hold.
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+STICKY = 1.0
+
+
+def main():
+    directory = tempfile.mkdtemp(prefix = 'parking-bench-')
+    replica_path = os.path.join(directory, 'replica.db')
+    os.environ['DATABASE_REPLICA_URI'] = f"sqlite:///file:{replica_path}?mode=ro&uri=true"
+    os.environ['READ_REPLICA_STICKY'] = str(STICKY)
+
+    from support import make_app, login
+    from dataset import generate
+
+    app, primary_path = make_app(os.path.join(directory, 'primary.db'))
+    generate(app, lots = 3, spots = 20, users = 2, history = 50, open_ratio = 0, log = lambda message: None)
+
+    with sqlite3.connect(primary_path) as primary, sqlite3.connect(replica_path) as replica:
+        primary.backup(replica)   # the snapshot the replica serves
+
+    from models.models import db
+    from sqlalchemy import event
+
+    statements = {'primary': 0, 'replica': 0}
+    with app.app_context():
+        for key, engine in db.engines.items():
+            event.listen(engine, 'before_cursor_execute',
+                         lambda *args, name = 'primary' if key is None else key: statements.__setitem__(name, statements[name] + 1))
+
+    def reads(client, method, path, **kwargs):
+        before = dict(statements)
+        response = getattr(client, method)(path, **kwargs)
+        return response, {name: statements[name] - before[name] for name in statements}
+
+    failures = []
+    admin = login(app, 'admin@example.com')
+    user = login(app, 'user0@example.com')
+
+    for client, method, path, kwargs in [(admin, 'get', '/admin/dashboard', {}),
+                                         (admin, 'get', '/summary', {}),
+                                         (admin, 'post', '/admin/lot-search', {'data': {'search_by': 'pincode',
+                                                                                         'query': '400001'}}),
+                                         (user, 'post', '/user/api/parking-search', {'json': {'query': 'a'}})]:
+        response, counts = reads(client, method, path, **kwargs)
+        print(f"{method.upper():<4} {path:<26} {response.status_code}  primary {counts['primary']:>2}  "
+              f"replica {counts['replica']:>2}")
+        if response.status_code != 200 or not counts['replica']:
+            failures.append(f"{path} did not read from the replica")
+
+    response = user.post('/user/spot/book/1', data = {'vehicle_number': 'MH01ZZ0001'})
+    booked = sqlite3.connect(primary_path).execute(
+        "SELECT count(*) FROM reserved_spots WHERE vehicle_number = 'MH01ZZ0001'").fetchone()[0]
+    if response.status_code != 302 or not booked:
+        failures.append("booking did not reach the primary")
+
+    response, counts = reads(user, 'get', '/summary')
+    print(f"after booking: /summary primary {counts['primary']}, replica {counts['replica']}")
+    if counts['replica']:
+        failures.append("/summary read from the replica right after the user's own booking")
+
+    time.sleep(STICKY + 0.1)
+    response, counts = reads(user, 'get', '/summary')
+    print(f"{STICKY}s later: /summary primary {counts['primary']}, replica {counts['replica']}")
+    if not counts['replica']:
+        failures.append("/summary did not return to the replica after READ_REPLICA_STICKY")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,151 @@
+"""Drive the main routes through the Flask test client on a synthetic dataset and record latency
+percentiles and SQL statement counts per route.
+
+    python benchmarks/routes.py --history 1000000 --output results/$(git rev-parse --short HEAD).json
+    python benchmarks/routes.py --db /tmp/parking.db --compare results/old.json
+
+--db reuses a database built by dataset.py (or builds one there on first use), so several versions of the
+code can be measured against the same data.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+
+from support import make_app, login
+from dataset import generate, vehicle_number
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def measure(requests, call):
+    from services.querystats import track_queries
+
+    latencies, statements = [], []
+    for i in range(requests):
+        with track_queries() as counter:
+            started = time.perf_counter()
+            response = call(i)
+            latencies.append((time.perf_counter() - started) * 1000)
+        statements.append(counter.count)
+        if response.status_code >= 400:
+            raise RuntimeError(f"request failed with {response.status_code}")
+
+    return {'requests': requests,
+            'p50_ms': round(percentile(latencies, 50), 3), 'p90_ms': round(percentile(latencies, 90), 3),
+            'p99_ms': round(percentile(latencies, 99), 3), 'mean_ms': round(statistics.fmean(latencies), 3),
+            'statements': statistics.median(statements), 'max_statements': max(statements)}
+
+
+def run(app, requests, lot_id, user_email):
+    import random
+    from models.models import ReservedSpots, User
+
+    admin = login(app, 'admin@example.com')
+    user = login(app, user_email)
+    with app.app_context():
+        user_id = User.query.filter_by(email = user_email).one().id
+
+    rng = random.Random(1)
+    queries = ['pune', 'marine drive', '4000', '560', 'hill road', 'mumbai', 'kochi', '']
+
+    def book(i):
+        return user.post(f"/user/spot/book/{lot_id}", data = {'vehicle_number': vehicle_number(rng)})
+
+    def release(i):
+        with app.app_context():
+            reservation = (ReservedSpots.query.filter_by(user_id = user_id, leaving_time = None)
+                           .order_by(ReservedSpots.id.desc()).first())
+        return user.post(f"/user/spot/release/{reservation.id}", data = {})
+
+    routes = {
+        'admin.dashboard': lambda i: admin.get('/admin/dashboard'),
+        'summary (admin)': lambda i: admin.get('/summary'),
+        'summary (user)': lambda i: user.get('/summary'),
+        'user.user_dashboard': lambda i: user.get('/user/dashboard'),
+        'user.parking_search': lambda i: user.post('/user/api/parking-search', json = {'query': queries[i % len(queries)]}),
+        'user.book_spot (GET)': lambda i: user.get(f"/user/spot/book/{lot_id}"),
+        'user.book_spot (POST)': book,
+        'user.spot_release (POST)': release,
+        'admin.lot_search': lambda i: admin.post('/admin/lot-search', data = {'search_by': 'address', 'query': queries[i % 6]}),
+    }
+
+    results = {}
+    for name, call in routes.items():
+        results[name] = measure(requests, call)
+        print(f"{name:<28} p50 {results[name]['p50_ms']:>8.2f} ms  p99 {results[name]['p99_ms']:>8.2f} ms  "
+              f"{results[name]['statements']:>5} stmts")
+    return results
+
+
+def compare(current, baseline_path):
+    with open(baseline_path) as handle:
+        baseline = json.load(handle)['routes']
+
+    print(f"\n{'route':<28}{'p50 before':>12}{'p50 now':>10}{'change':>9}{'stmts before':>14}{'now':>6}")
+    for name, now in current.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        change = (now['p50_ms'] - before['p50_ms']) / before['p50_ms'] * 100 if before['p50_ms'] else 0
+        print(f"{name:<28}{before['p50_ms']:>12.2f}{now['p50_ms']:>10.2f}{change:>8.0f}%"
+              f"{before['statements']:>14}{now['statements']:>6}")
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text = True,
+                                       cwd = os.path.dirname(os.path.abspath(__file__))).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--db', help = 'SQLite file to reuse; generated on first use')
+    parser.add_argument('--lots', type = int, default = 50)
+    parser.add_argument('--spots', type = int, default = 500)
+    parser.add_argument('--users', type = int, default = 1000)
+    parser.add_argument('--history', type = int, default = 100000)
+    parser.add_argument('--seed', type = int, default = 42)
+    parser.add_argument('--requests', type = int, default = 50, help = 'requests per route')
+    parser.add_argument('--output', help = 'write results as JSON here')
+    parser.add_argument('--compare', help = 'earlier JSON results to compare against')
+    args = parser.parse_args()
+
+    fresh = not (args.db and os.path.exists(args.db))
+    app, db_path = make_app(args.db)
+    dataset = {'lots': args.lots, 'spots': args.spots, 'users': args.users, 'history': args.history, 'seed': args.seed}
+    if fresh:
+        generate(app, args.lots, args.spots, args.users, args.history, seed = args.seed)
+
+    from models.models import ParkingLots
+    with app.app_context():
+        lot_id = ParkingLots.query.filter_by(active = True).order_by(ParkingLots.available_spots.desc()).first().id
+
+    results = run(app, args.requests, lot_id, 'user0@example.com')
+
+    report = {'meta': {'revision': git_revision(), 'python': platform.python_version(), 'database': db_path,
+                       'dataset': dataset if fresh else 'reused', 'requests': args.requests,
+                       'recorded_at': time.strftime('%Y-%m-%dT%H:%M:%S')},
+              'routes': results}
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok = True)
+        with open(args.output, 'w') as handle:
+            json.dump(report, handle, indent = 2)
+        print(f"results written to {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""Compare lot search through the FTS5 / trigram index against the old address ilike('%q%') scan.
+
+    python benchmarks/search_index.py --lots 100000
+"""
+import argparse
+import random
+import statistics
+import time
+
+from sqlalchemy import insert
+
+from support import make_app
+
+
+STREETS = ['MG Road', 'FC Road', 'Linking Road', 'Station Road', 'Park Street', 'Brigade Road', 'Marine Drive',
+           'Hill Road', 'Nehru Nagar', 'Gandhi Chowk', 'Church Street', 'Residency Road', 'Anna Salai']
+CITIES = ['Mumbai', 'Pune', 'Bengaluru', 'Chennai', 'Kolkata', 'Hyderabad', 'Ahmedabad', 'Jaipur', 'Lucknow',
+          'Nagpur', 'Indore', 'Bhopal', 'Kochi', 'Surat', 'Vadodara', 'Nashik']
+NAMES = ['Central', 'Metro', 'City', 'Plaza', 'Mall', 'Tower', 'Market', 'Junction', 'Square', 'Terminal']
+
+QUERIES = ['pune', 'marine drive', 'brigade road bengaluru', 'hydrabad', 'linkng road', 'nagpur central', 'kochi']
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples), result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--lots', type = int, default = 100000)
+    parser.add_argument('--repeat', type = int, default = 5)
+    parser.add_argument('--seed', type = int, default = 7)
+    args = parser.parse_args()
+
+    app, _ = make_app()
+    from models.models import db, ParkingLots
+    import services.search as search
+
+    rng = random.Random(args.seed)
+    rows = [{'primename': f"{rng.choice(NAMES)} {rng.choice(NAMES)} Parking",
+             'address': f"{rng.randint(1, 999)} {rng.choice(STREETS)}, {rng.choice(CITIES)}",
+             'pincode': f"{rng.randint(110000, 855999)}", 'price': 20, 'maxspots': 0, 'active': True}
+            for _ in range(args.lots)]
+
+    with app.app_context():
+        fts = search.fts_available()
+        if fts:
+            search.ensure_fts()   # triggers fill the index as the lots go in
+
+        started = time.perf_counter()
+        for start in range(0, len(rows), 10000):
+            db.session.execute(insert(ParkingLots), rows[start:start + 10000])
+        db.session.commit()
+        print(f"inserted {args.lots} lots in {time.perf_counter() - started:.2f}s (fts5 {'on' if fts else 'unavailable'})")
+
+        started = time.perf_counter()
+        search._build_memory_index()
+        print(f"built in-process trigram index in {time.perf_counter() - started:.2f}s")
+
+        print(f"{'query':<24}{'ilike ms':>10}{'hits':>7}{'fts5 ms':>10}{'hits':>7}{'trigram ms':>12}{'hits':>7}")
+        for query in QUERIES:
+            ilike_ms, ilike_hits = timed(lambda: ParkingLots.query.filter(
+                ParkingLots.address.ilike(f"%{query}%")).all(), args.repeat)
+            fts_ms, fts_hits = timed(lambda: search._search_fts(query, 50), args.repeat) if fts else (float('nan'), [])
+            memory_ms, memory_hits = timed(lambda: search.memory_index.search(query, 50), args.repeat)
+
+            print(f"{query:<24}{ilike_ms:>10.1f}{len(ilike_hits):>7}{fts_ms:>10.1f}{len(fts_hits):>7}"
+                  f"{memory_ms:>12.1f}{len(memory_hits):>7}")
+
+    print("ilike returns every substring match unranked; the index returns the top 50 ranked, typos included.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""Cold start of a worker: importing app, create_app(), and the first requests, each run in a fresh interpreter.
+
+    python benchmarks/startup.py --runs 10
+
+Fails if importing app loads the blueprints, forms or models, or if importing it and building the app opens
+a database connection: a worker must start even while the database is unreachable.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from support import ROOT, make_app
+
+CHILD = r'''
+import json, sys, time
+started = time.perf_counter()
+import app as app_module
+imported = time.perf_counter()
+eager = [name for name in ('main.main', 'user.user', 'admin.admin', 'forms.forms', 'models.models', 'flask_migrate')
+         if name in sys.modules]
+
+from sqlalchemy import event
+from sqlalchemy.pool import Pool
+connections = []
+event.listen(Pool, 'connect', lambda *args: connections.append(1))
+
+app = app_module.create_app({'WTF_CSRF_ENABLED': False})
+created = time.perf_counter()
+opened_at_start = len(connections)
+
+client = app.test_client()
+timings = []
+for method, path, data in (('get', '/login', None),
+                           ('post', '/login', {'email': 'admin@example.com', 'password': 'password'}),
+                           ('get', '/admin/dashboard', None), ('get', '/admin/dashboard', None)):
+    sent = time.perf_counter()
+    status = getattr(client, method)(path, data = data).status_code
+    timings.append((f"{method.upper()} {path}", time.perf_counter() - sent, status))
+
+print(json.dumps({'import': imported - started, 'create_app': created - imported, 'eager': eager,
+                  'connections': opened_at_start, 'requests': timings}))
+'''
+
+
+def run_child(env):
+    output = subprocess.run([sys.executable, '-c', CHILD], cwd = ROOT, env = env, capture_output = True,
+                            text = True, check = True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type = int, default = 5)
+    args = parser.parse_args()
+
+    _, db_path = make_app()   # schema and the default admin, built in this process
+    env = dict(os.environ, DATABASE_URI = 'sqlite:///' + db_path)
+    runs = [run_child(env) for _ in range(args.runs)]
+
+    def median_ms(values):
+        return statistics.median(values) * 1000
+
+    print(f"{'step':<30} {'median ms':>9}")
+    print(f"{'import app':<30} {median_ms([run['import'] for run in runs]):>9.1f}")
+    print(f"{'create_app()':<30} {median_ms([run['create_app'] for run in runs]):>9.1f}")
+    for index, (label, _, status) in enumerate(runs[0]['requests']):
+        ordinal = 'first' if index == 0 or label != runs[0]['requests'][index - 1][0] else 'again'
+        print(f"{label + ' (' + ordinal + ')':<30} {median_ms([run['requests'][index][1] for run in runs]):>9.1f}"
+              f"  {status}")
+
+    failures = []
+    if runs[0]['eager']:
+        failures.append(f"importing app loaded {', '.join(runs[0]['eager'])}")
+    if any(run['connections'] for run in runs):
+        failures.append("importing app or create_app() opened a database connection")
+
+    # with the database unreachable the app must still build; only requests that need it fail
+    unreachable = dict(os.environ, DATABASE_URI = 'sqlite:////nonexistent-directory/parking.db')
+    check = subprocess.run([sys.executable, '-c', "import app; app.create_app()"], cwd = ROOT, env = unreachable,
+                           capture_output = True, text = True)
+    if check.returncode != 0:
+        failures.append(f"create_app() failed without a database: {check.stderr.strip().splitlines()[-1]}")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
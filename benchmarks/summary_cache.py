@@ -0,0 +1,142 @@
+"""/summary latency with the summary dataset cache off, in memory and in a shared SQLite file, plus
+invalidation checks.
+
+    python benchmarks/summary_cache.py --lots 500 --history 100000 --requests 200
+
+Fails if a booking, release or lot edit leaves a cached dataset stale, if the SQLite backend is not shared
+between two backend instances (two workers), or if TTL expiry and LRU eviction do not hold.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from support import make_app, login
+from dataset import generate
+from routes import percentile
+
+
+def _latencies(client, path, count):
+    latencies = []
+    for _ in range(count):
+        started = time.perf_counter()
+        client.get(path)
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def _touch_gap(backend):
+    return getattr(backend, 'TOUCH_INTERVAL', 0) + 0.5
+
+
+def _check_backend(backend, failures):
+    name = type(backend).__name__
+    now = time.time()
+
+    backend.set('lots', [1], now + 10, now)
+    if backend.get('lots', now) != [1] or backend.get('lots', now + 11) is not None:
+        failures.append(f"{name}: TTL expiry")
+
+    for key in ('usage:1', 'usage:2', 'usage:3'):
+        backend.set(key, key, now + 60, now)
+    backend.get('usage:1', now + _touch_gap(backend))   # most recently used now
+    backend.set('usage:4', 'usage:4', now + 60, now + _touch_gap(backend))
+    if backend.get('usage:1', now) is None or backend.get('usage:2', now) is not None:
+        failures.append(f"{name}: LRU eviction")
+
+    backend.invalidate(['usage'], now + 5)
+    if any(backend.get(f'usage:{i}', now) is not None for i in (1, 3, 4)):
+        failures.append(f"{name}: invalidating 'usage' kept a user's entry")
+    backend.set('usage:1', 'stale', now + 60, now + 4)   # computed before the invalidation
+    if backend.get('usage:1', now) is not None:
+        failures.append(f"{name}: stored a value computed before an invalidation")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--lots', type = int, default = 200)
+    parser.add_argument('--spots', type = int, default = 100)
+    parser.add_argument('--history', type = int, default = 50000)
+    parser.add_argument('--requests', type = int, default = 100)
+    args = parser.parse_args()
+
+    app, _ = make_app()
+    generate(app, lots = args.lots, spots = args.spots, users = 20, history = args.history, log = lambda message: None)
+
+    from main import main as views
+    from models.models import ReservedSpots
+    from prometheus_client import REGISTRY
+    from services.summarycache import cache, MemoryBackend, SqliteBackend
+
+    def counted(dataset, result):
+        return REGISTRY.get_sample_value('parking_summary_cache_total', {'dataset': dataset, 'result': result}) or 0
+
+    cache_path = os.path.join(tempfile.mkdtemp(prefix = 'parking-bench-'), 'summary-cache.db')
+    admin = login(app, 'admin@example.com')
+    user = login(app, 'user0@example.com')
+    failures = []
+
+    print(f"{'backend':<8} {'admin p50 ms':>12} {'admin p95 ms':>12} {'user p50 ms':>11} {'user p95 ms':>11}")
+    for label, backend in (('off', None), ('memory', MemoryBackend(1000)), ('sqlite', SqliteBackend(cache_path, 1000))):
+        cache.configure(backend, ttl = 60)
+        admin_times = _latencies(admin, '/summary', args.requests)
+        user_times = _latencies(user, '/summary', args.requests)
+        print(f"{label:<8} {percentile(admin_times, 50) * 1000:>12.2f} {percentile(admin_times, 95) * 1000:>12.2f} "
+              f"{percentile(user_times, 50) * 1000:>11.2f} {percentile(user_times, 95) * 1000:>11.2f}")
+
+    # the SQLite backend is live from here on: every check below goes through the shared file
+    hits, misses = counted('lots', 'hit'), counted('lots', 'miss')
+    admin.get('/summary')
+    if counted('lots', 'hit') != hits + 1 or counted('lots', 'miss') != misses:
+        failures.append("a warm /summary did not count a hit")
+
+    def cached(key):
+        return cache.backend.get(key, time.time())
+
+    booking = user.post('/user/spot/book/1', data = {'vehicle_number': 'MH01ZZ0001'})
+    with app.app_context():
+        reservation = ReservedSpots.query.filter_by(vehicle_number = 'MH01ZZ0001').one()
+        user_id, reservation_id = reservation.user_id, reservation.id
+    if booking.status_code != 302 or cached('lots') is not None or cached(f'usage:{user_id}') is not None:
+        failures.append("a booking left the lot counts or the user's usage cached")
+
+    admin.get('/summary')
+    user.get('/summary')
+    with app.app_context():
+        if cached('lots') != views._lot_chart() or cached(f'usage:{user_id}') != views._spot_usage(user_id):
+            failures.append("datasets recomputed after the booking do not match the database")
+
+    user.post(f'/user/spot/release/{reservation_id}', data = {})
+    if cached('revenue') is not None or cached('lots') is not None:
+        failures.append("a release left the revenue or lot counts cached")
+
+    admin.get('/summary')
+    admin.post('/admin/parking-lot/1', data = {'primename': 'Renamed Lot', 'address': 'Renamed address 1',
+                                                'pincode': '400001', 'price': 20, 'maxspots': args.spots})
+    with app.app_context():
+        if cached('lots') is not None or views._lot_chart()['lot_labels'][0] != 'Renamed':
+            failures.append("a lot edit left the lot labels cached")
+
+    other_worker = SqliteBackend(cache_path, 1000)   # a second process on the host opens the same file
+    admin.get('/summary')
+    if other_worker.get('lots', time.time()) is None:
+        failures.append("the SQLite backend is not shared between backend instances")
+    with app.test_request_context():
+        cache.drop(['lots'])
+    if other_worker.get('lots', time.time()) is not None:
+        failures.append("an invalidation did not reach the other backend instance")
+
+    _check_backend(MemoryBackend(3), failures)
+    _check_backend(SqliteBackend(os.path.join(os.path.dirname(cache_path), 'lru.db'), 3), failures)
+
+    print(f"lookups: lots {counted('lots', 'hit'):.0f} hits / {counted('lots', 'miss'):.0f} misses, "
+          f"revenue {counted('revenue', 'hit'):.0f} / {counted('revenue', 'miss'):.0f}, "
+          f"usage {counted('usage', 'hit'):.0f} / {counted('usage', 'miss'):.0f}")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,52 @@
+"""Fail if /summary issues more SQL statements than a fixed budget, however many lots and spots exist.
+
+    python benchmarks/summary_query_budget.py --lots 20 --spots 50
+"""
+import argparse
+import sys
+
+from support import make_app, create_user, create_lot, login
+
+
+QUERY_BUDGET = 8
+
+
+def count_statements(client, path):
+    from services.querystats import track_queries
+
+    with track_queries() as log:
+        response = client.get(path)
+
+    if response.status_code != 200:
+        raise RuntimeError(f"{path} returned {response.status_code}")
+    return log.count
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--lots', type = int, default = 20)
+    parser.add_argument('--spots', type = int, default = 50)
+    args = parser.parse_args()
+
+    app, _ = make_app()
+    lot_ids = [create_lot(app, args.spots, primename = f"Lot{i} Bench", pincode = f"{400000 + i}")
+               for i in range(args.lots)]
+
+    create_user(app, 'driver@example.com')
+    driver = login(app, 'driver@example.com')
+    for i, lot_id in enumerate(lot_ids):
+        driver.post(f"/user/spot/book/{lot_id}", data = {'vehicle_number': f"MH12AB{i:04d}"})
+
+    admin = login(app, 'admin@example.com')
+    failures = 0
+    for role, client in (('admin', admin), ('user', driver)):
+        count = count_statements(client, '/summary')
+        status = 'ok' if count <= QUERY_BUDGET else 'OVER BUDGET'
+        print(f"/summary as {role}: {count} statements (budget {QUERY_BUDGET}) {status}")
+        failures += count > QUERY_BUDGET
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
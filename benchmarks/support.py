@@ -0,0 +1,56 @@
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def make_app(db_path = None):
+    """Build the app against a throwaway SQLite file with the schema and default roles in place."""
+    if db_path is None:
+        db_path = os.path.join(tempfile.mkdtemp(prefix = 'parking-bench-'), 'bench.db')
+
+    from app import create_app, create_users
+    from models.models import db
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + db_path, 'WTF_CSRF_ENABLED': False, 'TESTING': True})
+
+    with app.app_context():
+        db.create_all(bind_key = None)   # the primary only, a replica is a copy of it
+        create_users()
+
+    return app, db_path
+
+
+def create_user(app, email, password = 'password'):
+    from flask_security.utils import hash_password
+    from models.models import db
+
+    datastore = app.extensions['security'].datastore
+    with app.app_context():
+        datastore.create_user(email = email, password = hash_password(password), name = email.split('@')[0],
+                              address = 'bench address', pincode = '400001', roles = [datastore.find_role('user')])
+        db.session.commit()
+
+
+def login(app, email, password = 'password'):
+    client = app.test_client()
+    response = client.post('/login', data = {'email': email, 'password': password})
+    if response.status_code not in (200, 302):
+        raise RuntimeError(f"login failed for {email}: {response.status_code}")
+    return client
+
+
+def create_lot(app, spots, primename = 'Bench Lot', address = None, pincode = '400001', price = 20):
+    client = login(app, 'admin@example.com')
+    address = address or f"{primename} address"
+    response = client.post('/admin/parking-lot', data = dict(primename = primename, address = address,
+                                                           pincode = pincode, price = price, maxspots = spots))
+    if response.status_code != 302:
+        raise RuntimeError(f"could not create lot: {response.status_code}")
+
+    from models.models import ParkingLots
+    with app.app_context():
+        return ParkingLots.query.filter_by(address = address).one().id
+
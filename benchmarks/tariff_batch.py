@@ -0,0 +1,73 @@
+"""Bill many sessions with services.tariff: the vectorised batch against charge() one session at a time.
+Fails if the two disagree on any session.
+
+    python benchmarks/tariff_batch.py --sessions 200000
+"""
+import argparse
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from support import make_app
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sessions', type = int, default = 200000)
+    parser.add_argument('--lots', type = int, default = 20)
+    parser.add_argument('--seed', type = int, default = 7)
+    args = parser.parse_args()
+
+    app, _ = make_app()
+    from models.models import db, ParkingLots, LotTariff
+    from services.tariff import Tariff, batch_charges, charge, lot_tariffs
+
+    rng = random.Random(args.seed)
+    now = datetime(2026, 10, 18, 12, 0, 0)
+
+    with app.app_context():
+        db.session.execute(ParkingLots.__table__.insert(),
+                           [{'primename': f"Tariff {i}", 'price': 20, 'address': f"tariff lot {i}", 'pincode': '400001',
+                             'maxspots': 0, 'active': True} for i in range(args.lots)])
+        lot_ids = [lot_id for lot_id, in db.session.query(ParkingLots.id)]
+        for lot_id in lot_ids[::2]:   # half the lots keep flat hourly billing
+            db.session.add(LotTariff(lot_id = lot_id,
+                                     first_hour_rate = rng.choice([None, Decimal(rng.randint(10, 60))]),
+                                     daily_cap = rng.choice([None, Decimal(rng.randint(150, 600))]),
+                                     night_rate = rng.choice([None, Decimal(rng.randint(5, 15))]),
+                                     night_start = rng.choice([20, 21, 22, 23, 0]), night_end = rng.choice([5, 6, 7])))
+        db.session.commit()
+
+        rows = []
+        for i in range(args.sessions):
+            parked = now - timedelta(seconds = rng.uniform(0, 90 * 86400))
+            left = parked + timedelta(seconds = rng.choice([rng.uniform(0, 7200), rng.uniform(0, 4 * 86400)]))
+            rows.append((i, rng.choice(lot_ids), Decimal(rng.choice([10, 15, 20, 35, 50, 80])), parked,
+                         None if rng.random() < 0.2 else min(left, now)))
+
+        started = time.perf_counter()
+        batch = batch_charges(rows, end = now)
+        batch_s = time.perf_counter() - started
+
+        started = time.perf_counter()
+        tariffs = lot_tariffs(lot_ids)
+        exact = {key: charge(Tariff.for_lot(rate, tariffs.get(lot_id)), parked, left or now)
+                 for key, lot_id, rate, parked, left in rows}
+        exact_s = time.perf_counter() - started
+
+    mismatches = [key for key in exact if exact[key] != batch[key]]
+    print(f"{args.sessions} sessions: batch {batch_s:.2f}s, one at a time {exact_s:.2f}s "
+          f"({exact_s / batch_s:.1f}x), total {sum(batch.values())}")
+    if mismatches:
+        key = mismatches[0]
+        print(f"FAIL: {len(mismatches)} session(s) differ, e.g. {rows[key]}: batch {batch[key]} exact {exact[key]}")
+        return 1
+
+    print("OK: batch matches exact billing to the paisa")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -68,6 +68,10 @@ class LotSearchForm(FlaskForm):
     submit = SubmitField('Search')
 
 
+class ResetMetricsForm(FlaskForm):
+    submit = SubmitField('Reset')
+
+
 
 class EditProfileForm(FlaskForm):
     email = EmailField('Email', validators=[DataRequired(),Email(message="Enter a valid email address.")])
@@ -0,0 +1,42 @@
+import os
+import shutil
+
+
+# Shared Prometheus registry for all workers: each worker writes its samples under PROMETHEUS_MULTIPROC_DIR
+# and /metrics sums them. The directory is emptied on start so counters do not carry over from the last run.
+
+multiproc_dir = os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/parking-app-metrics')
+
+# /summary chart data cached in one file for all workers (see services.summarycache), emptied on start as well
+os.environ.setdefault('SUMMARY_CACHE', 'sqlite')
+summary_cache_path = os.environ.setdefault('SUMMARY_CACHE_PATH', '/tmp/parking-app-summary-cache.db')
+
+bind = os.getenv('GUNICORN_BIND', '127.0.0.1:8000')
+workers = int(os.getenv('GUNICORN_WORKERS', '4'))
+# Each open dashboard holds a live feed stream (and an export holds its response) for as long as it runs.
+# gevent workers serve them as greenlets, up to worker_connections each, and their timeout only watches
+# the worker heartbeat, so long streams are not killed. With 'sync' every stream takes a whole worker.
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gevent')
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', '1000'))
+# a sync worker is killed after this many seconds in one request, exports included; raise it if you run sync
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '30'))
+
+
+def on_starting(server):
+    shutil.rmtree(multiproc_dir, ignore_errors = True)
+    os.makedirs(multiproc_dir)
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(summary_cache_path + suffix):
+            os.remove(summary_cache_path + suffix)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
+
+
+def worker_exit(server, worker):
+    from services.anpr import pipeline
+
+    pipeline.shutdown()   # write out queued gate events before the worker goes away
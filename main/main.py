@@ -0,0 +1,145 @@
+from flask import Blueprint, redirect, flash, url_for, render_template, request, abort, current_app, g
+from flask_security import auth_required, current_user
+from models.models import db, User, ParkingLots, ParkingSpot, ReservationHistory
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy import func
+from forms.forms import EditProfileForm
+from services.revenue import spot_revenue_totals
+from services import metrics, summarycache
+from services.replica import read_replica
+from services.versions import conditional, tag, global_version
+
+main_bp = Blueprint('main', __name__)
+
+
+@main_bp.route('/')
+def home():
+    if current_user.is_authenticated:
+        if current_user.has_role('admin'):
+            return redirect(url_for('admin.dashboard'))
+        else:
+            return redirect(url_for('user.user_dashboard'))
+
+    return redirect(url_for('security.login'))
+
+
+@main_bp.route('/edit-profile' , methods = ['GET' , 'POST'])
+@auth_required()
+def edit_profile():
+    form = EditProfileForm(obj = current_user)
+
+
+    if form.validate_on_submit():
+        new_email = form.email.data.strip()
+
+        if new_email != current_user.email:
+            existing_email= User.query.filter_by(email=new_email).first()
+
+            if existing_email:
+                flash("Email already in use.", "danger")
+                return render_template('edit_profile.html', form=form)
+
+        current_user.email = new_email
+        current_user.pincode = form.pincode.data.strip()
+        current_user.name =  form.name.data.strip()
+        current_user.address = form.address.data.strip()
+
+        try:
+            db.session.commit()
+            flash("Details Updated Successfully" , 'success')
+
+            if current_user.has_role('admin'):
+                return redirect(url_for('admin.dashboard'))
+
+            else:
+                return redirect(url_for('user.user_dashboard'))
+
+        except SQLAlchemyError:
+            current_app.logger.exception("Failed to update profile")
+            db.session.rollback()
+            flash("Error Occurred Please Try Again", 'danger')
+
+    return render_template('edit_profile.html' , form = form)
+
+
+def _revenue_chart():
+    spot_revenue = spot_revenue_totals()   # pre-aggregated daily rollups of total_cost
+
+    return {'revenue_labels': [f"Spot {spot_id}" for spot_id, _ in spot_revenue],
+            'revenue_values': [float(revenue or 0) for _, revenue in spot_revenue]}
+
+
+def _lot_chart():
+    lots = ParkingLots.query.filter_by(active = True).order_by(ParkingLots.id).all()
+    chart = {'lot_labels': [], 'available_counts': [], 'occupied_counts': []}
+
+    for lot in lots:   # counters are kept current by services.availability, no per-spot queries
+        chart['lot_labels'].append(lot.primename.split()[0])  # First word of lot name
+        chart['available_counts'].append(lot.available_spots)
+        chart['occupied_counts'].append(lot.occupied_spots)
+
+    return chart
+
+
+def _spot_usage(user_id):
+    spot_usage = (
+        db.session.query(ParkingSpot.id, ParkingLots.primename, func.count(ReservationHistory.id))
+        .join(ReservationHistory, ReservationHistory.spot_id == ParkingSpot.id)
+        .join(ParkingLots, ParkingLots.id == ParkingSpot.lot_id)
+        .filter(ReservationHistory.user_id == user_id)
+        .group_by(ParkingSpot.id, ParkingLots.primename)
+        .order_by(func.min(ReservationHistory.id))
+        .all()
+    )
+
+    return {'labels': [f"{spot_id}-{primename.split(' ')[0]}" for spot_id, primename, _ in spot_usage],
+            'values': [count for _, _, count in spot_usage]}
+
+
+def _summary_version():
+    # read once per request, before any chart data: the ETag and the cached datasets use the same version
+    if 'summary_version' not in g:
+        g.summary_version = global_version()
+    return g.summary_version
+
+
+@main_bp.route('/summary', methods = ['GET'])
+@auth_required()
+@read_replica
+@conditional(lambda: tag('summary', current_user.id, _summary_version()))
+def parking_summary():
+    version = _summary_version()
+
+    if current_user.has_role('admin'):
+        # chart data is cached, see services.summarycache for what invalidates it
+        revenue = summarycache.cache.fetch('revenue', _revenue_chart, version)
+        lots = summarycache.cache.fetch('lots', _lot_chart, version)
+
+        return render_template("summary.html", **revenue, **lots, user=current_user)
+
+
+
+    else:
+        user_id = current_user.id
+        usage = summarycache.cache.fetch(f'usage:{user_id}', lambda: _spot_usage(user_id), version)
+        values = usage['values']
+
+        max_value = max(values) if values else 1 
+
+        return render_template('summary.html' ,labels = usage['labels'] , max_value = max_value  , values = values , user = current_user)
+
+
+@main_bp.route('/metrics', methods = ['GET'])
+def prometheus_metrics():
+    # a scraper sends METRICS_TOKEN; without one configured only a signed-in admin may read them
+    token = current_app.config['METRICS_TOKEN']
+    if token:
+        if request.headers.get('Authorization') != f"Bearer {token}":
+            abort(401)
+    elif not current_user.is_authenticated:
+        abort(401)
+    elif not current_user.has_role('admin'):
+        abort(403)
+
+    body, content_type = metrics.exposition()
+    return body, 200, {'Content-Type': content_type}
@@ -86,6 +86,13 @@ def run_migrations_online():
 
     conf_args["render_as_batch"] = True
 
+    # the FTS5 lot search table and its shadow tables are managed by hand, keep autogenerate off them
+    def include_object(object, name, type_, reflected, compare_to):
+        return not (type_ == 'table' and reflected and compare_to is None and name.startswith('lot_search'))
+
+    if conf_args.get("include_object") is None:
+        conf_args["include_object"] = include_object
+
     connectable = get_engine()
 
     with connectable.connect() as connection:
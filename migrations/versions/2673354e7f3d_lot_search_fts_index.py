@@ -0,0 +1,69 @@
+"""lot search fts index
+
+Revision ID: 2673354e7f3d
+Revises: 94154f5398a7
+Create Date: 2026-10-18 14:21:53.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2673354e7f3d'
+down_revision = '94154f5398a7'
+branch_labels = None
+depends_on = None
+
+
+# SQLite only. Note that a batch (copy and move) migration of parking_lots drops these triggers,
+# such a migration has to recreate them.
+
+FTS_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS lot_search USING fts5(primename, address, pincode, tokenize='trigram')",
+    """CREATE TRIGGER IF NOT EXISTS lot_search_ai AFTER INSERT ON parking_lots WHEN new.active BEGIN
+        INSERT INTO lot_search(rowid, primename, address, pincode) VALUES (new.id, new.primename, new.address, new.pincode);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS lot_search_ad AFTER DELETE ON parking_lots BEGIN
+        DELETE FROM lot_search WHERE rowid = old.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS lot_search_au AFTER UPDATE OF primename, address, pincode, active ON parking_lots BEGIN
+        DELETE FROM lot_search WHERE rowid = old.id;
+        INSERT INTO lot_search(rowid, primename, address, pincode)
+            SELECT new.id, new.primename, new.address, new.pincode WHERE new.active;
+    END""",
+)
+
+
+def _has_fts5(bind):
+    # FTS5 alone is not enough, the trigram tokenizer needs SQLite 3.34
+    if bind.dialect.name != 'sqlite':
+        return False
+    try:
+        bind.execute(sa.text("CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(x, tokenize='trigram')"))
+        bind.execute(sa.text("DROP TABLE temp.fts5_probe"))
+        return True
+    except sa.exc.OperationalError:
+        return False
+
+
+def upgrade():
+    bind = op.get_bind()
+    if not _has_fts5(bind):
+        return   # other databases use the in-process index in services/search.py
+
+    for ddl in FTS_DDL:
+        op.execute(ddl)
+
+    op.execute("INSERT INTO lot_search(rowid, primename, address, pincode) "
+               "SELECT id, primename, address, pincode FROM parking_lots WHERE active")
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    op.execute("DROP TRIGGER IF EXISTS lot_search_au")
+    op.execute("DROP TRIGGER IF EXISTS lot_search_ad")
+    op.execute("DROP TRIGGER IF EXISTS lot_search_ai")
+    op.execute("DROP TABLE IF EXISTS lot_search")
@@ -0,0 +1,57 @@
+"""reservation location snapshot
+
+Revision ID: 3150f8b446b1
+Revises: 872961b966b2
+Create Date: 2026-10-18 11:40:07.226415
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3150f8b446b1'
+down_revision = '872961b966b2'
+branch_labels = None
+depends_on = None
+
+
+reserved_spots = sa.table('reserved_spots',
+    sa.column('spot_id', sa.Integer),
+    sa.column('location_at_booking', sa.String),
+    sa.column('primename_at_booking', sa.String),
+)
+
+parking_spot = sa.table('parking_spot',
+    sa.column('id', sa.Integer),
+    sa.column('lot_id', sa.Integer),
+)
+
+parking_lots = sa.table('parking_lots',
+    sa.column('id', sa.Integer),
+    sa.column('address', sa.String),
+    sa.column('primename', sa.String),
+)
+
+
+def _lot_column(column):
+    return (sa.select(column)
+            .select_from(parking_spot.join(parking_lots, parking_spot.c.lot_id == parking_lots.c.id))
+            .where(parking_spot.c.id == reserved_spots.c.spot_id)
+            .scalar_subquery())
+
+
+def upgrade():
+    with op.batch_alter_table('reserved_spots', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('location_at_booking', sa.String(length=225), nullable=True))
+        batch_op.add_column(sa.Column('primename_at_booking', sa.String(length=225), nullable=True))
+
+    # existing reservations take the lot's current details
+    op.execute(reserved_spots.update().values(location_at_booking=_lot_column(parking_lots.c.address),
+                                              primename_at_booking=_lot_column(parking_lots.c.primename)))
+
+
+def downgrade():
+    with op.batch_alter_table('reserved_spots', schema=None) as batch_op:
+        batch_op.drop_column('primename_at_booking')
+        batch_op.drop_column('location_at_booking')
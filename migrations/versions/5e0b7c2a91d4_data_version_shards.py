@@ -0,0 +1,35 @@
+"""data version shards
+
+Revision ID: 5e0b7c2a91d4
+Revises: d13a841325e2
+Create Date: 2026-10-18 21:02:37.418265
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e0b7c2a91d4'
+down_revision = 'd13a841325e2'
+branch_labels = None
+depends_on = None
+
+
+# services.versions spreads the global counter over 'global' and 'global:1'..'global:15'; the rows exist up
+# front so concurrent writers never race to insert one.
+SHARDS = [f'global:{shard}' for shard in range(1, 16)]
+
+
+def upgrade():
+    data_version = sa.table('data_version', sa.column('name', sa.String), sa.column('version', sa.Integer))
+    op.bulk_insert(data_version, [{'name': name, 'version': 0} for name in SHARDS])
+
+
+def downgrade():
+    data_version = sa.table('data_version', sa.column('name', sa.String), sa.column('version', sa.Integer))
+    # fold the shards back into the single counter so the global version does not go backwards
+    op.execute(data_version.update().where(data_version.c.name == 'global').values(
+        version = sa.select(sa.func.sum(data_version.c.version))
+        .where(data_version.c.name.in_(['global'] + SHARDS)).scalar_subquery()))
+    op.execute(data_version.delete().where(data_version.c.name.in_(SHARDS)))
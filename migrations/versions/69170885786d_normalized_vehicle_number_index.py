@@ -0,0 +1,63 @@
+"""normalized vehicle number index
+
+Revision ID: 69170885786d
+Revises: 2673354e7f3d
+Create Date: 2026-10-18 15:37:02.671930
+
+"""
+import re
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '69170885786d'
+down_revision = '2673354e7f3d'
+branch_labels = None
+depends_on = None
+
+
+def normalize_vehicle_number(value):
+    # a copy of models.normalize_vehicle_number as of this revision, migrations do not import the app
+    return re.sub(r'[\s-]', '', value or '').upper()
+
+
+reserved_spots = sa.table('reserved_spots',
+    sa.column('id', sa.Integer),
+    sa.column('vehicle_number', sa.String),
+    sa.column('leaving_time', sa.DateTime),
+)
+
+
+def upgrade():
+    bind = op.get_bind()
+
+    # normalized in Python with the rule of models.normalize_vehicle_number, SQL replace/upper would miss
+    # tabs and other whitespace and upper-case differently from str.upper
+    rows = bind.execute(sa.select(reserved_spots.c.id, reserved_spots.c.vehicle_number)
+                        .where(reserved_spots.c.vehicle_number.is_not(None))).all()
+    changed = [{'row_id': row_id, 'normalized': normalize_vehicle_number(vehicle_number)}
+               for row_id, vehicle_number in rows if normalize_vehicle_number(vehicle_number) != vehicle_number]
+    if changed:
+        bind.execute(reserved_spots.update().where(reserved_spots.c.id == sa.bindparam('row_id'))
+                     .values(vehicle_number=sa.bindparam('normalized')), changed)
+
+    duplicates = bind.execute(
+        sa.select(reserved_spots.c.vehicle_number)
+        .where(reserved_spots.c.leaving_time.is_(None))
+        .group_by(reserved_spots.c.vehicle_number)
+        .having(sa.func.count() > 1)
+    ).scalars().all()
+    if duplicates:
+        raise RuntimeError("Release the duplicate open reservations for these vehicles before upgrading: "
+                           + ", ".join(duplicates))
+
+    with op.batch_alter_table('reserved_spots', schema=None) as batch_op:
+        batch_op.create_index('uq_reserved_spots_open_vehicle', ['vehicle_number'], unique=True,
+                              sqlite_where=sa.text('leaving_time IS NULL'),
+                              postgresql_where=sa.text('leaving_time IS NULL'))
+
+
+def downgrade():
+    with op.batch_alter_table('reserved_spots', schema=None) as batch_op:
+        batch_op.drop_index('uq_reserved_spots_open_vehicle')
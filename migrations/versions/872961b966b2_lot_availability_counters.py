@@ -0,0 +1,52 @@
+"""lot availability counters
+
+Revision ID: 872961b966b2
+Revises: c5fc4df90d0b
+Create Date: 2026-10-18 10:12:41.503118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '872961b966b2'
+down_revision = 'c5fc4df90d0b'
+branch_labels = None
+depends_on = None
+
+
+parking_lots = sa.table('parking_lots',
+    sa.column('id', sa.Integer),
+    sa.column('available_spots', sa.Integer),
+    sa.column('occupied_spots', sa.Integer),
+)
+
+parking_spot = sa.table('parking_spot',
+    sa.column('lot_id', sa.Integer),
+    sa.column('status', sa.String),
+    sa.column('active', sa.Boolean),
+)
+
+
+def _spot_count(status):
+    return (sa.select(sa.func.count())
+            .where(parking_spot.c.lot_id == parking_lots.c.id,
+                   parking_spot.c.active == sa.true(),
+                   parking_spot.c.status == status)
+            .scalar_subquery())
+
+
+def upgrade():
+    with op.batch_alter_table('parking_lots', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('available_spots', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('occupied_spots', sa.Integer(), server_default='0', nullable=False))
+
+    # backfill from the existing spot rows
+    op.execute(parking_lots.update().values(available_spots=_spot_count('A'), occupied_spots=_spot_count('O')))
+
+
+def downgrade():
+    with op.batch_alter_table('parking_lots', schema=None) as batch_op:
+        batch_op.drop_column('occupied_spots')
+        batch_op.drop_column('available_spots')
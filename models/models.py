@@ -1,10 +1,35 @@
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
 from flask_security import UserMixin, RoleMixin
 import uuid
-from sqlalchemy import JSON, func, ForeignKey, CheckConstraint
+import re
+from sqlalchemy import JSON, func, ForeignKey, CheckConstraint, UniqueConstraint, Index, text, select, union_all
+from sqlalchemy.orm import validates
+from sqlalchemy.sql.dml import UpdateBase
 
 
-db = SQLAlchemy()
+class RoutingSession(Session):
+    """Session whose reads go to the 'replica' bind while info['read_replica'] is set (services.replica).
+
+    Inserts, updates, deletes and flushes always go to the primary database.
+    """
+
+    def get_bind(self, mapper = None, clause = None, bind = None, **kwargs):
+        if bind is None and self.info.get('read_replica') and not self._flushing and not isinstance(clause, UpdateBase):
+            replica = self._db.engines.get('replica')
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper = mapper, clause = clause, bind = bind, **kwargs)
+
+
+db = SQLAlchemy(session_options = {'class_': RoutingSession})
+
+
+VEHICLE_NUMBER_PATTERN = r'^(?:[A-Z]{2}\d{2}[A-Z]{1,2}\d{1,4}|\d{2}BH\d{4}[A-Z]{2})$'
+
+
+def normalize_vehicle_number(value):
+    return re.sub(r'[\s-]', '', value or '').upper()
 
 
 class Role(db.Model, RoleMixin):
@@ -50,6 +75,9 @@ class ParkingLots(db.Model):
     pincode = db.Column(db.String(15) , nullable =False)
     maxspots = db.Column(db.Integer , nullable = False)
     active = db.Column(db.Boolean , default = True , nullable = False)
+    available_spots = db.Column(db.Integer , default = 0 , server_default = '0' , nullable = False)  # maintained by services.availability
+    occupied_spots = db.Column(db.Integer , default = 0 , server_default = '0' , nullable = False)
+    version = db.Column(db.Integer , default = 0 , server_default = '0' , nullable = False)   # bumped by services.versions
     spots = db.relationship('ParkingSpot', backref='lot', lazy=True)
 
 
@@ -78,3 +106,120 @@ class ReservedSpots(db.Model):
     leaving_time = db.Column(db.DateTime(timezone=True) )
     rate_at_booking = db.Column(db.Numeric(10,2), nullable=False)
     total_cost = db.Column(db.Numeric(10,2))
+    location_at_booking = db.Column(db.String(225))
+    primename_at_booking = db.Column(db.String(225))
+    __table_args__ = (
+        # a vehicle can only be parked once at a time, also answers the duplicate check in book_spot
+        Index('uq_reserved_spots_open_vehicle', 'vehicle_number', unique=True,
+              sqlite_where=text('leaving_time IS NULL'), postgresql_where=text('leaving_time IS NULL')),
+    )
+
+    @validates('vehicle_number')
+    def _normalize_vehicle_number(self, key, value):
+        return normalize_vehicle_number(value)
+
+
+class ReservedSpotsArchive(db.Model):
+    """Closed reservations moved out of reserved_spots by services.archive, with their original ids."""
+    __tablename__ = 'reserved_spots_archive'
+
+    id = db.Column(db.Integer , primary_key = True , autoincrement = False)
+    spot_id = db.Column(db.Integer , ForeignKey('parking_spot.id') , nullable = True , index = True)
+    user_id = db.Column(db.Integer , ForeignKey('user.id') , nullable = True , index = True)
+    vehicle_number = db.Column(db.String(15) , nullable = False )
+    parking_time = db.Column(db.DateTime(timezone=True) , nullable = False)
+    leaving_time = db.Column(db.DateTime(timezone=True) , nullable = False , index = True)
+    rate_at_booking = db.Column(db.Numeric(10,2), nullable=False)
+    total_cost = db.Column(db.Numeric(10,2))
+    location_at_booking = db.Column(db.String(225))
+    primename_at_booking = db.Column(db.String(225))
+    archived_at = db.Column(db.DateTime(timezone=True) , nullable = False , server_default=func.now())
+
+
+HISTORY_COLUMNS = ('id', 'spot_id', 'user_id', 'vehicle_number', 'parking_time', 'leaving_time', 'rate_at_booking',
+                   'total_cost', 'location_at_booking', 'primename_at_booking')
+
+
+class ReservationHistory(db.Model):
+    """Read-only: reserved_spots UNION ALL reserved_spots_archive. Reports and user history read this."""
+    __table__ = union_all(
+        select(*[ReservedSpots.__table__.c[name] for name in HISTORY_COLUMNS]),
+        select(*[ReservedSpotsArchive.__table__.c[name] for name in HISTORY_COLUMNS]),
+    ).subquery('reservation_history')
+
+
+class SpotRevenueDaily(db.Model):
+    __tablename__ = 'spot_revenue_daily'
+
+    id = db.Column(db.Integer , primary_key = True)
+    spot_id = db.Column(db.Integer , ForeignKey('parking_spot.id') , nullable = False)
+    day = db.Column(db.Date , nullable = False)   # IST date the reservation was released
+    revenue = db.Column(db.Numeric(12,2) , nullable = False , default = 0)
+    sessions = db.Column(db.Integer , nullable = False , default = 0)
+    __table_args__ = (
+        UniqueConstraint('spot_id', 'day', name='uq_spot_revenue_daily_spot_day'),
+    )
+
+
+class LotRevenueDaily(db.Model):
+    __tablename__ = 'lot_revenue_daily'
+
+    id = db.Column(db.Integer , primary_key = True)
+    lot_id = db.Column(db.Integer , ForeignKey('parking_lots.id') , nullable = False)
+    day = db.Column(db.Date , nullable = False)
+    revenue = db.Column(db.Numeric(12,2) , nullable = False , default = 0)
+    sessions = db.Column(db.Integer , nullable = False , default = 0)
+    __table_args__ = (
+        UniqueConstraint('lot_id', 'day', name='uq_lot_revenue_daily_lot_day'),
+    )
+
+
+class LotTariff(db.Model):
+    __tablename__ = 'lot_tariff'
+
+    # optional rules on top of the lot's hourly price (rate_at_booking); no row means flat hourly billing
+    id = db.Column(db.Integer , primary_key = True)
+    lot_id = db.Column(db.Integer , ForeignKey('parking_lots.id') , nullable = False , unique = True)
+    first_hour_rate = db.Column(db.Numeric(10,2))   # flat charge for the first hour or part of it
+    daily_cap = db.Column(db.Numeric(10,2))   # most charged for any 24 hours from parking time
+    night_rate = db.Column(db.Numeric(10,2))   # hourly rate between night_start and night_end (IST hours)
+    night_start = db.Column(db.Integer , nullable = False , default = 22 , server_default = '22')
+    night_end = db.Column(db.Integer , nullable = False , default = 6 , server_default = '6')
+    __table_args__ = (
+        CheckConstraint("night_start BETWEEN 0 AND 23 AND night_end BETWEEN 0 AND 23", name="check_night_hours"),
+    )
+
+
+class AvailabilityEvent(db.Model):
+    __tablename__ = 'availability_event'
+
+    id = db.Column(db.Integer , primary_key = True)
+    lot_id = db.Column(db.Integer , nullable = False)
+    spot_id = db.Column(db.Integer)   # NULL for lot level changes
+    spot_no = db.Column(db.Integer)
+    status = db.Column(db.String(1))   # new spot status, NULL when the spot was removed
+    created_at = db.Column(db.DateTime(timezone=True) , nullable = False , server_default=func.now() , index = True)
+
+
+class AnprEvent(db.Model):
+    __tablename__ = 'anpr_event'
+
+    # one row per gate camera event written by services.anpr, the unique key makes camera retries harmless
+    id = db.Column(db.Integer , primary_key = True)
+    event_key = db.Column(db.String(100) , nullable = False , unique = True)
+    kind = db.Column(db.String(5) , nullable = False)   # 'entry' or 'exit'
+    lot_id = db.Column(db.Integer)
+    vehicle_number = db.Column(db.String(15) , nullable = False)
+    captured_at = db.Column(db.DateTime(timezone=True) , nullable = False)
+    processed_at = db.Column(db.DateTime(timezone=True) , nullable = False , server_default=func.now())
+    status = db.Column(db.String(10) , nullable = False)   # 'processed' or 'rejected'
+    detail = db.Column(db.String(30))   # why it was rejected
+    reservation_id = db.Column(db.Integer)   # reservation opened or closed by the event
+
+
+class DataVersion(db.Model):
+    __tablename__ = 'data_version'
+
+    # change counters behind the ETags of services.versions; 'global' moves on every committed data change
+    name = db.Column(db.String(20) , primary_key = True)
+    version = db.Column(db.Integer , nullable = False , default = 0 , server_default = '0')
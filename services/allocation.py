@@ -0,0 +1,221 @@
+import heapq
+from threading import Lock
+from sqlalchemy import event, select, update
+from sqlalchemy.orm import Session
+from models.models import db, ParkingSpot
+from services.availability import adjust_counts
+from services.livefeed import publish_spot, publish_spots
+
+
+# Spot allocation. The per-lot queue only holds *candidates*: every worker process has its own copy and
+# it can be stale, so a spot is only ever handed out by the conditional UPDATE in claim_spot, which the
+# database serialises. A stale candidate simply loses the UPDATE and the next one is tried.
+
+REFILL_SIZE = 32
+MAX_REFILLS = 3
+
+
+class FreeSpotQueue:
+
+    def __init__(self):
+        self._heaps = {}
+        self._members = {}
+        self._lock = Lock()
+
+    def push(self, lot_id, spot_id, spot_no):
+        with self._lock:
+            members = self._members.setdefault(lot_id, set())
+            if spot_id not in members:
+                members.add(spot_id)
+                heapq.heappush(self._heaps.setdefault(lot_id, []), (spot_id, spot_no))
+
+    def pop(self, lot_id):
+        with self._lock:
+            heap = self._heaps.get(lot_id)
+            if not heap:
+                return None
+            spot_id, spot_no = heapq.heappop(heap)
+            self._members[lot_id].discard(spot_id)
+            return spot_id, spot_no
+
+    def peek(self, lot_id):
+        with self._lock:
+            heap = self._heaps.get(lot_id)
+            return heap[0] if heap else None
+
+    def discard_lot(self, lot_id):
+        with self._lock:
+            self._heaps.pop(lot_id, None)
+            self._members.pop(lot_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._heaps.clear()
+            self._members.clear()
+
+
+free_spots = FreeSpotQueue()
+
+
+def _refill(lot_id):
+    rows = (db.session.query(ParkingSpot.id, ParkingSpot.spot_no)
+            .filter(ParkingSpot.lot_id == lot_id, ParkingSpot.status == 'A', ParkingSpot.active == True)
+            .order_by(ParkingSpot.id)
+            .limit(REFILL_SIZE)
+            .all())
+
+    for spot_id, spot_no in rows:
+        free_spots.push(lot_id, spot_id, spot_no)
+
+    return bool(rows)
+
+
+def _candidates(lot_id, preferred_id = None):
+    if preferred_id is not None:
+        yield preferred_id, None
+
+    refills = 0
+    while True:
+        candidate = free_spots.pop(lot_id)
+
+        if candidate is None:
+            if refills >= MAX_REFILLS or not _refill(lot_id):
+                return
+            refills += 1
+            continue
+
+        if candidate[0] != preferred_id:
+            yield candidate
+
+
+def preview_spot(lot_id):
+    """Spot the next booking in this lot is likely to get, without claiming it."""
+    candidate = free_spots.peek(lot_id)
+
+    if candidate is None and _refill(lot_id):
+        candidate = free_spots.peek(lot_id)
+
+    return candidate
+
+
+def claim_spot(lot_id, preferred_id = None):
+    """Mark a free spot of the lot occupied inside the current transaction.
+
+    Returns (spot_id, spot_no) or None when the lot is full. The caller commits.
+    """
+    for spot_id, spot_no in _candidates(lot_id, preferred_id):
+        result = db.session.execute(
+            update(ParkingSpot)
+            .where(ParkingSpot.id == spot_id, ParkingSpot.lot_id == lot_id,
+                   ParkingSpot.status == 'A', ParkingSpot.active == True)
+            .values(status = 'O')
+        )
+
+        if result.rowcount == 1:
+            if spot_no is None:
+                spot_no = db.session.query(ParkingSpot.spot_no).filter_by(id = spot_id).scalar()
+
+            adjust_counts(lot_id, available = -1, occupied = 1)
+            publish_spot(lot_id, spot_id, spot_no, 'O')
+            db.session.info.setdefault('claimed_spots', []).append((lot_id, spot_id, spot_no))
+            return spot_id, spot_no
+
+    return None
+
+
+def claim_spots(lot_id, count):
+    """Set-based claim_spot for up to count spots of the lot. Returns [(spot_id, spot_no)], fewer when full."""
+    if not db.session.get_bind().dialect.update_returning:
+        claimed = []
+        for _ in range(count):
+            spot = claim_spot(lot_id)
+            if spot is None:
+                break
+            claimed.append(spot)
+        return claimed
+
+    claimed = []
+    while len(claimed) < count:
+        free = (select(ParkingSpot.id)
+                .where(ParkingSpot.lot_id == lot_id, ParkingSpot.status == 'A', ParkingSpot.active == True)
+                .order_by(ParkingSpot.id).limit(count - len(claimed)))
+        # the status check is repeated outside the subquery, a spot taken concurrently is simply skipped
+        rows = db.session.execute(
+            update(ParkingSpot)
+            .where(ParkingSpot.id.in_(free.scalar_subquery()), ParkingSpot.status == 'A')
+            .values(status = 'O')
+            .returning(ParkingSpot.id, ParkingSpot.spot_no)
+            .execution_options(synchronize_session = False)
+        ).all()
+        if not rows:
+            break
+        claimed.extend((spot_id, spot_no) for spot_id, spot_no in rows)
+
+    if claimed:
+        adjust_counts(lot_id, available = -len(claimed), occupied = len(claimed))
+        publish_spots([(lot_id, spot_id, spot_no, 'O') for spot_id, spot_no in claimed])
+        db.session.info.setdefault('claimed_spots', []).extend((lot_id, spot_id, spot_no) for spot_id, spot_no in claimed)
+    return claimed
+
+
+def release_spot(spot):
+    """Mark an occupied spot free inside the current transaction. Returns False if it was not occupied."""
+    result = db.session.execute(
+        update(ParkingSpot)
+        .where(ParkingSpot.id == spot.id, ParkingSpot.status == 'O')
+        .values(status = 'A')
+    )
+
+    if result.rowcount != 1:
+        return False
+
+    adjust_counts(spot.lot_id, available = 1, occupied = -1)
+    publish_spot(spot.lot_id, spot.id, spot.spot_no, 'A')
+    db.session.info.setdefault('released_spots', []).append((spot.lot_id, spot.id, spot.spot_no))
+    return True
+
+
+def release_spots(spots):
+    """Set-based release_spot for many (spot_id, lot_id, spot_no). Returns the ids of the spots freed."""
+    if not spots:
+        return set()
+
+    spot_ids = [spot_id for spot_id, _, _ in spots]
+    statement = (update(ParkingSpot).where(ParkingSpot.id.in_(spot_ids), ParkingSpot.status == 'O')
+                 .values(status = 'A').execution_options(synchronize_session = False))
+
+    if db.session.get_bind().dialect.update_returning:
+        released = set(db.session.execute(statement.returning(ParkingSpot.id)).scalars())
+    else:
+        db.session.execute(statement)
+        released = set(spot_ids) - {row.id for row in db.session.query(ParkingSpot.id)
+                                    .filter(ParkingSpot.id.in_(spot_ids), ParkingSpot.status == 'O')}
+
+    per_lot = {}
+    for spot_id, lot_id, _ in spots:
+        if spot_id in released:
+            per_lot[lot_id] = per_lot.get(lot_id, 0) + 1
+    for lot_id, count in per_lot.items():
+        adjust_counts(lot_id, available = count, occupied = -count)
+
+    freed = [(lot_id, spot_id, spot_no) for spot_id, lot_id, spot_no in spots if spot_id in released]
+    publish_spots([(lot_id, spot_id, spot_no, 'A') for lot_id, spot_id, spot_no in freed])
+    db.session.info.setdefault('released_spots', []).extend(freed)
+    return released
+
+
+@event.listens_for(Session, 'after_commit')
+def _requeue_released(session):
+    session.info.pop('claimed_spots', None)
+
+    for lot_id, spot_id, spot_no in session.info.pop('released_spots', ()):
+        free_spots.push(lot_id, spot_id, spot_no)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _requeue_claimed(session):
+    session.info.pop('released_spots', None)
+
+    # the claim never happened, hand the spots back out
+    for lot_id, spot_id, spot_no in session.info.pop('claimed_spots', ()):
+        free_spots.push(lot_id, spot_id, spot_no)
@@ -0,0 +1,353 @@
+import atexit
+import re
+import time
+from collections import Counter, deque, namedtuple, OrderedDict
+from datetime import datetime
+from threading import Condition, Thread
+from pytz import UTC
+from sqlalchemy import insert
+from sqlalchemy.exc import SQLAlchemyError, IntegrityError
+from models.models import (db, ParkingLots, ReservedSpots, AnprEvent, normalize_vehicle_number,
+                           VEHICLE_NUMBER_PATTERN)
+from services.allocation import claim_spots
+from services.checkout import checkout, MAX_BATCH
+from services.metrics import anpr_outcome, anpr_queue_depth, booking_outcome, release_outcome
+
+
+# Gate camera (ANPR) ingestion. The endpoint only validates the shape of the events and appends them to a
+# bounded in-process queue; a writer thread per process drains it and applies up to BATCH_SIZE events in a
+# single transaction, so a burst costs one commit per batch instead of one per vehicle. A full queue is
+# refused as a whole (HTTP 429) and the camera retries later. Every event carries an event_id that is
+# stored with its outcome in anpr_event, so retries and replays are applied at most once, across workers
+# and restarts. Accepted means queued, not stored: the queue is flushed on shutdown, and a camera that
+# never saw its event in /admin/api/anpr/events/<event_id> can safely send it again.
+
+QUEUE_SIZE = 10000
+BATCH_SIZE = 500
+BATCH_WAIT = 0.05   # seconds the writer waits for a batch to fill up
+MAX_EVENTS = 500   # per request
+SEEN_KEYS = 50000   # recently accepted event ids remembered per process
+SHUTDOWN_TIMEOUT = 10
+
+GateEvent = namedtuple('GateEvent', 'key kind lot_id vehicle_number captured_at')
+
+ENTRY_OUTCOMES = {None: 'success', 'lot_full': 'no_spot', 'already_parked': 'duplicate',
+                  'invalid_vehicle_number': 'invalid', 'unknown_lot': 'invalid'}
+
+
+class EventError(ValueError):
+    pass
+
+
+class QueueFull(RuntimeError):
+    pass
+
+
+class ShuttingDown(RuntimeError):
+    pass
+
+
+def _timestamp(value, received):
+    if value is None:
+        return received
+    if not isinstance(value, str):
+        raise EventError("timestamp must be an ISO 8601 string")
+    try:
+        moment = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        raise EventError(f"invalid timestamp {value!r}")
+    return UTC.localize(moment) if moment.tzinfo is None else moment.astimezone(UTC)   # naive means UTC
+
+
+def parse_event(data, received = None):
+    """GateEvent from a camera payload; raises EventError when it is malformed.
+
+    {"event_id": "gate3-000123", "type": "entry" | "exit", "vehicle_number": "MH12AB1234",
+     "lot_id": 4 (entries only), "timestamp": "2026-10-18T09:15:02+05:30" (optional, default now)}
+    A misread plate is not malformed: it is accepted and recorded as rejected by the writer.
+    """
+    if not isinstance(data, dict):
+        raise EventError("each event must be an object")
+
+    key = data.get('event_id')
+    if not isinstance(key, str) or not key.strip() or len(key) > 100:
+        raise EventError("event_id must be a non-empty string of at most 100 characters")
+
+    kind = data.get('type')
+    if kind not in ('entry', 'exit'):
+        raise EventError(f"{key}: type must be 'entry' or 'exit'")
+
+    vehicle_number = data.get('vehicle_number')
+    if not isinstance(vehicle_number, str) or not vehicle_number.strip():
+        raise EventError(f"{key}: vehicle_number must be a non-empty string")
+    vehicle_number = normalize_vehicle_number(vehicle_number)
+    if len(vehicle_number) > 15:
+        raise EventError(f"{key}: vehicle_number is too long")
+
+    lot_id = data.get('lot_id')
+    if kind == 'entry' and (not isinstance(lot_id, int) or isinstance(lot_id, bool)):
+        raise EventError(f"{key}: entry events need an integer lot_id")
+    if kind == 'exit':
+        lot_id = None   # the open reservation knows where the vehicle is
+
+    return GateEvent(key.strip(), kind, lot_id, vehicle_number,
+                     _timestamp(data.get('timestamp'), received or datetime.now(UTC)))
+
+
+def _record(event, status, detail = None, reservation_id = None):
+    return {'event_key': event.key, 'kind': event.kind, 'lot_id': event.lot_id,
+            'vehicle_number': event.vehicle_number, 'captured_at': event.captured_at,
+            'status': status, 'detail': detail, 'reservation_id': reservation_id}
+
+
+def _apply_entries(events, records):
+    lots = {lot.id: lot for lot in ParkingLots.query.filter(ParkingLots.id.in_({event.lot_id for event in events}))}
+    parked = {row.vehicle_number for row in db.session.query(ReservedSpots.vehicle_number)
+              .filter(ReservedSpots.vehicle_number.in_({event.vehicle_number for event in events}),
+                      ReservedSpots.leaving_time == None)}
+
+    arriving = {}
+    for event in events:
+        lot = lots.get(event.lot_id)
+        if not re.match(VEHICLE_NUMBER_PATTERN, event.vehicle_number):
+            records.append(_record(event, 'rejected', 'invalid_vehicle_number'))
+        elif lot is None or not lot.active:
+            records.append(_record(event, 'rejected', 'unknown_lot'))
+        elif event.vehicle_number in parked:
+            records.append(_record(event, 'rejected', 'already_parked'))
+        else:
+            arriving.setdefault(lot.id, []).append(event)
+
+    opened, rows = [], []
+    for lot_id, waiting in arriving.items():
+        lot = lots[lot_id]
+        spots = claim_spots(lot_id, len(waiting))   # first come first served when the lot fills up
+        for event in waiting[len(spots):]:
+            records.append(_record(event, 'rejected', 'lot_full'))
+
+        for event, (spot_id, _) in zip(waiting, spots):
+            opened.append(event)
+            rows.append({'spot_id': spot_id, 'user_id': None, 'vehicle_number': event.vehicle_number,
+                         'parking_time': event.captured_at, 'rate_at_booking': lot.price,
+                         'location_at_booking': lot.address, 'primename_at_booking': lot.primename})
+
+    if rows:   # one multi-row insert, ids come back in parameter order
+        ids = db.session.execute(insert(ReservedSpots).returning(ReservedSpots.id, sort_by_parameter_order = True),
+                                 rows).scalars()
+        records.extend(_record(event, 'processed', reservation_id = reservation_id)
+                       for event, reservation_id in zip(opened, ids))
+
+
+def _apply_exits(events, records):
+    valid = []
+    for event in events:
+        if re.match(VEHICLE_NUMBER_PATTERN, event.vehicle_number):
+            valid.append(event)
+        else:
+            records.append(_record(event, 'rejected', 'invalid_vehicle_number'))
+
+    for start in range(0, len(valid), MAX_BATCH):
+        chunk = valid[start:start + MAX_BATCH]
+        results = checkout([{'vehicle_number': event.vehicle_number} for event in chunk],
+                           left_at = [event.captured_at for event in chunk])
+        for event, result in zip(chunk, results):
+            if result['status'] == 'released':
+                records.append(_record(event, 'processed', reservation_id = result['reservation_id']))
+            else:
+                records.append(_record(event, 'rejected', 'not_parked'))
+
+
+def write_batch(events):
+    """Apply gate events inside the current transaction; the caller commits.
+
+    Events already stored (or repeated within the batch) are skipped. Returns the anpr_event rows written.
+    """
+    known = {row.event_key for row in db.session.query(AnprEvent.event_key)
+             .filter(AnprEvent.event_key.in_({event.key for event in events}))}
+
+    # the n-th event of a vehicle in the batch goes into round n, so each vehicle's events keep their order
+    # while a round handles every vehicle at once; exits go first so they free spots for the entries
+    rounds, seen = [], Counter()
+    for event in events:
+        if event.key in known:
+            continue
+        known.add(event.key)
+
+        if seen[event.vehicle_number] == len(rounds):
+            rounds.append(([], []))
+        entries, exits = rounds[seen[event.vehicle_number]]
+        (entries if event.kind == 'entry' else exits).append(event)
+        seen[event.vehicle_number] += 1
+
+    records = []
+    for entries, exits in rounds:
+        if exits:
+            _apply_exits(exits, records)
+        if entries:
+            _apply_entries(entries, records)
+
+    if records:
+        db.session.execute(insert(AnprEvent), records)
+    return records
+
+
+def _count(records):
+    for record in records:
+        if record['kind'] == 'entry':
+            booking_outcome(ENTRY_OUTCOMES[record['detail']])
+        else:
+            release_outcome('success' if record['status'] == 'processed' else 'not_found')
+        anpr_outcome(record['status'])
+
+
+class IngestPipeline:
+
+    def __init__(self):
+        self._events = deque()
+        self._cond = Condition()
+        self._in_flight = 0
+        self._seen = OrderedDict()
+        self._stopping = False
+        self._thread = None
+
+    def offer(self, app, events):
+        """Queue events, all or none: raises QueueFull when they do not fit.
+
+        Returns the number of events not queued because they were accepted recently already.
+        """
+        with self._cond:
+            if self._stopping:
+                raise ShuttingDown()
+
+            fresh = []
+            for event in events:
+                if event.key not in self._seen:
+                    self._seen[event.key] = None
+                    fresh.append(event)
+
+            if len(self._events) + len(fresh) > app.config['ANPR_QUEUE_SIZE']:
+                for event in fresh:
+                    del self._seen[event.key]
+                raise QueueFull()
+
+            while len(self._seen) > SEEN_KEYS:
+                self._seen.popitem(last = False)
+
+            self._events.extend(fresh)
+            anpr_queue_depth.set(len(self._events))
+            self._cond.notify_all()
+
+            if self._thread is None:
+                self._thread = Thread(target = self._run, args = (app,), name = 'anpr-writer', daemon = True)
+                self._thread.start()
+                atexit.register(self.shutdown)
+
+            return len(events) - len(fresh)
+
+    def depth(self):
+        with self._cond:
+            return len(self._events)
+
+    def flush(self, timeout = None):
+        """Wait until every queued event is written. Returns False on timeout."""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._events and not self._in_flight, timeout)
+
+    def shutdown(self, timeout = SHUTDOWN_TIMEOUT):
+        """Stop taking events and write out what is queued; for worker exit."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+            thread = self._thread
+
+        if thread is not None:
+            thread.join(timeout)
+
+    def _take(self, batch_size, batch_wait):
+        with self._cond:
+            self._cond.wait_for(lambda: self._events or self._stopping)
+            if not self._events:
+                return None
+
+            deadline = time.monotonic() + batch_wait
+            while len(self._events) < batch_size and not self._stopping:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._cond.wait(remaining):
+                    break
+
+            batch = [self._events.popleft() for _ in range(min(batch_size, len(self._events)))]
+            self._in_flight = len(batch)
+            anpr_queue_depth.set(len(self._events))
+            return batch
+
+    def _done(self):
+        with self._cond:
+            self._in_flight = 0
+            self._cond.notify_all()
+
+    def _write(self, app, batch):
+        try:
+            records = write_batch(batch)
+            db.session.commit()
+            _count(records)
+            return
+
+        except Exception:   # typically a concurrent writer in another process, retry one by one
+            app.logger.warning("ANPR batch of %d failed, retrying events one at a time", len(batch), exc_info = True)
+            db.session.rollback()
+
+        for event in batch:
+            try:
+                records = write_batch([event])
+                db.session.commit()
+                _count(records)
+
+            except IntegrityError:   # stored by another worker meanwhile, or the vehicle was parked concurrently
+                db.session.rollback()
+                self._reject(app, event, 'conflict')
+
+            except Exception:   # stored as rejected, so the event stays visible in anpr_event
+                app.logger.exception("ANPR event %s could not be written", event.key)
+                db.session.rollback()
+                self._reject(app, event, 'error')
+
+    def _reject(self, app, event, detail):
+        try:
+            db.session.execute(insert(AnprEvent), [_record(event, 'rejected', detail)])
+            db.session.commit()
+            anpr_outcome('rejected')
+        except IntegrityError:   # the event id is already stored
+            db.session.rollback()
+            anpr_outcome('duplicate')
+        except SQLAlchemyError:
+            app.logger.exception("ANPR event %s could not be recorded, dropped", event.key)
+            db.session.rollback()
+            self._drop([event])
+
+    def _drop(self, events):
+        # nothing stored: forget the ids so the camera's retry is queued again instead of taken for a duplicate
+        with self._cond:
+            for event in events:
+                self._seen.pop(event.key, None)
+        anpr_outcome('dropped', len(events))
+
+    def _run(self, app):
+        while True:
+            batch = self._take(app.config['ANPR_BATCH_SIZE'], app.config['ANPR_BATCH_WAIT'])
+            if batch is None:
+                return
+
+            with app.app_context():
+                try:
+                    self._write(app, batch)
+                except Exception:
+                    app.logger.exception("ANPR writer dropped a batch of %d: %s", len(batch),
+                                         ', '.join(event.key for event in batch))
+                    db.session.rollback()
+                    self._drop(batch)
+                finally:
+                    db.session.remove()
+                    self._done()
+
+
+pipeline = IngestPipeline()
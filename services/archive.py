@@ -0,0 +1,45 @@
+from datetime import datetime, timedelta
+from flask import current_app
+from pytz import UTC
+from sqlalchemy import insert, delete, select, func
+from models.models import db, ReservedSpots, ReservedSpotsArchive, HISTORY_COLUMNS
+
+
+# Hot/cold split of reservation history. reserved_spots keeps open reservations and those closed in the last
+# ARCHIVE_AFTER_DAYS days, so what booking and release read (open reservations per spot, the duplicate vehicle
+# check, spot_details) stays a small table however much history piles up. archive_closed(), run monthly by
+# `flask admin archive-reservations`, moves older closed reservations to reserved_spots_archive with their
+# ids. Reports and user history read models.ReservationHistory, the UNION ALL of both tables.
+
+AFTER_DAYS = 30
+BATCH_SIZE = 5000
+
+
+def archive_closed(before = None, batch_size = BATCH_SIZE):
+    """Move reservations closed before `before` (default ARCHIVE_AFTER_DAYS ago) to the archive; returns how many.
+
+    Every batch is its own transaction, so bookings are not held up for the whole run and an interrupted run
+    picks up where it stopped.
+    """
+    if before is None:
+        before = datetime.now(UTC) - timedelta(days = current_app.config['ARCHIVE_AFTER_DAYS'])
+
+    columns = [ReservedSpots.__table__.c[name] for name in HISTORY_COLUMNS]
+    moved = 0
+    while True:
+        # the newest row always stays: SQLite would otherwise hand its id out again and clash with the archive
+        newest = db.session.query(func.max(ReservedSpots.id)).scalar()
+        ids = [row.id for row in db.session.query(ReservedSpots.id)
+               .filter(ReservedSpots.leaving_time != None, ReservedSpots.leaving_time < before,
+                       ReservedSpots.id < newest)
+               .order_by(ReservedSpots.id).limit(batch_size)]
+        if not ids:
+            db.session.rollback()
+            return moved
+
+        db.session.execute(insert(ReservedSpotsArchive)
+                           .from_select(HISTORY_COLUMNS, select(*columns).where(ReservedSpots.id.in_(ids))))
+        db.session.execute(delete(ReservedSpots).where(ReservedSpots.id.in_(ids))
+                           .execution_options(synchronize_session = False))
+        db.session.commit()
+        moved += len(ids)
@@ -0,0 +1,65 @@
+from sqlalchemy import func, case, update
+from models.models import db, ParkingLots, ParkingSpot
+from services.versions import lot_touched
+from services.summarycache import invalidate
+
+
+# Per-lot availability counters. ParkingLots.available_spots / occupied_spots are changed in the same
+# transaction as the spot rows, so readers never see counts from a rolled back booking.
+
+
+def adjust_counts(lot_id, available=0, occupied=0):
+    if not available and not occupied:
+        return
+
+    db.session.execute(
+        update(ParkingLots)
+        .where(ParkingLots.id == lot_id)
+        .values(available_spots=ParkingLots.available_spots + available,
+                occupied_spots=ParkingLots.occupied_spots + occupied)
+    )
+    lot_touched(lot_id)
+    invalidate('lots')
+
+
+def reset_counts(lot_id, available=0, occupied=0):
+    db.session.execute(
+        update(ParkingLots)
+        .where(ParkingLots.id == lot_id)
+        .values(available_spots=available, occupied_spots=occupied)
+    )
+    lot_touched(lot_id)
+    invalidate('lots')
+
+
+def actual_counts():
+    rows = (
+        db.session.query(
+            ParkingSpot.lot_id,
+            func.count(case((ParkingSpot.status == 'A', 1))),
+            func.count(case((ParkingSpot.status == 'O', 1))),
+        )
+        .filter(ParkingSpot.active == True)
+        .group_by(ParkingSpot.lot_id)
+        .all()
+    )
+    return {lot_id: (available, occupied) for lot_id, available, occupied in rows}
+
+
+def reconcile(fix=True):
+    """Rebuild the counters from parking_spot, returning [(lot_id, stored, actual)] for every lot that drifted."""
+    actual = actual_counts()
+    drift = []
+
+    for lot_id, available, occupied in db.session.query(
+            ParkingLots.id, ParkingLots.available_spots, ParkingLots.occupied_spots).order_by(ParkingLots.id):
+        expected = actual.get(lot_id, (0, 0))
+        if (available, occupied) != expected:
+            drift.append((lot_id, (available, occupied), expected))
+
+    if fix:
+        for lot_id, _, (available, occupied) in drift:
+            reset_counts(lot_id, available, occupied)
+        db.session.commit()
+
+    return drift
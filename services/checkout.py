@@ -0,0 +1,112 @@
+from datetime import datetime
+from pytz import UTC
+from sqlalchemy import update, bindparam, or_
+from models.models import db, ParkingSpot, ReservedSpots, normalize_vehicle_number
+from services.allocation import release_spots
+from services.revenue import record_revenue_batch
+from services.tariff import batch_charges
+
+
+# Bulk checkout for exit gates. A batch of vehicle numbers and/or reservation ids is resolved with one query,
+# billed with one tariff batch and closed with a handful of set-based statements in the caller's transaction,
+# instead of a form round trip and a commit per vehicle.
+
+MAX_BATCH = 500
+
+
+class CheckoutError(ValueError):
+    pass
+
+
+def _parse(items):
+    if not isinstance(items, list) or not items:
+        raise CheckoutError("items must be a non-empty list")
+    if len(items) > MAX_BATCH:
+        raise CheckoutError(f"at most {MAX_BATCH} items per batch")
+
+    parsed = []
+    for item in items:
+        if isinstance(item, dict) and isinstance(item.get('reservation_id'), int):
+            parsed.append(('reservation_id', item['reservation_id']))
+        elif isinstance(item, dict) and isinstance(item.get('vehicle_number'), str) and item['vehicle_number'].strip():
+            parsed.append(('vehicle_number', normalize_vehicle_number(item['vehicle_number'])))
+        else:
+            raise CheckoutError("each item needs a reservation_id (int) or a vehicle_number (string)")
+    return parsed
+
+
+def checkout(items, now = None, left_at = None):
+    """Close the open reservations named by items; the caller commits.
+
+    Every vehicle leaves at now (default: the current time) unless left_at gives a time per item. Returns one
+    result dict per item, in order, with status 'released', 'not_found' (no open reservation) or 'duplicate'
+    (same reservation named earlier in the batch).
+    """
+    parsed = _parse(items)
+    now = now or datetime.now(UTC)
+    left_at = left_at or [None] * len(parsed)
+
+    ids = {value for kind, value in parsed if kind == 'reservation_id'}
+    plates = {value for kind, value in parsed if kind == 'vehicle_number'}
+    rows = (db.session.query(ReservedSpots.id, ParkingSpot.lot_id, ReservedSpots.rate_at_booking,
+                             ReservedSpots.parking_time, ReservedSpots.vehicle_number, ReservedSpots.spot_id,
+                             ParkingSpot.spot_no)
+            .join(ParkingSpot, ParkingSpot.id == ReservedSpots.spot_id)
+            .filter(ReservedSpots.leaving_time == None,
+                    or_(ReservedSpots.id.in_(ids), ReservedSpots.vehicle_number.in_(plates)))
+            .all())
+    by_id = {row.id: row for row in rows}
+    by_plate = {row.vehicle_number: row for row in rows}
+
+    chosen, leaving, results = {}, {}, []
+    for (kind, value), at in zip(parsed, left_at):
+        row = by_id.get(value) if kind == 'reservation_id' else by_plate.get(value)
+        result = {kind: value}
+        if row is None:
+            result['status'] = 'not_found'
+        elif row.id in chosen:
+            result['status'] = 'duplicate'
+        else:
+            chosen[row.id] = row
+            leaving[row.id] = at or now
+            result['reservation_id'] = row.id
+        results.append(result)
+
+    if chosen:
+        costs = batch_charges([(row.id, row.lot_id, row.rate_at_booking, row.parking_time, leaving[row.id])
+                               for row in chosen.values()])
+
+        # only rows still open are closed, a concurrent single release wins and is reported as not_found
+        closing = (update(ReservedSpots).where(ReservedSpots.id.in_(chosen), ReservedSpots.leaving_time == None)
+                   .values(leaving_time = now).execution_options(synchronize_session = False))
+        if db.session.get_bind().dialect.update_returning:
+            closed = set(db.session.execute(closing.returning(ReservedSpots.id)).scalars())
+        else:
+            db.session.execute(closing)
+            closed = {row.id for row in db.session.query(ReservedSpots.id)
+                      .filter(ReservedSpots.id.in_(chosen), ReservedSpots.leaving_time == now)}
+
+        if closed:
+            table = ReservedSpots.__table__
+            db.session.execute(update(table).where(table.c.id == bindparam('reservation_id'))
+                               .values(total_cost = bindparam('cost'), leaving_time = bindparam('left')),
+                               [{'reservation_id': reservation_id, 'cost': costs[reservation_id],
+                                 'left': leaving[reservation_id]} for reservation_id in closed])
+
+            release_spots([(chosen[reservation_id].spot_id, chosen[reservation_id].lot_id,
+                            chosen[reservation_id].spot_no) for reservation_id in closed])
+            record_revenue_batch([(chosen[reservation_id].spot_id, chosen[reservation_id].lot_id,
+                                   leaving[reservation_id], costs[reservation_id]) for reservation_id in closed])
+
+        for result in results:
+            reservation_id = result.get('reservation_id')
+            if 'status' in result:
+                continue
+            if reservation_id in closed:
+                row = chosen[reservation_id]
+                result.update(status = 'released', vehicle_number = row.vehicle_number, lot_id = row.lot_id,
+                              spot_no = row.spot_no, cost = str(costs[reservation_id]))
+            else:
+                result['status'] = 'not_found'
+
+    return results
@@ -0,0 +1,68 @@
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+
+# Engine profile applied when the app binds the database. SQLite: WAL so readers never block the writer and
+# commits append to the log instead of rewriting the database, synchronous=NORMAL so a commit does not wait
+# for fsync (still safe against corruption in WAL mode, the last commits can be lost on power failure),
+# a busy_timeout so concurrent writers in other workers wait for the lock instead of failing with
+# "database is locked", and a larger page cache and memory-mapped reads. PostgreSQL (or any server database):
+# a bounded pool per worker with pre-ping and recycling. DB_ENGINE_PROFILE=stock turns all of it off.
+
+BUSY_TIMEOUT = 5000   # ms
+CACHE_SIZE = 65536   # KiB of page cache per connection
+MMAP_SIZE = 268435456   # bytes
+SYNCHRONOUS = 'NORMAL'
+
+POOL_SIZE = 5
+MAX_OVERFLOW = 10
+POOL_TIMEOUT = 30   # seconds to wait for a free connection
+POOL_RECYCLE = 1800   # seconds, below typical server and proxy idle timeouts
+
+
+def engine_options(config):
+    """SQLALCHEMY_ENGINE_OPTIONS for the profile and database in config."""
+    url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+    if config['DB_ENGINE_PROFILE'] == 'stock':
+        return {}
+
+    if url.get_backend_name() == 'sqlite':
+        # the driver's own lock wait, also covers the first statements before the pragmas run
+        return {'connect_args': {'timeout': config['SQLITE_BUSY_TIMEOUT'] / 1000}}
+
+    return {'pool_size': config['DB_POOL_SIZE'], 'max_overflow': config['DB_MAX_OVERFLOW'],
+            'pool_timeout': config['DB_POOL_TIMEOUT'], 'pool_recycle': config['DB_POOL_RECYCLE'],
+            'pool_pre_ping': True}
+
+
+def _sqlite_pragmas(config, memory):
+    pragmas = [f"PRAGMA busy_timeout = {int(config['SQLITE_BUSY_TIMEOUT'])}",
+               f"PRAGMA cache_size = {-int(config['SQLITE_CACHE_SIZE'])}",
+               f"PRAGMA mmap_size = {int(config['SQLITE_MMAP_SIZE'])}",
+               f"PRAGMA synchronous = {config['SQLITE_SYNCHRONOUS']}"]
+    if not memory:   # in-memory databases have no journal file
+        pragmas.insert(0, "PRAGMA journal_mode = WAL")
+    return pragmas
+
+
+def init_app(app, db):
+    """db.init_app with the engine profile from app.config."""
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config))
+    db.init_app(app)
+
+    if app.config['DB_ENGINE_PROFILE'] == 'stock':
+        return
+
+    with app.app_context():
+        for engine in db.engines.values():
+            if engine.dialect.name != 'sqlite':
+                continue
+
+            pragmas = _sqlite_pragmas(app.config, engine.url.database in (None, '', ':memory:'))
+
+            @event.listens_for(engine, 'connect')
+            def _apply_pragmas(dbapi_connection, connection_record, pragmas = pragmas):
+                cursor = dbapi_connection.cursor()
+                for pragma in pragmas:
+                    cursor.execute(pragma)
+                cursor.close()
@@ -0,0 +1,154 @@
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime
+from decimal import Decimal
+from pytz import UTC
+from sqlalchemy import select, func
+from models.models import db, User, ParkingLots, ParkingSpot, ReservationHistory, LotRevenueDaily
+from services.tariff import day_bounds
+
+
+# Streaming exports for finance: reservations (open, closed and archived), per-lot daily revenue from the
+# rollups, and per-user usage. Rows are fetched YIELD_PER at a time (a server-side cursor on PostgreSQL) and
+# encoded into CHUNK-sized pieces as they arrive, optionally through a gzip stream, so an export holds about
+# one batch in memory whatever its size. Dates are IST calendar days, like the revenue rollups: reservations
+# and usage are filtered on parking_time, revenue on its day.
+
+DATASETS = ('reservations', 'lot-revenue', 'user-usage')
+FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+YIELD_PER = 2000
+CHUNK = 64 * 1024
+
+
+class ExportError(ValueError):
+    pass
+
+
+def _reservations(start, end, lot_id):
+    stmt = (select(ReservationHistory.id, ParkingSpot.lot_id, ReservationHistory.spot_id, ReservationHistory.user_id,
+                   ReservationHistory.vehicle_number, ReservationHistory.parking_time, ReservationHistory.leaving_time,
+                   ReservationHistory.rate_at_booking, ReservationHistory.total_cost,
+                   ReservationHistory.primename_at_booking, ReservationHistory.location_at_booking)
+            .outerjoin(ParkingSpot, ParkingSpot.id == ReservationHistory.spot_id)   # spot_id is nullable, keep rows without a spot
+            .order_by(ReservationHistory.id))
+    if start is not None:
+        stmt = stmt.where(ReservationHistory.parking_time >= day_bounds(start)[0])
+    if end is not None:
+        stmt = stmt.where(ReservationHistory.parking_time < day_bounds(end)[1])
+    if lot_id is not None:
+        stmt = stmt.where(ParkingSpot.lot_id == lot_id)
+    return stmt
+
+
+def _lot_revenue(start, end, lot_id):
+    stmt = (select(LotRevenueDaily.lot_id, ParkingLots.primename, LotRevenueDaily.day, LotRevenueDaily.revenue,
+                   LotRevenueDaily.sessions)
+            .join(ParkingLots, ParkingLots.id == LotRevenueDaily.lot_id)
+            .order_by(LotRevenueDaily.lot_id, LotRevenueDaily.day))
+    if start is not None:
+        stmt = stmt.where(LotRevenueDaily.day >= start)
+    if end is not None:
+        stmt = stmt.where(LotRevenueDaily.day <= end)
+    if lot_id is not None:
+        stmt = stmt.where(LotRevenueDaily.lot_id == lot_id)
+    return stmt
+
+
+def _user_usage(start, end, lot_id):
+    usage = (select(ReservationHistory.user_id, func.count(ReservationHistory.id).label('sessions'),
+                    func.coalesce(func.sum(ReservationHistory.total_cost), 0).label('total_cost'),
+                    func.min(ReservationHistory.parking_time).label('first_parking_time'),
+                    func.max(ReservationHistory.parking_time).label('last_parking_time'))
+             .outerjoin(ParkingSpot, ParkingSpot.id == ReservationHistory.spot_id)
+             .group_by(ReservationHistory.user_id))
+    if start is not None:
+        usage = usage.where(ReservationHistory.parking_time >= day_bounds(start)[0])
+    if end is not None:
+        usage = usage.where(ReservationHistory.parking_time < day_bounds(end)[1])
+    if lot_id is not None:
+        usage = usage.where(ParkingSpot.lot_id == lot_id)
+    usage = usage.subquery()
+
+    return (select(usage.c.user_id, User.email, usage.c.sessions, usage.c.total_cost, usage.c.first_parking_time,
+                   usage.c.last_parking_time)
+            .outerjoin(User, User.id == usage.c.user_id)   # gate camera sessions have no user
+            .order_by(usage.c.user_id))
+
+
+_QUERIES = {'reservations': _reservations, 'lot-revenue': _lot_revenue, 'user-usage': _user_usage}
+
+
+def parse_day(value, name):
+    if value in (None, ''):
+        return None
+    if isinstance(value, date):
+        return value
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise ExportError(f"{name} must be a date as YYYY-MM-DD")
+
+
+def _value(value):
+    if isinstance(value, datetime):
+        return (value if value.tzinfo else UTC.localize(value)).astimezone(UTC).isoformat()
+    if isinstance(value, (date, Decimal)):
+        return str(value)
+    return value
+
+
+def _encode(header, rows, fmt):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if fmt == 'csv' else None
+    if writer:
+        writer.writerow(header)
+
+    for row in rows:
+        values = [_value(value) for value in row]
+        if writer:
+            writer.writerow(values)
+        else:
+            buffer.write(json.dumps(dict(zip(header, values)), separators = (',', ':')) + '\n')
+
+        if buffer.tell() >= CHUNK:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def _gzip(chunks):
+    compressor = zlib.compressobj(wbits = 31)   # gzip container
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export(dataset, fmt = 'csv', start = None, end = None, lot_id = None, compress = False):
+    """Encoded chunks of one export. Checks the arguments before returning; the query runs while iterating."""
+    if dataset not in _QUERIES:
+        raise ExportError(f"dataset must be one of {', '.join(DATASETS)}")
+    if fmt not in FORMATS:
+        raise ExportError(f"format must be one of {', '.join(FORMATS)}")
+    if start is not None and end is not None and start > end:
+        raise ExportError("from must not be after to")
+
+    stmt = _QUERIES[dataset](start, end, lot_id)
+    header = [column.name for column in stmt.selected_columns]
+
+    def rows():
+        yield from db.session.execute(stmt.execution_options(yield_per = YIELD_PER))
+
+    chunks = _encode(header, rows(), fmt)
+    return _gzip(chunks) if compress else chunks
+
+
+def filename(dataset, fmt, start = None, end = None, lot_id = None, compress = False):
+    parts = [dataset] + [str(part) for part in (start, end) if part] + ([f"lot{lot_id}"] if lot_id else [])
+    return '_'.join(parts) + f".{fmt}" + ('.gz' if compress else '')
@@ -0,0 +1,225 @@
+import json
+import queue
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from threading import Lock, Thread
+from pytz import UTC
+from sqlalchemy import insert, delete, func, or_
+from models.models import db, ParkingLots, AvailabilityEvent
+
+
+# Live availability feed. Write paths add an availability_event row in their own transaction, so an event
+# exists exactly when the change committed, whichever worker process made it. Each process runs one poller
+# thread that reads new rows with a single connection and fans them out to in-memory subscriber queues;
+# the streaming responses only wait on those queues and never touch the database.
+#
+# Ids come from the sequence before commit, so on PostgreSQL a lower id can commit after a higher one has
+# been read. Ids skipped below the watermark are remembered as gaps and read again for GAP_GRACE seconds
+# (a rolled back transaction leaves a gap that never fills); a late event is sent with the current
+# watermark as its SSE id so the stream ids keep increasing for Last-Event-ID resumes.
+
+POLL_INTERVAL = 0.5
+KEEPALIVE = 15
+RETENTION = timedelta(minutes = 10)
+POLL_BATCH = 1000
+BACKLOG = 2000
+SUBSCRIBER_QUEUE = 500
+GAP_GRACE = 30
+MAX_GAPS = 10000
+
+
+def publish_spot(lot_id, spot_id, spot_no, status):
+    """Record that a spot became status ('A', 'O', or None when removed) in the current transaction."""
+    db.session.execute(insert(AvailabilityEvent).values(lot_id = lot_id, spot_id = spot_id, spot_no = spot_no,
+                                                       status = status))
+
+
+def publish_spots(changes):
+    """publish_spot for many (lot_id, spot_id, spot_no, status) in one executemany insert."""
+    if changes:
+        db.session.execute(insert(AvailabilityEvent), [{'lot_id': lot_id, 'spot_id': spot_id, 'spot_no': spot_no,
+                                                        'status': status} for lot_id, spot_id, spot_no, status in changes])
+
+
+def publish_lot(lot_id):
+    """Record a lot level change (counts, size, details, deletion) in the current transaction."""
+    db.session.execute(insert(AvailabilityEvent).values(lot_id = lot_id))
+
+
+def publish_lots(lot_ids):
+    """publish_lot for many lots in one executemany insert."""
+    if lot_ids:
+        db.session.execute(insert(AvailabilityEvent), [{'lot_id': lot_id} for lot_id in lot_ids])
+
+
+def prune(older_than = RETENTION):
+    """Delete events older than the replay window; run by `flask admin prune-availability-events` on a schedule."""
+    cutoff = datetime.now(UTC) - older_than
+    # the newest row always stays: SQLite would otherwise hand its id out again, below every poller's watermark
+    newest = db.session.query(func.max(AvailabilityEvent.id)).scalar()
+    if newest is None:
+        return 0
+    result = db.session.execute(delete(AvailabilityEvent).where(AvailabilityEvent.created_at < cutoff,
+                                                                AvailabilityEvent.id < newest))
+    db.session.commit()
+    return result.rowcount
+
+
+class Subscription:
+    def __init__(self):
+        self.queue = queue.Queue(maxsize = SUBSCRIBER_QUEUE)
+        self.overflowed = False
+
+    def offer(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except queue.Full:   # too slow to keep up, it reconnects and resumes from Last-Event-ID
+            self.overflowed = True
+
+    def messages(self, keepalive = KEEPALIVE):
+        """SSE frames for this subscriber; a comment line every keepalive seconds keeps proxies from closing it."""
+        yield "retry: 3000\n\n"
+        while not self.overflowed:
+            try:
+                yield self.queue.get(timeout = keepalive)
+            except queue.Empty:
+                yield ": keepalive\n\n"
+
+
+def _frame(event_id, kind, data):
+    return f"id: {event_id}\nevent: {kind}\ndata: {json.dumps(data, separators = (',', ':'))}\n\n"
+
+
+class AvailabilityFeed:
+
+    def __init__(self):
+        self._subscribers = set()
+        self._recent = deque(maxlen = BACKLOG)   # (event_id, frame) for Last-Event-ID resumes
+        self._lock = Lock()
+        self._last_id = None
+        self._gaps = {}   # id skipped below the watermark -> monotonic time it was first missed
+        self._thread = None
+
+    def subscribe(self, app, last_event_id = None):
+        subscription = Subscription()
+
+        with self._lock:
+            if last_event_id is not None:
+                if self._recent and self._recent[0][0] <= last_event_id + 1:
+                    for event_id, frame in self._recent:
+                        if event_id > last_event_id:
+                            subscription.offer(frame)
+                else:
+                    subscription.offer(_frame(last_event_id, 'reset', {}))   # missed too much, reload
+
+            self._subscribers.add(subscription)
+
+            if self._thread is None:
+                self._thread = Thread(target = self._run, args = (app,), name = 'availability-feed', daemon = True)
+                self._thread.start()
+
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def _broadcast(self, frames):
+        with self._lock:
+            self._recent.extend(frames)
+            subscribers = list(self._subscribers)
+
+        for subscription in subscribers:
+            for _, frame in frames:
+                subscription.offer(frame)
+
+    def _poll(self):
+        if self._last_id is None:
+            self._last_id = db.session.query(db.func.max(AvailabilityEvent.id)).scalar() or 0
+            return
+
+        query = db.session.query(AvailabilityEvent)
+        if self._gaps:
+            query = query.filter(or_(AvailabilityEvent.id > self._last_id, AvailabilityEvent.id.in_(self._gaps)))
+        else:
+            query = query.filter(AvailabilityEvent.id > self._last_id)
+        events = query.order_by(AvailabilityEvent.id).limit(POLL_BATCH).all()
+        self._track_gaps(events)
+        if not events:
+            return
+
+        lots = {row.id: row for row in
+                db.session.query(ParkingLots.id, ParkingLots.available_spots, ParkingLots.occupied_spots,
+                                 ParkingLots.maxspots, ParkingLots.active)
+                .filter(ParkingLots.id.in_({event.lot_id for event in events}))}
+
+        previous, watermark = self._last_id, max(self._last_id, events[-1].id)
+        frames = []
+        last_for_lot = {}
+        for event in events:
+            frame_id = event.id if event.id > previous else watermark
+            if event.spot_id is not None:
+                frames.append((frame_id, _frame(frame_id, 'spot', {'lot_id': event.lot_id, 'spot_id': event.spot_id,
+                                                                   'spot_no': event.spot_no, 'status': event.status})))
+            last_for_lot[event.lot_id] = max(frame_id, last_for_lot.get(event.lot_id, 0))
+
+        # one lot frame per lot with its committed counters as of now, however many spots changed
+        for lot_id, event_id in sorted(last_for_lot.items(), key = lambda item: item[1]):
+            lot = lots.get(lot_id)
+            data = {'lot_id': lot_id, 'active': False}
+            if lot is not None:
+                data = {'lot_id': lot_id, 'available': lot.available_spots, 'occupied': lot.occupied_spots,
+                        'maxspots': lot.maxspots, 'active': lot.active}
+            frames.append((event_id, _frame(event_id, 'lot', data)))
+
+        frames.sort(key = lambda frame: frame[0])
+        self._last_id = watermark
+        self._broadcast(frames)
+
+    def _track_gaps(self, events):
+        now = time.monotonic()
+        seen = {event.id for event in events}
+        for event_id in seen:
+            self._gaps.pop(event_id, None)
+
+        newest = max((event_id for event_id in seen if event_id > self._last_id), default = None)
+        if newest is not None:
+            for event_id in range(self._last_id + 1, newest):
+                if event_id not in seen:
+                    self._gaps[event_id] = now
+
+        expired = [event_id for event_id, missed_at in self._gaps.items() if now - missed_at > GAP_GRACE]
+        for event_id in expired:
+            del self._gaps[event_id]
+        if len(self._gaps) > MAX_GAPS:   # keep the newest, a burst of rollbacks must not grow the IN list
+            for event_id in sorted(self._gaps)[:len(self._gaps) - MAX_GAPS]:
+                del self._gaps[event_id]
+
+    def _run(self, app):
+        while True:
+            time.sleep(POLL_INTERVAL)
+
+            with app.app_context():
+                try:
+                    if self.subscriber_count():
+                        self._poll()
+                    elif self._last_id is not None:
+                        with self._lock:   # nobody listening, start from the newest event next time
+                            self._last_id = None
+                            self._gaps.clear()
+                            self._recent.clear()
+
+                except Exception:
+                    app.logger.exception("Availability feed poll failed")
+                    db.session.rollback()
+
+                finally:
+                    db.session.remove()
+
+
+feed = AvailabilityFeed()
@@ -0,0 +1,150 @@
+import os
+import time
+from flask import g, request
+from prometheus_client import (CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, CONTENT_TYPE_LATEST,
+                               generate_latest)
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.multiprocess import MultiProcessCollector
+from sqlalchemy import event
+from sqlalchemy.pool import Pool
+
+
+# Prometheus metrics for /metrics. Under gunicorn set PROMETHEUS_MULTIPROC_DIR (see gunicorn.conf.py): every
+# worker then writes its samples to files in that directory and whichever worker serves the scrape adds them
+# all up. Per-lot occupancy is read from the shared database at scrape time, so it is the same in any worker.
+
+MULTIPROCESS = bool(os.getenv('PROMETHEUS_MULTIPROC_DIR'))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 10.0)
+
+request_latency = Histogram('parking_request_duration_seconds', 'Request latency by route.',
+                            ['endpoint', 'method'], buckets = LATENCY_BUCKETS)
+requests_total = Counter('parking_requests_total', 'Requests by route and status code.',
+                         ['endpoint', 'method', 'status'])
+
+bookings = Counter('parking_bookings_total', 'Booking attempts in user.book_spot by outcome.', ['outcome'])
+releases = Counter('parking_releases_total', 'Release attempts in user.spot_release by outcome.', ['outcome'])
+
+anpr_events = Counter('parking_anpr_events_total', 'Gate camera events by outcome.', ['outcome'])
+anpr_queue_depth = Gauge('parking_anpr_queue_depth', 'Gate camera events waiting for the writer.',
+                         multiprocess_mode = 'livesum')
+
+summary_cache = Counter('parking_summary_cache_total', 'Summary dataset cache lookups by dataset and result.',
+                        ['dataset', 'result'])
+
+pool_checked_out = Gauge('parking_db_pool_checked_out', 'Pooled DB connections currently in use.',
+                         multiprocess_mode = 'livesum')
+pool_connections = Gauge('parking_db_pool_connections', 'DB connections currently open.',
+                         multiprocess_mode = 'livesum')
+
+
+def booking_outcome(outcome):
+    """Count a booking attempt: success, no_spot, duplicate, invalid or error."""
+    bookings.labels(outcome).inc()
+
+
+def release_outcome(outcome, count = 1):
+    """Count release attempts: success, already_released, not_found (bulk checkout) or error."""
+    releases.labels(outcome).inc(count)
+
+
+def anpr_outcome(outcome, count = 1):
+    """Count gate events: accepted, duplicate, throttled (queue full), processed, rejected or dropped."""
+    if count:
+        anpr_events.labels(outcome).inc(count)
+
+
+def summary_cache_outcome(dataset, result):
+    """Count a summary cache lookup: hit, miss or error (backend unavailable, computed without the cache)."""
+    summary_cache.labels(dataset, result).inc()
+
+
+@event.listens_for(Pool, 'connect')
+def _connection_opened(dbapi_connection, connection_record):
+    pool_connections.inc()
+
+
+@event.listens_for(Pool, 'close')
+def _connection_closed(dbapi_connection, connection_record):
+    pool_connections.dec()
+
+
+@event.listens_for(Pool, 'close_detached')
+def _detached_connection_closed(dbapi_connection):
+    pool_connections.dec()
+
+
+@event.listens_for(Pool, 'checkout')
+def _checked_out(dbapi_connection, connection_record, connection_proxy):
+    pool_checked_out.inc()
+
+
+@event.listens_for(Pool, 'checkin')
+def _checked_in(dbapi_connection, connection_record):
+    pool_checked_out.dec()
+
+
+class OccupancyCollector:
+    """Available and occupied spots of every active lot, from the availability counters."""
+
+    def collect(self):
+        from models.models import db, ParkingLots
+
+        available = GaugeMetricFamily('parking_lot_available_spots', 'Free spots per active lot.', labels = ['lot_id', 'lot'])
+        occupied = GaugeMetricFamily('parking_lot_occupied_spots', 'Occupied spots per active lot.', labels = ['lot_id', 'lot'])
+
+        rows = (db.session.query(ParkingLots.id, ParkingLots.primename, ParkingLots.available_spots,
+                                 ParkingLots.occupied_spots)
+                .filter(ParkingLots.active == True).order_by(ParkingLots.id).all())
+        for lot_id, primename, available_spots, occupied_spots in rows:
+            available.add_metric([str(lot_id), primename], available_spots)
+            occupied.add_metric([str(lot_id), primename], occupied_spots)
+
+        yield available
+        yield occupied
+
+
+def exposition():
+    """Body and content type of a scrape, with samples from every worker process."""
+    registry = CollectorRegistry()
+    if MULTIPROCESS:
+        MultiProcessCollector(registry)
+    else:
+        registry.register(_DefaultRegistry())
+    registry.register(OccupancyCollector())
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+class _DefaultRegistry:
+    def collect(self):
+        return REGISTRY.collect()
+
+
+def _start_timer():
+    g.metrics_started = time.perf_counter()
+
+
+def _observe(status):
+    started = g.pop('metrics_started', None)
+    if started is None or request.endpoint == 'static':
+        return
+
+    endpoint = request.endpoint or '<unmatched>'
+    request_latency.labels(endpoint, request.method).observe(time.perf_counter() - started)
+    requests_total.labels(endpoint, request.method, str(status)).inc()
+
+
+def _after_request(response):
+    _observe(response.status_code)
+    return response
+
+
+def _teardown_request(exc):
+    if exc is not None:   # unhandled errors skip after_request
+        _observe(500)
+
+
+def init_app(app):
+    app.before_request(_start_timer)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
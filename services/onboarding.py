@@ -0,0 +1,165 @@
+import csv
+import json
+import os
+from itertools import chain, islice
+from sqlalchemy import insert
+from sqlalchemy.exc import SQLAlchemyError
+from werkzeug.datastructures import MultiDict
+from models.models import db, ParkingLots
+from forms.forms import ParkingLotForm
+from services.provisioning import provision_lots
+from services.search import lots_added
+from services.summarycache import invalidate
+
+
+# Bulk lot onboarding. A CSV or JSON file of lots is read row by row and handled BATCH_SIZE rows at a time:
+# each row is checked with ParkingLotForm, the batch's addresses are looked up with one IN query, and the new
+# lots go in with one executemany INSERT ... RETURNING plus batched spot inserts, committed per batch. Bad
+# rows are reported and skipped. A database failure stops the import with every earlier batch kept, and the
+# report names the row to resume from; rerunning the whole file is safe too, imported rows then report
+# their address as existing.
+
+FIELDS = ('primename', 'address', 'pincode', 'price', 'maxspots')
+FORMATS = ('csv', 'json')
+EXTENSIONS = {'.csv': 'csv', '.json': 'json', '.jsonl': 'json', '.ndjson': 'json'}
+BATCH_SIZE = 200
+MAX_ERRORS = 1000   # per-row errors listed in a report, all of them are counted
+
+
+class OnboardingError(ValueError):
+    pass
+
+
+def format_for(filename, fmt = None):
+    """The explicit fmt, or the format implied by the file name's extension."""
+    fmt = fmt or EXTENSIONS.get(os.path.splitext(filename or '')[1].lower())
+    if fmt not in FORMATS:
+        raise OnboardingError(f"format must be one of {', '.join(FORMATS)}")
+    return fmt
+
+
+def read_rows(stream, fmt):
+    """(row number, record) for each lot in a text stream, numbered from 1.
+
+    CSV needs a header with FIELDS. JSON is either an array of objects, read whole, or one object per line,
+    read as it goes.
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        missing = [field for field in FIELDS if field not in (reader.fieldnames or ())]
+        if missing:
+            raise OnboardingError(f"missing CSV columns: {', '.join(missing)}")
+        yield from enumerate(reader, 1)
+        return
+
+    first = stream.read(1)
+    while first.isspace():
+        first = stream.read(1)
+
+    if first == '[':
+        try:
+            records = json.loads(first + stream.read())
+        except ValueError as error:
+            raise OnboardingError(f"invalid JSON: {error}")
+        yield from enumerate(records, 1)
+        return
+
+    lines = (line for line in chain([first + stream.readline()], stream) if line.strip())
+    for number, line in enumerate(lines, 1):
+        try:
+            yield number, json.loads(line)
+        except ValueError as error:
+            yield number, OnboardingError(f"invalid JSON: {error}")
+
+
+def _validate(record):
+    """(lot values, None) for a valid record, else (None, error message)."""
+    if isinstance(record, OnboardingError):
+        return None, str(record)
+    if not isinstance(record, dict):
+        return None, "expected an object with " + ', '.join(FIELDS)
+
+    form = ParkingLotForm(formdata = MultiDict({field: '' if record.get(field) is None else str(record[field])
+                                                for field in FIELDS}),
+                          meta = {'csrf': False})
+    if not form.validate():
+        return None, '; '.join(f"{field}: {' '.join(messages)}" for field, messages in form.errors.items())
+
+    address = form.address.data.strip()
+    if len(address) > ParkingLots.address.type.length:   # the form does not cap it, the column does
+        return None, f"address: At most {ParkingLots.address.type.length} characters"
+
+    return {'primename': form.primename.data.strip(), 'address': address, 'pincode': form.pincode.data.strip(),
+            'price': round(form.price.data, 2), 'maxspots': form.maxspots.data}, None
+
+
+def _insert(lots):
+    # matched back by address, unique within the batch: asking for rows in parameter order would make SQLite
+    # insert one row per statement
+    result = db.session.execute(insert(ParkingLots).returning(ParkingLots.id, ParkingLots.address),
+                                [dict(lot, available_spots = lot['maxspots']) for lot in lots])
+    ids = {row.address: row.id for row in result}
+
+    provision_lots({ids[lot['address']]: lot['maxspots'] for lot in lots})
+    lots_added([(ids[lot['address']], lot['primename'], lot['address'], lot['pincode']) for lot in lots])
+    invalidate('lots')
+
+
+def _error(report, number, message):
+    report['error_count'] += 1
+    if len(report['errors']) < MAX_ERRORS:
+        report['errors'].append({'row': number, 'error': message})
+
+
+def import_lots(rows, start_row = 1, batch_size = BATCH_SIZE, dry_run = False):
+    """Create the lots in rows (from read_rows), skipping those numbered before start_row. Commits per batch.
+
+    Returns a report dict: rows read, lots imported and spots created, per-row errors, and resume_from, the
+    first row of the batch that failed to commit, with the failure (both None when the import ran to the
+    end). With dry_run the rows are validated and checked for existing addresses but nothing is written.
+    """
+    report = {'rows': 0, 'imported': 0, 'spots': 0, 'error_count': 0, 'errors': [], 'resume_from': None,
+              'failure': None}
+    seen = {}   # address: the row that first named it in this file
+    rows = ((number, record) for number, record in rows if number >= start_row)
+
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return report
+        report['rows'] += len(batch)
+
+        valid = []
+        for number, record in batch:
+            lot, error = _validate(record)
+            if error is None and lot['address'] in seen:
+                error = f"address repeats row {seen[lot['address']]}"
+            if error is not None:
+                _error(report, number, error)
+                continue
+            seen[lot['address']] = number
+            valid.append((number, lot))
+
+        existing = {address for address, in db.session.query(ParkingLots.address)
+                    .filter(ParkingLots.address.in_({lot['address'] for _, lot in valid}))} if valid else set()
+        lots = []
+        for number, lot in valid:
+            if lot['address'] in existing:
+                _error(report, number, "A parking Lot at this address already exists")
+            else:
+                lots.append(lot)
+
+        if dry_run or not lots:
+            db.session.rollback()
+        else:
+            try:
+                _insert(lots)
+                db.session.commit()
+            except SQLAlchemyError as error:
+                db.session.rollback()
+                report['resume_from'] = batch[0][0]
+                report['failure'] = str(error.__cause__ or error).splitlines()[0]
+                return report
+
+        report['imported'] += len(lots)
+        report['spots'] += sum(lot['maxspots'] for lot in lots)
@@ -0,0 +1,79 @@
+import base64
+import json
+from bisect import bisect_right
+from sqlalchemy import tuple_
+
+
+# Keyset (cursor) pagination. A cursor is the opaque, url-safe encoding of the sort key of the last row on
+# the previous page, so fetching page n costs the same as page 1 and rows inserted meanwhile never shift
+# a page. Every ordering ends in a unique column (the id) to keep it stable.
+
+PAGE_SIZE = 25
+MAX_PAGE_SIZE = 100
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(key):
+    raw = json.dumps(list(key), separators = (',', ':'), default = str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        key = json.loads(raw)
+    except (ValueError, TypeError):
+        raise InvalidCursor(cursor)
+
+    if not isinstance(key, list) or not key:
+        raise InvalidCursor(cursor)
+    return tuple(key)
+
+
+def page_size(value, default = PAGE_SIZE):
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def keyset_page(query, columns, cursor = None, size = PAGE_SIZE, descending = False):
+    """One page of an ORM query ordered by columns. Returns (rows, next_cursor or None)."""
+    key = decode_cursor(cursor)
+    if key is not None:
+        if len(key) != len(columns):
+            raise InvalidCursor(cursor)
+        position = tuple_(*columns) if len(columns) > 1 else columns[0]
+        value = tuple_(*key) if len(columns) > 1 else key[0]
+        query = query.filter(position < value if descending else position > value)
+
+    query = query.order_by(*[column.desc() if descending else column for column in columns])
+    rows = query.limit(size + 1).all()
+
+    if len(rows) <= size:
+        return rows, None
+
+    rows = rows[:size]
+    last = rows[-1]
+    return rows, encode_cursor(getattr(last, column.key) for column in columns)
+
+
+def list_page(entries, cursor = None, size = PAGE_SIZE):
+    """Same as keyset_page for an in-memory list of (key, item) already sorted by key."""
+    key = decode_cursor(cursor)
+    start = 0
+    if key is not None:
+        try:
+            start = bisect_right(entries, key, key = lambda entry: tuple(entry[0]))
+        except TypeError:
+            raise InvalidCursor(cursor)
+
+    page = entries[start:start + size]
+    next_cursor = encode_cursor(page[-1][0]) if start + size < len(entries) else None
+    return [item for _, item in page], next_cursor
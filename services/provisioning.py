@@ -0,0 +1,101 @@
+from sqlalchemy import insert, update, select, func
+from models.models import db, ParkingSpot
+from services.availability import adjust_counts
+from services.livefeed import publish_lot, publish_lots
+
+
+# Set-based spot provisioning. Lots of thousands of spots are created and resized with one executemany
+# INSERT and a couple of UPDATE ... WHERE id IN (subquery) statements instead of one ORM object per spot.
+# All functions work inside the caller's transaction and keep the availability counters in step.
+
+INSERT_BATCH = 5000
+
+
+class ProvisioningError(ValueError):
+    pass
+
+
+def _insert_spots(lot_id, first_no, count):
+    for start in range(first_no, first_no + count, INSERT_BATCH):
+        stop = min(start + INSERT_BATCH, first_no + count)
+        db.session.execute(insert(ParkingSpot),
+                           [{'lot_id': lot_id, 'spot_no': spot_no, 'status': 'A', 'active': True}
+                            for spot_no in range(start, stop)])
+
+
+def _active_counts(lot_id):
+    row = (db.session.query(func.count(), func.count().filter(ParkingSpot.status == 'O'))
+           .filter(ParkingSpot.lot_id == lot_id, ParkingSpot.active == True)
+           .one())
+    return row[0], row[1]
+
+
+def provision_lot(lot):
+    """Create spots 1..lot.maxspots for a freshly flushed lot that has none yet."""
+    _insert_spots(lot.id, 1, lot.maxspots)
+    adjust_counts(lot.id, available = lot.maxspots)
+    publish_lot(lot.id)
+
+
+def provision_lots(sizes):
+    """Spots for many fresh lots, given as {lot_id: maxspots}, in INSERT_BATCH sized executemany inserts.
+
+    The lots must have been inserted with available_spots = maxspots; no counters are adjusted here.
+    """
+    batch = []
+    for lot_id, max_spots in sizes.items():
+        for spot_no in range(1, max_spots + 1):
+            batch.append({'lot_id': lot_id, 'spot_no': spot_no, 'status': 'A', 'active': True})
+            if len(batch) == INSERT_BATCH:
+                db.session.execute(insert(ParkingSpot), batch)
+                batch = []
+    if batch:
+        db.session.execute(insert(ParkingSpot), batch)
+    publish_lots(list(sizes))
+
+
+def resize_lot(lot, new_max_spots):
+    """Grow or shrink the active spots of a lot to new_max_spots.
+
+    Shrinking deactivates the highest numbered free spots; growing reactivates deactivated spots first
+    (highest numbers first, as before) and then appends new spot numbers.
+    """
+    active, occupied = _active_counts(lot.id)
+
+    if new_max_spots < occupied:
+        raise ProvisioningError("Cannot set max spots below number of occupied spots.")
+
+    if new_max_spots < active:
+        excess = (select(ParkingSpot.id)
+                  .where(ParkingSpot.lot_id == lot.id, ParkingSpot.status == 'A', ParkingSpot.active == True)
+                  .order_by(ParkingSpot.spot_no.desc())
+                  .limit(active - new_max_spots))
+        result = db.session.execute(update(ParkingSpot).where(ParkingSpot.id.in_(excess.scalar_subquery()))
+                                    .values(active = False).execution_options(synchronize_session = False))
+        adjust_counts(lot.id, available = -result.rowcount)
+
+    elif new_max_spots > active:
+        spots_to_add = new_max_spots - active
+
+        deactivated = (select(ParkingSpot.id)
+                       .where(ParkingSpot.lot_id == lot.id, ParkingSpot.active == False, ParkingSpot.status == 'A')
+                       .order_by(ParkingSpot.spot_no.desc())
+                       .limit(spots_to_add))
+        result = db.session.execute(update(ParkingSpot).where(ParkingSpot.id.in_(deactivated.scalar_subquery()))
+                                    .values(active = True).execution_options(synchronize_session = False))
+        spots_to_add -= result.rowcount
+
+        if spots_to_add > 0:
+            last_no = db.session.query(func.max(ParkingSpot.spot_no)).filter(ParkingSpot.lot_id == lot.id).scalar()
+            _insert_spots(lot.id, (last_no or 0) + 1, spots_to_add)
+
+        adjust_counts(lot.id, available = result.rowcount + spots_to_add)
+
+    lot.maxspots = new_max_spots
+    publish_lot(lot.id)
+
+
+def reactivate_lot(lot, max_spots = None):
+    """Bring a deleted lot back with max_spots (default: its last size) active spots."""
+    lot.active = True
+    resize_lot(lot, lot.maxspots if max_spots is None else max_spots)
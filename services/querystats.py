@@ -0,0 +1,165 @@
+import re
+import time
+import threading
+from collections import Counter
+from flask import g, request, current_app
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+# Per-request SQL instrumentation. Every statement sent through any engine is timed by the cursor events below
+# and handed to the QueryLogs active on the current thread: one per request (opened by the Flask hooks in
+# init_app) plus any opened by track_queries() around test or benchmark code. Finished requests are folded into
+# per-route totals for /admin/metrics; a request that issues too many statements, or the same statement shape
+# over and over (the N+1 pattern of lazy loads in a loop), is logged as a warning.
+
+WARN_STATEMENTS = 25
+WARN_REPEATS = 10
+MAX_SHAPES = 50
+
+_local = threading.local()
+
+_literals = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_in_lists = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_spaces = re.compile(r"\s+")
+
+
+def statement_shape(statement):
+    """Reduce a statement to its shape: literals and expanded IN lists become ?, whitespace is collapsed."""
+    shape = _literals.sub('?', statement)
+    shape = _in_lists.sub('(?)', shape)
+    return _spaces.sub(' ', shape).strip()
+
+
+class QueryLog:
+    """Statements seen while active: count, total DB time and how often each shape was issued."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = Counter()
+
+    def record(self, statement, elapsed):
+        self.count += 1
+        self.duration += elapsed
+        self.shapes[statement_shape(statement)] += 1
+
+    def repeated(self, threshold = WARN_REPEATS):
+        """Shapes issued at least threshold times, most frequent first."""
+        return [(shape, count) for shape, count in self.shapes.most_common() if count >= threshold]
+
+    def __enter__(self):
+        _active_logs().append(self)
+        return self
+
+    def __exit__(self, *exc):
+        _active_logs().remove(self)
+
+
+def track_queries():
+    """Context manager that collects every statement issued on this thread, e.g.
+
+        with track_queries() as log:
+            client.get('/summary')
+        assert log.count <= 8 and not log.repeated()
+    """
+    return QueryLog()
+
+
+def _active_logs():
+    logs = getattr(_local, 'logs', None)
+    if logs is None:
+        logs = _local.logs = []
+    return logs
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _start_timer(conn, cursor, statement, parameters, context, executemany):
+    if getattr(_local, 'logs', None):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _stop_timer(conn, cursor, statement, parameters, context, executemany):
+    logs = getattr(_local, 'logs', None)
+    started = conn.info.get('query_started')
+    if not logs or not started:
+        return
+
+    elapsed = time.perf_counter() - started.pop()
+    for log in logs:
+        log.record(statement, elapsed)
+
+
+class RouteStats:
+    def __init__(self):
+        self.requests = 0
+        self.statements = 0
+        self.max_statements = 0
+        self.duration = 0.0
+        self.max_duration = 0.0
+        self.warnings = 0
+        self.repeated = Counter()   # shape -> requests in which it crossed the repeat threshold
+
+    def add(self, log, repeated, warned):
+        self.requests += 1
+        self.statements += log.count
+        self.max_statements = max(self.max_statements, log.count)
+        self.duration += log.duration
+        self.max_duration = max(self.max_duration, log.duration)
+        self.warnings += warned
+        for shape, _ in repeated:
+            if shape in self.repeated or len(self.repeated) < MAX_SHAPES:
+                self.repeated[shape] += 1
+
+
+_routes = {}
+_routes_lock = threading.Lock()
+
+
+def route_stats():
+    """Per-route totals as dicts, the routes spending most time in the database first."""
+    with _routes_lock:
+        rows = [{'route': route, 'requests': stats.requests, 'statements': stats.statements,
+                 'avg_statements': stats.statements / stats.requests, 'max_statements': stats.max_statements,
+                 'db_ms': stats.duration * 1000, 'avg_db_ms': stats.duration * 1000 / stats.requests,
+                 'max_db_ms': stats.max_duration * 1000, 'warnings': stats.warnings,
+                 'repeated': stats.repeated.most_common(5)}
+                for route, stats in _routes.items()]
+    return sorted(rows, key = lambda row: row['db_ms'], reverse = True)
+
+
+def reset_stats():
+    with _routes_lock:
+        _routes.clear()
+
+
+def _begin_request():
+    if request.endpoint == 'static':
+        return
+    g.query_log = track_queries().__enter__()
+
+
+def _end_request(exc):
+    log = g.pop('query_log', None)
+    if log is None:
+        return
+    log.__exit__(None, None, None)
+
+    route = request.endpoint or '<unmatched>'
+    max_statements = current_app.config.get('SQL_WARN_STATEMENTS', WARN_STATEMENTS)
+    repeated = log.repeated(current_app.config.get('SQL_WARN_REPEATS', WARN_REPEATS))
+    warned = log.count > max_statements or bool(repeated)
+
+    if warned:
+        current_app.logger.warning("%s %s issued %d SQL statements in %.1f ms%s", request.method, route, log.count,
+                                   log.duration * 1000,
+                                   ''.join(f"\n  {count}x {shape[:200]}" for shape, count in repeated))
+
+    with _routes_lock:
+        _routes.setdefault(route, RouteStats()).add(log, repeated, warned)
+
+
+def init_app(app):
+    app.before_request(_begin_request)
+    app.teardown_request(_end_request)
@@ -0,0 +1,52 @@
+import time
+from functools import wraps
+from flask import current_app, has_request_context, session
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from models.models import db
+
+
+# Read/write routing. With DATABASE_REPLICA_URI set, views marked @read_replica send their SELECTs to the
+# 'replica' bind (a streaming replica, or for SQLite a periodically copied snapshot file) so reporting pages
+# do not compete with bookings for the primary's connections; writes always go to the primary (see
+# models.RoutingSession). A replica lags, so for READ_REPLICA_STICKY seconds after a request commits a write,
+# the same browser session reads from the primary again and sees its own booking or release.
+
+STICKY = 5   # seconds
+SESSION_KEY = 'primary_reads_until'
+
+
+def read_replica(view):
+    """Route the view's reads to the replica, unless this session wrote something moments ago."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if 'replica' in db.engines and session.get(SESSION_KEY, 0) <= time.time():
+            db.session.info['read_replica'] = True
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def uses_replica():
+    return bool(db.session.info.get('read_replica'))
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _note_statement(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info['wrote'] = True
+
+
+@event.listens_for(Session, 'after_flush')
+def _note_flush(session, flush_context):
+    session.info['wrote'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _stick_to_primary(db_session):
+    if db_session.info.pop('wrote', False) and has_request_context() and 'replica' in db.engines:
+        session[SESSION_KEY] = time.time() + current_app.config['READ_REPLICA_STICKY']
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_writes(db_session):
+    db_session.info.pop('wrote', None)
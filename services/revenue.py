@@ -0,0 +1,139 @@
+from collections import defaultdict
+from decimal import Decimal
+from pytz import timezone, UTC
+from sqlalchemy import insert, update, delete, func
+from sqlalchemy.dialects import sqlite, postgresql
+from models.models import db, ParkingSpot, ReservationHistory, SpotRevenueDaily, LotRevenueDaily
+from services.summarycache import invalidate
+
+
+# Daily revenue rollups. A reservation's total_cost is booked against the IST day it was released on,
+# once, in the same transaction that closes it. Reports read these rows instead of re-summing history.
+
+ist = timezone('Asia/Kolkata')
+
+_UPSERT_DIALECTS = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}
+
+
+def revenue_day(leaving_time):
+    if leaving_time.tzinfo is None:
+        leaving_time = UTC.localize(leaving_time)
+    return leaving_time.astimezone(ist).date()
+
+
+def _add(model, key_column, key, day, revenue, sessions):
+    dialect_insert = _UPSERT_DIALECTS.get(db.session.get_bind().dialect.name)
+
+    if dialect_insert is not None:
+        stmt = dialect_insert(model).values({key_column.key: key, 'day': day, 'revenue': revenue, 'sessions': sessions})
+        stmt = stmt.on_conflict_do_update(
+            index_elements = [key_column.key, 'day'],
+            set_ = {'revenue': model.revenue + stmt.excluded.revenue, 'sessions': model.sessions + stmt.excluded.sessions},
+        )
+        db.session.execute(stmt)
+        return
+
+    result = db.session.execute(
+        update(model)
+        .where(key_column == key, model.day == day)
+        .values(revenue = model.revenue + revenue, sessions = model.sessions + sessions)
+    )
+    if result.rowcount == 0:
+        db.session.execute(insert(model).values({key_column.key: key, 'day': day, 'revenue': revenue, 'sessions': sessions}))
+
+
+def _add_many(model, key_column, values):
+    dialect_insert = _UPSERT_DIALECTS.get(db.session.get_bind().dialect.name)
+
+    if dialect_insert is None:
+        for row in values:
+            _add(model, key_column, row[key_column.key], row['day'], row['revenue'], row['sessions'])
+        return
+
+    stmt = dialect_insert(model)
+    stmt = stmt.on_conflict_do_update(
+        index_elements = [key_column.key, 'day'],
+        set_ = {'revenue': model.revenue + stmt.excluded.revenue, 'sessions': model.sessions + stmt.excluded.sessions},
+    )
+    db.session.execute(stmt, values)
+
+
+def record_revenue(spot_id, lot_id, leaving_time, total_cost):
+    """Add one closed reservation to the spot and lot rollups; call before committing the release."""
+    day = revenue_day(leaving_time)
+    amount = Decimal(total_cost or 0).quantize(Decimal('0.01'))
+
+    _add(SpotRevenueDaily, SpotRevenueDaily.spot_id, spot_id, day, amount, 1)
+    _add(LotRevenueDaily, LotRevenueDaily.lot_id, lot_id, day, amount, 1)
+    invalidate('revenue')
+
+
+def record_revenue_batch(closed):
+    """record_revenue for many (spot_id, lot_id, leaving_time, total_cost), one upsert per spot/lot and day."""
+    spot_totals = defaultdict(lambda: [Decimal('0'), 0])
+    lot_totals = defaultdict(lambda: [Decimal('0'), 0])
+
+    for spot_id, lot_id, leaving_time, total_cost in closed:
+        day = revenue_day(leaving_time)
+        amount = Decimal(total_cost or 0).quantize(Decimal('0.01'))
+        for totals, key in ((spot_totals, (spot_id, day)), (lot_totals, (lot_id, day))):
+            totals[key][0] += amount
+            totals[key][1] += 1
+
+    for model, key_column, totals in ((SpotRevenueDaily, SpotRevenueDaily.spot_id, spot_totals),
+                                      (LotRevenueDaily, LotRevenueDaily.lot_id, lot_totals)):
+        _add_many(model, key_column, [{key_column.key: key, 'day': day, 'revenue': revenue, 'sessions': sessions}
+                                      for (key, day), (revenue, sessions) in totals.items()])
+    invalidate('revenue')
+
+
+def spot_revenue_totals():
+    return (db.session.query(SpotRevenueDaily.spot_id, func.sum(SpotRevenueDaily.revenue))
+            .group_by(SpotRevenueDaily.spot_id)
+            .order_by(SpotRevenueDaily.spot_id)
+            .all())
+
+
+def lot_revenue_totals(start = None, end = None):
+    query = db.session.query(LotRevenueDaily.lot_id, func.sum(LotRevenueDaily.revenue), func.sum(LotRevenueDaily.sessions))
+
+    if start is not None:
+        query = query.filter(LotRevenueDaily.day >= start)
+    if end is not None:
+        query = query.filter(LotRevenueDaily.day <= end)
+
+    return query.group_by(LotRevenueDaily.lot_id).order_by(LotRevenueDaily.lot_id).all()
+
+
+def backfill(batch_size = 5000):
+    """Rebuild both rollups from every closed reservation. Returns the number of reservations read."""
+    spot_totals = defaultdict(lambda: [Decimal('0'), 0])
+    lot_totals = defaultdict(lambda: [Decimal('0'), 0])
+    read = 0
+
+    rows = (db.session.query(ReservationHistory.spot_id, ParkingSpot.lot_id, ReservationHistory.leaving_time,
+                             ReservationHistory.total_cost)
+            .join(ParkingSpot, ParkingSpot.id == ReservationHistory.spot_id)
+            .filter(ReservationHistory.leaving_time != None)
+            .execution_options(yield_per = batch_size))
+
+    for spot_id, lot_id, leaving_time, total_cost in rows:
+        day = revenue_day(leaving_time)
+        amount = Decimal(total_cost or 0).quantize(Decimal('0.01'))
+        for totals, key in ((spot_totals, (spot_id, day)), (lot_totals, (lot_id, day))):
+            totals[key][0] += amount
+            totals[key][1] += 1
+        read += 1
+
+    db.session.execute(delete(SpotRevenueDaily))
+    db.session.execute(delete(LotRevenueDaily))
+
+    for model, key_name, totals in ((SpotRevenueDaily, 'spot_id', spot_totals), (LotRevenueDaily, 'lot_id', lot_totals)):
+        values = [{key_name: key, 'day': day, 'revenue': revenue, 'sessions': sessions}
+                  for (key, day), (revenue, sessions) in totals.items()]
+        for start in range(0, len(values), batch_size):
+            db.session.execute(insert(model), values[start:start + batch_size])
+
+    invalidate('revenue')
+    db.session.commit()
+    return read
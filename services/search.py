@@ -0,0 +1,345 @@
+import os
+import re
+import time
+from bisect import bisect_left
+from collections import Counter
+from threading import Lock
+from sqlalchemy import event, text, or_
+from sqlalchemy.orm import Session
+from models.models import db, ParkingLots
+from services.versions import global_version
+
+
+# Ranked, typo tolerant lot search over name, address and pincode.
+#
+# On SQLite builds with FTS5 and its trigram tokenizer (3.34+) the lot_search virtual table is the index.
+# It is created by the migration or `flask admin rebuild-search-index`, never on the request path, and kept
+# in sync by triggers on parking_lots, so every worker and every write path sees the same data. Elsewhere,
+# or while the table does not exist yet, an in-process TrigramIndex is used; it is updated after commit by lot_changed / lot_removed and rebuilt
+# every SEARCH_INDEX_TTL seconds to pick up writes made by other processes.
+#
+# Both backends rank the same way: candidates are scored by the share of the query's trigrams they contain.
+
+MIN_SCORE = 0.3
+RANKED_CAP = 200
+FTS_CANDIDATES = 200
+INDEX_TTL = int(os.getenv('SEARCH_INDEX_TTL', '300'))
+PINCODE_REFRESH = 1.0   # seconds; every booking moves the global version, this caps rebuilds under load
+
+FTS_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS lot_search USING fts5(primename, address, pincode, tokenize='trigram')",
+    """CREATE TRIGGER IF NOT EXISTS lot_search_ai AFTER INSERT ON parking_lots WHEN new.active BEGIN
+        INSERT INTO lot_search(rowid, primename, address, pincode) VALUES (new.id, new.primename, new.address, new.pincode);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS lot_search_ad AFTER DELETE ON parking_lots BEGIN
+        DELETE FROM lot_search WHERE rowid = old.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS lot_search_au AFTER UPDATE OF primename, address, pincode, active ON parking_lots BEGIN
+        DELETE FROM lot_search WHERE rowid = old.id;
+        INSERT INTO lot_search(rowid, primename, address, pincode)
+            SELECT new.id, new.primename, new.address, new.pincode WHERE new.active;
+    END""",
+)
+
+
+def trigrams(value):
+    grams = set()
+    for word in re.findall(r'\w+', value.lower()):
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def _document(primename, address, pincode):
+    return trigrams(f"{primename} {address} {pincode}")
+
+
+def _score(query_grams, doc_grams):
+    return len(query_grams & doc_grams) / len(query_grams)
+
+
+class TrigramIndex:
+
+    def __init__(self):
+        self._docs = {}
+        self._postings = {}
+        self._lock = Lock()
+        self.built_at = None
+
+    def add(self, lot_id, primename, address, pincode):
+        grams = _document(primename, address, pincode)
+        with self._lock:
+            self._remove(lot_id)
+            self._docs[lot_id] = grams
+            for gram in grams:
+                self._postings.setdefault(gram, set()).add(lot_id)
+
+    def remove(self, lot_id):
+        with self._lock:
+            self._remove(lot_id)
+
+    def _remove(self, lot_id):
+        for gram in self._docs.pop(lot_id, ()):
+            ids = self._postings.get(gram)
+            if ids:
+                ids.discard(lot_id)
+                if not ids:
+                    del self._postings[gram]
+
+    def build(self, rows):
+        docs, postings = {}, {}
+        for lot_id, primename, address, pincode in rows:
+            grams = _document(primename, address, pincode)
+            docs[lot_id] = grams
+            for gram in grams:
+                postings.setdefault(gram, set()).add(lot_id)
+
+        with self._lock:
+            self._docs, self._postings = docs, postings
+            self.built_at = time.monotonic()
+
+    def search(self, query, limit):
+        query_grams = trigrams(query)
+        if not query_grams:
+            return []
+
+        with self._lock:
+            hits = Counter()
+            for gram in query_grams:
+                hits.update(self._postings.get(gram, ()))
+
+        needed = len(query_grams) * MIN_SCORE
+        ranked = sorted((-count / len(query_grams), lot_id) for lot_id, count in hits.items() if count >= needed)
+        return ranked[:limit]
+
+
+class PincodeIndex:
+    """Active lots sorted by pincode, answering prefix lookups with two bisects."""
+
+    def __init__(self):
+        self._pincodes = []
+        self._entries = []
+        self._lock = Lock()
+        self.built_at = None
+        self.version = None   # global data version the entries were read at
+
+    def build(self, rows, version = None):
+        entries = sorted((pincode, lot_id) for lot_id, pincode in rows)
+        with self._lock:
+            self._pincodes = [pincode for pincode, _ in entries]
+            self._entries = entries
+            self.built_at = time.monotonic()
+            self.version = version
+
+    def stale(self, version):
+        """True once a commit in any worker moved the global version (checked at most every PINCODE_REFRESH s)."""
+        if self.built_at is None:
+            return True
+        age = time.monotonic() - self.built_at
+        return age > INDEX_TTL or (version != self.version and age > PINCODE_REFRESH)
+
+    def invalidate(self):
+        self.built_at = None
+
+    def prefix(self, prefix):
+        """[(pincode, lot_id)] in pincode order."""
+        with self._lock:
+            start = bisect_left(self._pincodes, prefix)
+            end = bisect_left(self._pincodes, prefix[:-1] + chr(ord(prefix[-1]) + 1), start) if prefix else len(self._entries)
+            return self._entries[start:end]
+
+
+memory_index = TrigramIndex()
+pincode_index = PincodeIndex()
+_fts_ready = {}
+_fts_tables = set()
+
+
+def fts_available(bind = None):
+    """Whether the database can hold the lot_search table: SQLite with FTS5 and the trigram tokenizer."""
+    bind = bind or db.session.get_bind()
+    if bind.dialect.name != 'sqlite':
+        return False
+
+    key = str(bind.url)
+    if key not in _fts_ready:
+        with bind.connect() as conn:
+            _fts_ready[key] = _probe_fts5(conn)
+    return _fts_ready[key]
+
+
+def _probe_fts5(conn):
+    # a temp table, nothing is written to the database file
+    try:
+        conn.execute(text("CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(x, tokenize='trigram')"))
+        conn.execute(text("DROP TABLE temp.fts5_probe"))
+        return True
+    except Exception:
+        return False
+
+
+def fts_indexed(bind = None):
+    """fts_available and the lot_search table exists; read only, safe on a replica."""
+    bind = bind or db.session.get_bind()
+    key = str(bind.url)
+    if key not in _fts_tables and fts_available(bind):
+        if db.session.execute(text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'lot_search'")).first():
+            _fts_tables.add(key)
+    return key in _fts_tables
+
+
+def ensure_fts():
+    """Create the FTS5 table and triggers if missing (databases built with create_all) and fill an empty table.
+
+    Run from the rebuild CLI and scripts only, searches fall back to the in-process index until it exists.
+    """
+    for ddl in FTS_DDL:
+        db.session.execute(text(ddl))
+
+    if db.session.execute(text("SELECT count(*) FROM lot_search")).scalar() == 0:
+        db.session.execute(text(
+            "INSERT INTO lot_search(rowid, primename, address, pincode) "
+            "SELECT id, primename, address, pincode FROM parking_lots WHERE active"))
+    db.session.commit()
+
+
+def rebuild():
+    if fts_available():
+        ensure_fts()
+        db.session.execute(text("DELETE FROM lot_search"))
+        db.session.execute(text(
+            "INSERT INTO lot_search(rowid, primename, address, pincode) "
+            "SELECT id, primename, address, pincode FROM parking_lots WHERE active"))
+        db.session.commit()
+    else:
+        _build_memory_index()
+
+
+def _build_memory_index():
+    memory_index.build(
+        db.session.query(ParkingLots.id, ParkingLots.primename, ParkingLots.address, ParkingLots.pincode)
+        .filter(ParkingLots.active == True)
+        .yield_per(5000)
+    )
+
+
+def _fts_query(query, strict = True):
+    # strict: any trigram of a word may match (typos), but every word of three or more letters has to match
+    def any_of(text):
+        grams = sorted({text[i:i + 3] for i in range(len(text) - 2)})
+        return "(" + " OR ".join('"{}"'.format(gram.replace('"', '""')) for gram in grams) + ")" if grams else None
+
+    clauses = [clause for clause in map(any_of, query.split()) if clause]
+    if not strict or not clauses:
+        return any_of(query)
+    return " AND ".join(clauses)
+
+
+def _search_fts(query, limit):
+    statement = text("SELECT rowid, primename, address, pincode FROM lot_search WHERE lot_search MATCH :match "
+                     "ORDER BY rank LIMIT :candidates")
+    candidates = max(FTS_CANDIDATES, limit)
+
+    rows = db.session.execute(statement, {'match': _fts_query(query.lower()), 'candidates': candidates}).all()
+    if not rows:
+        # a word too misspelt to share a trigram, let any word match and leave it to the scoring
+        rows = db.session.execute(statement, {'match': _fts_query(query.lower(), strict = False),
+                                              'candidates': candidates}).all()
+
+    query_grams = trigrams(query)
+    scored = [(-_score(query_grams, _document(primename, address, pincode)), lot_id)
+              for lot_id, primename, address, pincode in rows]
+    return sorted(hit for hit in scored if -hit[0] >= MIN_SCORE)[:limit]
+
+
+def ranked_lot_ids(query, limit = RANKED_CAP):
+    """[((-score, lot_id), lot_id)] for lots matching the query, best match first."""
+    query = ' '.join(query.split())
+    if not query:
+        return []
+
+    if len(query) < 3:
+        # too short for trigrams, fall back to an anchored prefix match
+        ranked = [(0, lot_id) for lot_id, in db.session.query(ParkingLots.id)
+                  .filter(ParkingLots.active == True,
+                          or_(ParkingLots.primename.ilike(f"{query}%"), ParkingLots.address.ilike(f"{query}%")))
+                  .order_by(ParkingLots.id).limit(limit)]
+
+    elif fts_indexed():
+        ranked = _search_fts(query, limit)
+
+    else:
+        if memory_index.built_at is None or time.monotonic() - memory_index.built_at > INDEX_TTL:
+            _build_memory_index()
+        ranked = memory_index.search(query, limit)
+
+    return [(hit, hit[1]) for hit in ranked]
+
+
+def search_lot_ids(query, limit = 50):
+    """Lot ids matching the query, best match first."""
+    return [lot_id for _, lot_id in ranked_lot_ids(query, limit)]
+
+
+def lots_in_order(ids):
+    if not ids:
+        return []
+
+    lots = {lot.id: lot for lot in ParkingLots.query.filter(ParkingLots.id.in_(ids), ParkingLots.active == True)}
+    return [lots[lot_id] for lot_id in ids if lot_id in lots]
+
+
+def search_lots(query, limit = 50):
+    return lots_in_order(search_lot_ids(query, limit))
+
+
+def pincode_entries(prefix):
+    """[((pincode, lot_id), lot_id)] for active lots whose pincode starts with prefix, in pincode order."""
+    version = global_version()
+    if pincode_index.stale(version):
+        pincode_index.build(db.session.query(ParkingLots.id, ParkingLots.pincode)
+                            .filter(ParkingLots.active == True).yield_per(5000), version)
+
+    return [((pincode, lot_id), lot_id) for pincode, lot_id in pincode_index.prefix(prefix)]
+
+
+def pincode_lot_ids(prefix, limit = 50):
+    return [lot_id for _, lot_id in pincode_entries(prefix)[:limit]]
+
+
+def lots_by_pincode(prefix, limit = 50):
+    return lots_in_order(pincode_lot_ids(prefix, limit))
+
+
+def lot_changed(lot):
+    db.session.info.setdefault('search_ops', []).append((lot.id, lot.primename, lot.address, lot.pincode, lot.active))
+
+
+def lots_added(lots):
+    """lot_changed for many new lots, given as (id, primename, address, pincode) rows."""
+    db.session.info.setdefault('search_ops', []).extend((lot_id, primename, address, pincode, True)
+                                                        for lot_id, primename, address, pincode in lots)
+
+
+def lot_removed(lot_id):
+    db.session.info.setdefault('search_ops', []).append((lot_id, None, None, None, False))
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_search_ops(session):
+    ops = session.info.pop('search_ops', ())
+    if ops:
+        pincode_index.invalidate()   # rebuilt on the next pincode search
+
+    for lot_id, primename, address, pincode, active in ops:
+        if memory_index.built_at is None:
+            break
+        if active:
+            memory_index.add(lot_id, primename, address, pincode)
+        else:
+            memory_index.remove(lot_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_search_ops(session):
+    session.info.pop('search_ops', None)
@@ -0,0 +1,50 @@
+import base64
+from sqlalchemy import select
+from models.models import db, ParkingSpot
+
+
+# Compact per-lot spot status for the admin dashboard. Bit n-1 of a lot's bitmaps (least significant bit
+# first within each byte) describes spot_no n: one bitmap for active spots, one for occupied ones. Spot ids
+# are sent as runs of [first spot_no, first id, length] where id grows with spot_no, which is a single run
+# for a lot provisioned in one go. A 10k-spot lot is a few kilobytes instead of 10k ORM objects.
+
+MAX_LOTS = 100
+
+
+def _encode(bits):
+    return base64.b64encode(bytes(bits)).decode('ascii')
+
+
+def spot_bitmaps(lot_ids):
+    """Bitmap documents for the given lots, in the order asked for; unknown lots get an empty map."""
+    spots = ParkingSpot.__table__.c   # plain Core rows, there can be tens of thousands
+    rows = db.session.execute(select(spots.lot_id, spots.spot_no, spots.id, spots.status, spots.active)
+                              .where(spots.lot_id.in_(lot_ids))
+                              .order_by(spots.lot_id, spots.spot_no)).all()
+
+    by_lot = {lot_id: [] for lot_id in lot_ids}
+    for row in rows:
+        by_lot[row[0]].append(row)
+
+    return [_bitmap(lot_id, by_lot[lot_id]) for lot_id in lot_ids]
+
+
+def _bitmap(lot_id, spots):
+    size = spots[-1][1] if spots else 0
+    active = bytearray((size + 7) // 8)
+    occupied = bytearray((size + 7) // 8)
+    runs = []
+
+    for _, spot_no, spot_id, status, is_active in spots:
+        index = spot_no - 1
+        if is_active:
+            active[index >> 3] |= 1 << (index & 7)
+        if status == 'O':
+            occupied[index >> 3] |= 1 << (index & 7)
+
+        if runs and runs[-1][0] + runs[-1][2] == spot_no and runs[-1][1] + runs[-1][2] == spot_id:
+            runs[-1][2] += 1
+        else:
+            runs.append([spot_no, spot_id, 1])
+
+    return {'lot_id': lot_id, 'size': size, 'active': _encode(active), 'occupied': _encode(occupied), 'ids': runs}
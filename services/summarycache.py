@@ -0,0 +1,226 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from models.models import db
+from services.metrics import summary_cache_outcome
+
+
+# Cache for the chart data behind /summary: 'revenue' (revenue per spot), 'lots' (per-lot counts) and
+# 'usage:<user_id>' (a user's reservations per spot). Entries expire after SUMMARY_CACHE_TTL seconds and the
+# least recently used go first once SUMMARY_CACHE_SIZE is reached. Write paths call invalidate() with the
+# datasets they change; the entries are dropped when that transaction commits, and a value computed from
+# data read before an invalidation is not stored.
+#
+# Each entry also carries the data version (services.versions) that was read before computing it, and a
+# lookup for a newer version is a miss. /summary tags its body with that same version, so an entry that an
+# invalidation did not reach (another worker's memory cache, another host, a value computed from a lagging
+# replica) can never be sent under the ETag of data it was not computed from.
+#
+# SUMMARY_CACHE picks the backend: 'memory' is per worker process, so invalidations only reach the worker
+# that made the write and the others catch up within the TTL; 'sqlite' keeps the entries in one file
+# (SUMMARY_CACHE_PATH) that all workers on the host share; 'none' turns caching off.
+
+TTL = 60   # seconds
+MAX_ENTRIES = 1000
+BACKENDS = ('memory', 'sqlite', 'none')
+
+
+def _matches(key, name):
+    return key == name or key.startswith(name + ':')
+
+
+class MemoryBackend:
+    def __init__(self, max_entries = MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()   # key: (value, expires), least recently used first
+        self._invalidated = {}          # name: time of its last invalidation
+        self._lock = threading.Lock()
+
+    def get(self, key, now):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= now:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, value, expires, computed_at):
+        with self._lock:
+            if any(self._invalidated.get(name, 0) >= computed_at for name in (key, key.split(':')[0])):
+                return
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last = False)
+
+    def invalidate(self, names, now):
+        with self._lock:
+            for name in names:
+                self._invalidated[name] = now
+            for key in [key for key in self._entries if any(_matches(key, name) for name in names)]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class SqliteBackend:
+    """Entries in a SQLite file shared by the workers on one host. Values are stored as JSON."""
+
+    TOUCH_INTERVAL = 1.0   # seconds; recency is only rewritten this often to keep hits mostly read-only
+
+    def __init__(self, path, max_entries = MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS summary_cache "
+                         "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL, used REAL NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_summary_cache_used ON summary_cache (used)")
+            conn.execute("CREATE TABLE IF NOT EXISTS summary_cache_invalidation (name TEXT PRIMARY KEY, at REAL NOT NULL)")
+
+    def _connection(self):
+        # one connection per thread, and a new one after gunicorn forks the worker
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout = 5, isolation_level = None, check_same_thread = False)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = OFF")   # the cache can be rebuilt, a lost write costs nothing
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def get(self, key, now):
+        conn = self._connection()
+        row = conn.execute("SELECT value, expires, used FROM summary_cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        value, expires, used = row
+        if expires <= now:
+            conn.execute("DELETE FROM summary_cache WHERE key = ? AND expires <= ?", (key, now))
+            return None
+        if used < now - self.TOUCH_INTERVAL:
+            conn.execute("UPDATE summary_cache SET used = ? WHERE key = ?", (now, key))
+        return json.loads(value)
+
+    def set(self, key, value, expires, computed_at):
+        conn = self._connection()
+        conn.execute("INSERT OR REPLACE INTO summary_cache (key, value, expires, used) SELECT ?, ?, ?, ? "
+                     "WHERE NOT EXISTS (SELECT 1 FROM summary_cache_invalidation WHERE name IN (?, ?) AND at >= ?)",
+                     (key, json.dumps(value), expires, time.time(), key, key.split(':')[0], computed_at))
+
+        excess = conn.execute("SELECT count(*) FROM summary_cache").fetchone()[0] - self.max_entries
+        if excess > 0:
+            conn.execute("DELETE FROM summary_cache WHERE key IN "
+                         "(SELECT key FROM summary_cache ORDER BY used LIMIT ?)", (excess,))
+
+    def invalidate(self, names, now):
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany("INSERT OR REPLACE INTO summary_cache_invalidation (name, at) VALUES (?, ?)",
+                             [(name, now) for name in names])
+            conn.executemany("DELETE FROM summary_cache WHERE key = ? OR key GLOB ?",
+                             [(name, name + ':*') for name in names])
+            conn.execute("COMMIT")
+        except sqlite3.Error:
+            conn.execute("ROLLBACK")
+            raise
+
+    def clear(self):
+        self._connection().execute("DELETE FROM summary_cache")
+
+
+class SummaryCache:
+    def __init__(self):
+        self.backend = None   # caching is off until init_app
+        self.ttl = TTL
+
+    def configure(self, backend, ttl = TTL):
+        self.backend = backend
+        self.ttl = ttl
+
+    def fetch(self, key, compute, version = 0):
+        """The cached value for key, or compute() stored under it. compute must return JSON-serialisable data.
+
+        version is the data version read before calling fetch; an entry computed at an older one is a miss.
+        """
+        dataset = key.split(':')[0]
+        if self.backend is None:
+            return compute()
+
+        computed_at = time.time()
+        try:
+            entry = self.backend.get(key, computed_at)
+        except sqlite3.Error:
+            current_app.logger.exception("Summary cache read failed")
+            summary_cache_outcome(dataset, 'error')
+            return compute()
+
+        if entry is not None and entry[0] >= version:
+            summary_cache_outcome(dataset, 'hit')
+            return entry[1]
+
+        summary_cache_outcome(dataset, 'miss')
+        value = compute()
+        try:
+            self.backend.set(key, [version, value], computed_at + self.ttl, computed_at)
+        except sqlite3.Error:
+            current_app.logger.exception("Summary cache write failed")
+        return value
+
+    def drop(self, names):
+        if self.backend is None or not names:
+            return
+        try:
+            self.backend.invalidate(names, time.time())
+        except sqlite3.Error:
+            current_app.logger.exception("Summary cache invalidation failed, entries expire after the TTL")
+
+    def clear(self):
+        if self.backend is not None:
+            self.backend.clear()
+
+
+cache = SummaryCache()
+
+
+def invalidate(*names):
+    """Drop the named datasets ('lots', 'revenue', 'usage' for every user, 'usage:<id>') once this transaction commits."""
+    db.session.info.setdefault('summary_invalidations', set()).update(names)
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_invalidations(session):
+    names = session.info.pop('summary_invalidations', None)
+    if names:
+        cache.drop(sorted(names))
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_invalidations(session):
+    session.info.pop('summary_invalidations', None)
+
+
+def init_app(app):
+    kind = app.config['SUMMARY_CACHE']
+    if kind not in BACKENDS:
+        raise ValueError(f"SUMMARY_CACHE must be one of {', '.join(BACKENDS)}, not {kind!r}")
+
+    if kind == 'memory':
+        cache.configure(MemoryBackend(app.config['SUMMARY_CACHE_SIZE']), app.config['SUMMARY_CACHE_TTL'])
+    elif kind == 'sqlite':
+        path = app.config['SUMMARY_CACHE_PATH'] or os.path.join(app.instance_path, 'summary-cache.db')
+        os.makedirs(os.path.dirname(path) or '.', exist_ok = True)
+        cache.configure(SqliteBackend(path, app.config['SUMMARY_CACHE_SIZE']), app.config['SUMMARY_CACHE_TTL'])
+    else:
+        cache.configure(None)
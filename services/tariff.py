@@ -0,0 +1,261 @@
+from datetime import datetime, timedelta
+from decimal import Decimal, ROUND_HALF_UP, ROUND_FLOOR
+import numpy as np
+from pytz import timezone, UTC
+from models.models import db, ParkingSpot, ReservedSpots, ReservationHistory, LotTariff, LotRevenueDaily
+
+
+# Tariff engine. A session is billed at the hourly rate it was booked at (rate_at_booking), pro rata to the
+# second, with optional per-lot rules from lot_tariff:
+#   first_hour_rate  flat charge for the first hour (or any part of it), the hourly rules apply after that
+#   night_rate       hourly rate for time between night_start and night_end, IST
+#   daily_cap        most charged for each 24 hours counted from the parking time
+# charge() is exact Decimal arithmetic for single sessions. batch_charges() bills many sessions in one NumPy
+# pass and then reconciles: any result whose fraction of a paisa lies too close to the rounding boundary for
+# float64 to be trusted is recomputed exactly, so both paths always agree to the paisa.
+
+ist = timezone('Asia/Kolkata')
+
+DAY = 86400
+HOUR = 3600
+IST_OFFSET = 19800   # IST is UTC+05:30 all year
+PAISA = Decimal('0.01')
+EPOCH = datetime(1970, 1, 1, tzinfo = UTC)
+NAIVE_EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds = 1)
+
+RECONCILE_MARGIN = 1e-4   # in paise
+
+
+class Tariff:
+
+    def __init__(self, hourly, first_hour = None, daily_cap = None, night_rate = None, night_start = 22, night_end = 6):
+        self.hourly = Decimal(hourly or 0)
+        self.first_hour = None if first_hour is None else Decimal(first_hour)
+        self.daily_cap = None if daily_cap is None else Decimal(daily_cap)
+        self.night_rate = self.hourly if night_rate is None else Decimal(night_rate)
+        self.night_start = night_start * HOUR
+        self.night_length = ((night_end - night_start) % 24) * HOUR if night_rate is not None else 0
+
+    @classmethod
+    def for_lot(cls, hourly, lot_tariff = None):
+        if lot_tariff is None:
+            return cls(hourly)
+        return cls(hourly, lot_tariff.first_hour_rate, lot_tariff.daily_cap, lot_tariff.night_rate,
+                   lot_tariff.night_start, lot_tariff.night_end)
+
+
+def lot_tariffs(lot_ids):
+    """LotTariff rows by lot id for the lots that have one."""
+    lot_ids = set(lot_ids)
+    if not lot_ids:
+        return {}
+    return {row.lot_id: row for row in LotTariff.query.filter(LotTariff.lot_id.in_(lot_ids))}
+
+
+def tariff_for(lot_id, hourly):
+    return Tariff.for_lot(hourly, LotTariff.query.filter_by(lot_id = lot_id).first())
+
+
+def _seconds(moment):
+    """Exact seconds since the epoch; naive datetimes are UTC, as stored."""
+    if moment.tzinfo is None:
+        moment = UTC.localize(moment)
+    elapsed = moment - EPOCH
+    return Decimal(elapsed.days * DAY + elapsed.seconds) + Decimal(elapsed.microseconds) / 1000000
+
+
+def _microseconds(moments):
+    """int64 microseconds since the epoch for a list of datetimes (naive ones are UTC)."""
+    return np.fromiter(((m - (NAIVE_EPOCH if m.tzinfo is None else EPOCH)) // MICROSECOND for m in moments),
+                       dtype = np.int64, count = len(moments))
+
+
+def _night_before(tariff, t):
+    # night seconds between a fixed origin and t; the night in [a, b) is _night_before(b) - _night_before(a)
+    u = t + IST_OFFSET - tariff.night_start
+    days = (u / DAY).to_integral_value(rounding = ROUND_FLOOR)
+    return days * tariff.night_length + min(u - days * DAY, tariff.night_length)
+
+
+def _span(tariff, a, b):
+    night = _night_before(tariff, b) - _night_before(tariff, a)
+    return ((b - a - night) * tariff.hourly + night * tariff.night_rate) / HOUR
+
+
+def _block(tariff, a, b, first):
+    if first and tariff.first_hour is not None:
+        amount = tariff.first_hour + _span(tariff, min(a + HOUR, b), b)
+    else:
+        amount = _span(tariff, a, b)
+    return amount if tariff.daily_cap is None else min(amount, tariff.daily_cap)
+
+
+def _charge_seconds(tariff, start, end):
+    end = max(end, start)
+    days = (end - start) // DAY
+
+    if days == 0:
+        return _block(tariff, start, end, True)
+
+    # every whole day holds the same night hours
+    full_day = ((DAY - tariff.night_length) * tariff.hourly + tariff.night_length * tariff.night_rate) / HOUR
+    if tariff.daily_cap is not None:
+        full_day = min(full_day, tariff.daily_cap)
+
+    return (_block(tariff, start, start + DAY, True) + (days - 1) * full_day
+            + _block(tariff, start + days * DAY, end, False))
+
+
+def charge(tariff, start, end):
+    """Amount for parking from start to end under tariff, rounded to the paisa."""
+    return _charge_seconds(tariff, _seconds(start), _seconds(end)).quantize(PAISA, rounding = ROUND_HALF_UP)
+
+
+def reservation_charge(reservation, end = None):
+    """What the reservation costs when it ends at end (default: its leaving time, else now)."""
+    end = end or reservation.leaving_time or datetime.now(UTC)
+    return charge(tariff_for(reservation.spot.lot_id, reservation.rate_at_booking), reservation.parking_time, end)
+
+
+def _np_night_before(u, night_length):
+    days = np.floor(u / DAY)
+    return days * night_length + np.minimum(u - days * DAY, night_length)
+
+
+def _np_span(a, b, origin, hourly, night_rate, night_length):
+    night = _np_night_before(b + origin, night_length) - _np_night_before(a + origin, night_length)
+    return ((b - a - night) * hourly + night * night_rate) / HOUR
+
+
+def _np_block(a, b, first, p):
+    has_first = first & ~np.isnan(p['first_hour'])
+    split = np.where(has_first, np.minimum(a + HOUR, b), a)
+    amount = _np_span(split, b, p['origin'], p['hourly'], p['night_rate'], p['night_length'])
+    amount = amount + np.where(has_first, np.nan_to_num(p['first_hour']), 0.0)
+    return np.minimum(amount, p['daily_cap'])
+
+
+def batch_charges(rows, end = None):
+    """Bill many sessions at once.
+
+    rows are (key, lot_id, hourly rate, parking_time, leaving_time); sessions without a leaving time are billed
+    up to end (default now). Returns {key: Decimal}, identical to calling charge() on each row.
+    """
+    rows = list(rows)
+    if not rows:
+        return {}
+
+    end = end or datetime.now(UTC)
+    lot_rows = lot_tariffs(lot_id for _, lot_id, _, _, _ in rows)
+    tariffs, tariff_index = [], {}
+    index = np.empty(len(rows), dtype = np.intp)
+    for i, (_, lot_id, hourly, _, _) in enumerate(rows):
+        position = tariff_index.get((lot_id, hourly))
+        if position is None:
+            position = tariff_index[(lot_id, hourly)] = len(tariffs)
+            tariffs.append(Tariff.for_lot(hourly, lot_rows.get(lot_id)))
+        index[i] = position
+
+    def column(values):
+        return np.array(values, dtype = float)[index]
+
+    p = {'hourly': column([t.hourly for t in tariffs]),
+         'night_rate': column([t.night_rate for t in tariffs]),
+         'night_length': column([t.night_length for t in tariffs]),
+         'origin': column([IST_OFFSET - t.night_start for t in tariffs]),
+         'first_hour': column([np.nan if t.first_hour is None else t.first_hour for t in tariffs]),
+         'daily_cap': column([np.inf if t.daily_cap is None else t.daily_cap for t in tariffs])}
+
+    start = _microseconds([parking_time for _, _, _, parking_time, _ in rows])
+    stop = _microseconds([leaving_time or end for _, _, _, _, leaving_time in rows])
+
+    # count from midnight UTC before the earliest session, so the night windows stay aligned
+    base = (start.min() // (DAY * 1000000)) * DAY * 1000000
+    start = (start - base) / 1e6
+    stop = np.maximum((stop - base) / 1e6, start)
+
+    days = np.floor((stop - start) / DAY)
+    single = _np_block(start, stop, np.ones(len(rows), dtype = bool), p)
+
+    first_day = _np_block(start, start + DAY, np.ones(len(rows), dtype = bool), p)
+    full_day = np.minimum(((DAY - p['night_length']) * p['hourly'] + p['night_length'] * p['night_rate']) / HOUR,
+                          p['daily_cap'])
+    last_day = _np_block(start + days * DAY, stop, np.zeros(len(rows), dtype = bool), p)
+    multi = first_day + np.maximum(days - 1, 0) * full_day + last_day
+
+    paise = np.where(days == 0, single, multi) * 100
+    rounded = np.floor(paise + 0.5)
+    doubtful = np.abs(paise - np.floor(paise) - 0.5) < RECONCILE_MARGIN
+
+    charges = {}
+    for i, (key, _, _, parking_time, leaving_time) in enumerate(rows):
+        if doubtful[i]:   # exact-decimal reconciliation
+            charges[key] = charge(tariffs[index[i]], parking_time, leaving_time or end)
+        else:
+            charges[key] = Decimal(int(rounded[i])).scaleb(-2)
+    return charges
+
+
+def _session_rows(query, *extra, model = ReservedSpots):
+    return (query.with_entities(model.id, ParkingSpot.lot_id, model.rate_at_booking,
+                                model.parking_time, model.leaving_time, *extra)
+            .join(ParkingSpot, ParkingSpot.id == model.spot_id))
+
+
+def estimate_open(reservation_ids = None, lot_id = None, at = None):
+    """Running charge of open reservations as of at (default now): {reservation_id: Decimal}."""
+    query = _session_rows(ReservedSpots.query.filter(ReservedSpots.leaving_time == None))
+
+    if reservation_ids is not None:
+        if not reservation_ids:
+            return {}
+        query = query.filter(ReservedSpots.id.in_(reservation_ids))
+    if lot_id is not None:
+        query = query.filter(ParkingSpot.lot_id == lot_id)
+
+    return batch_charges(query.all(), end = at)
+
+
+def day_bounds(day):
+    """UTC start and end of an IST calendar day."""
+    start = ist.localize(datetime.combine(day, datetime.min.time()))
+    return start.astimezone(UTC), (start + timedelta(days = 1)).astimezone(UTC)
+
+
+def settle_day(day):
+    """End-of-day settlement for the IST date day.
+
+    Re-bills every reservation closed that day and compares per lot what was charged (total_cost), what the
+    tariffs give now, and what the revenue rollup recorded. Returns a list of dicts, one per lot.
+    """
+    start, end = day_bounds(day)
+    rows = _session_rows(ReservationHistory.query.filter(ReservationHistory.leaving_time >= start,
+                                                         ReservationHistory.leaving_time < end),
+                         ReservationHistory.total_cost, model = ReservationHistory).all()
+    computed = batch_charges(row[:5] for row in rows)
+
+    lots = {}
+    for reservation_id, lot_id, _, _, _, total_cost in rows:
+        lot = lots.setdefault(lot_id, {'lot_id': lot_id, 'sessions': 0, 'billed': Decimal('0.00'),
+                                       'computed': Decimal('0.00'), 'mismatched': []})
+        charged = Decimal(total_cost or 0).quantize(PAISA, rounding = ROUND_HALF_UP)
+        lot['sessions'] += 1
+        lot['billed'] += charged
+        lot['computed'] += computed[reservation_id]
+        if charged != computed[reservation_id]:
+            lot['mismatched'].append(reservation_id)
+
+    for lot_id, revenue, sessions in (db.session.query(LotRevenueDaily.lot_id, LotRevenueDaily.revenue,
+                                                       LotRevenueDaily.sessions)
+                                      .filter(LotRevenueDaily.day == day)):
+        lot = lots.setdefault(lot_id, {'lot_id': lot_id, 'sessions': 0, 'billed': Decimal('0.00'),
+                                       'computed': Decimal('0.00'), 'mismatched': []})
+        lot['rollup_revenue'] = Decimal(revenue)
+        lot['rollup_sessions'] = sessions
+
+    for lot in lots.values():
+        lot.setdefault('rollup_revenue', Decimal('0.00'))
+        lot.setdefault('rollup_sessions', 0)
+
+    return [lots[lot_id] for lot_id in sorted(lots)]
@@ -0,0 +1,125 @@
+import hashlib
+import random
+from functools import wraps
+from flask import current_app, request, session as flask_session
+from sqlalchemy import event, func, insert, inspect, update
+from sqlalchemy.orm import Session
+from models.models import db, ParkingLots, ParkingSpot, DataVersion
+
+
+# Data versions for conditional responses. Every transaction that changes application data bumps, in the same
+# commit, the version column of each lot whose details, counts or spots it changed (the writers hold those rows
+# already for the lot counters) and the global counter. The global counter is spread over GLOBAL_SHARDS rows of
+# data_version and each transaction bumps one picked at random, so writers do not all queue on one row lock;
+# the global version is their sum, which moves exactly when a change commits. A read view derives its ETag
+# from the counters its output depends on, so a revalidation costs one small query on data_version or
+# parking_lots and is answered with 304 without running the view.
+# Log tables that no response is built from do not count as data.
+
+UNVERSIONED = {'availability_event', 'anpr_event', 'data_version'}
+GLOBAL = 'global'
+GLOBAL_SHARDS = 16   # rows created by the data version shards migration
+GLOBAL_NAMES = [GLOBAL] + [f'{GLOBAL}:{shard}' for shard in range(1, GLOBAL_SHARDS)]
+
+_migrated = {}   # engine: whether data_version exists, checked once per process
+
+
+def lot_touched(lot_id):
+    """Bump the lot's version when the current transaction commits; ORM changes to lots and spots do it themselves."""
+    db.session.info.setdefault('touched_lots', set()).add(lot_id)
+
+
+def global_version():
+    return db.session.query(func.sum(DataVersion.version)).filter(DataVersion.name.in_(GLOBAL_NAMES)).scalar() or 0
+
+
+def lot_versions(lot_ids):
+    """{lot_id: version} for the lots that exist."""
+    return dict(db.session.query(ParkingLots.id, ParkingLots.version).filter(ParkingLots.id.in_(set(lot_ids))).all())
+
+
+def tag(*parts):
+    """Strong ETag value for the parts an output depends on."""
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
+def conditional(etag_for):
+    """Answer GET with 304 when the client's If-None-Match still matches etag_for(), else run the view and tag it.
+
+    Private, no-cache: browsers keep the response but revalidate it on every use.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            # pending flash messages would be rendered into the page, it is not the cached one
+            if request.method not in ('GET', 'HEAD') or '_flashes' in flask_session:
+                return view(*args, **kwargs)
+
+            etag = etag_for(*args, **kwargs)
+            if request.if_none_match.contains(etag):
+                response = current_app.response_class(status = 304)
+            else:
+                response = current_app.make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return wrapper
+    return decorator
+
+
+def _versioned(table):
+    return table is not None and getattr(table, 'name', None) not in UNVERSIONED
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _note_statement(orm_execute_state):
+    if (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete) \
+            and _versioned(getattr(orm_execute_state.statement, 'table', None)):
+        orm_execute_state.session.info['data_changed'] = True
+
+
+@event.listens_for(Session, 'after_flush')
+def _note_flush(session, flush_context):
+    for instance in (*session.new, *session.dirty, *session.deleted):
+        if not _versioned(getattr(instance, '__table__', None)):
+            continue
+        session.info['data_changed'] = True
+
+        lot_id = instance.id if isinstance(instance, ParkingLots) else getattr(instance, 'lot_id', None)
+        if isinstance(instance, (ParkingLots, ParkingSpot)) and lot_id is not None:
+            session.info.setdefault('touched_lots', set()).add(lot_id)
+
+
+@event.listens_for(Session, 'before_commit')
+def _bump_versions(session):
+    session.flush()   # so the changes still pending are noted too
+    lots = session.info.pop('touched_lots', None)
+    if not session.info.pop('data_changed', False) and not lots:
+        return
+
+    name = random.choice(GLOBAL_NAMES)
+    bump = update(DataVersion).where(DataVersion.name == name).values(version = DataVersion.version + 1)
+    engine = session.get_bind(clause = bump)
+    if engine not in _migrated:   # commits made before `flask db upgrade` created the table skip the bump
+        _migrated[engine] = inspect(session.connection(bind_arguments = {'bind': engine})).has_table('data_version')
+    if not _migrated[engine]:
+        return
+
+    if lots:
+        session.execute(update(ParkingLots).where(ParkingLots.id.in_(lots))
+                        .values(version = ParkingLots.version + 1).execution_options(synchronize_session = False))
+
+    result = session.execute(bump)
+    if result.rowcount == 0:   # first change since the table was created
+        session.execute(insert(DataVersion).values(name = name, version = 1))
+
+    session.info.pop('data_changed', None)   # set again by the statements above
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_changes(session):
+    session.info.pop('touched_lots', None)
+    session.info.pop('data_changed', None)
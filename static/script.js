@@ -30,16 +30,14 @@ function togglePassword() {
 
 const usrdashlot = document.getElementById('lotsearchBtn');
 
-if (usrdashlot) {
-  usrdashlot.addEventListener("click", async () => {
-    const query = document.getElementById('searchQuery').value; 
+async function loadLotPage(query, cursor) {
     const tbody = document.getElementById('lotResults');
-    tbody.innerHTML = "";
     try {
-      const response = await fetch('/user/api/parking-search', {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ query: query })  
+      // GET so the browser can keep the answer and revalidate it with its ETag (304 when nothing changed)
+      const params = new URLSearchParams({ query: query });
+      if (cursor) params.set('cursor', cursor);
+      const response = await fetch(`/user/api/parking-search?${params}`, {
+        headers: { 'Accept': 'application/json' }
       });
 
       if (!response.ok) {
@@ -50,7 +48,7 @@ if (usrdashlot) {
       const result = await response.json();
       console.log("Search results:", result);
 
-       if (result.parking_lots.length === 0) {
+       if (result.parking_lots.length === 0 && !cursor) {
             tbody.innerHTML = `<tr>
               <td colspan="4" class="text-muted">No parking lots found at this location.</td>
             </tr>`;
@@ -58,30 +56,160 @@ if (usrdashlot) {
         else {
             result.parking_lots.forEach(lot => {
               const row = document.createElement('tr');
+              row.dataset.lotRow = lot.id;
               row.innerHTML = `
                 <td>${lot.id}</td>
                 <td>${lot.address}</td>
-                <td>${lot.availability}</td>
+                <td data-lot-available="${lot.id}">${lot.availability}</td>
               `;
 
               const bookCell = document.createElement('td');
-              if (lot.availability > 0)
-              { 
-                bookCell.innerHTML = `<a href="/user/spot/book/${lot.id}" class="btn btn-primary btn-sm">Book</a>`;
-                row.appendChild(bookCell);
-              }
-              else {
-                row.appendChild(bookCell);
-              }
+              bookCell.dataset.lotBook = lot.id;
+              setBookButton(bookCell, lot.id, lot.availability);
+              row.appendChild(bookCell);
 
               tbody.appendChild(row);
             });
         }
+
+        if (result.next_cursor) {
+            const moreRow = document.createElement('tr');
+            moreRow.innerHTML = `<td colspan="4"><button class="btn btn-outline-dark btn-sm">Load more</button></td>`;
+            moreRow.querySelector('button').addEventListener("click", () => {
+              moreRow.remove();
+              loadLotPage(query, result.next_cursor);
+            });
+            tbody.appendChild(moreRow);
+        }
       
     } 
     catch (error) {
       console.error("Error:", error.message);
     }
+}
+
+function setBookButton(cell, lotId, availability) {
+    cell.innerHTML = availability > 0
+        ? `<a href="/user/spot/book/${lotId}" class="btn btn-primary btn-sm">Book</a>`
+        : '';
+}
+
+
+// Admin dashboard spot grids, drawn from the per-lot bitmaps of /admin/api/spot-bitmaps
+// (bit n-1 is spot_no n, least significant bit first; ids come as [first spot_no, first id, length] runs).
+function decodeBits(encoded) {
+    return Uint8Array.from(atob(encoded), c => c.charCodeAt(0));
+}
+
+function drawSpotGrid(grid, lot) {
+    const active = decodeBits(lot.active);
+    const occupied = decodeBits(lot.occupied);
+    const fragment = document.createDocumentFragment();
+
+    lot.ids.forEach(([firstNo, firstId, length]) => {
+        for (let i = 0; i < length; i++) {
+            const index = firstNo + i - 1;
+            const bit = 1 << (index & 7);
+            if (!(active[index >> 3] & bit)) {
+                continue;
+            }
+
+            const status = occupied[index >> 3] & bit ? 'O' : 'A';
+            const spot = document.createElement('a');
+            spot.href = `/admin/spot/view/${firstId + i}`;
+            spot.dataset.spotId = firstId + i;
+            spot.className = `btn spot-btn m-1 ${status === 'A' ? 'btn-success' : 'btn-danger'}`;
+            spot.title = `Spot #${firstNo + i}`;
+            spot.textContent = status;
+            fragment.appendChild(spot);
+        }
+    });
+
+    grid.replaceChildren(fragment);
+}
+
+async function loadSpotGrids(lotIds) {
+    if (lotIds.length === 0) {
+        return;
+    }
+
+    try {
+        const response = await fetch(`/admin/api/spot-bitmaps?lots=${lotIds.join(',')}`);
+        if (!response.ok) {
+            throw new Error(`spot bitmaps returned ${response.status}`);
+        }
+
+        const result = await response.json();
+        result.lots.forEach(lot => {
+            const grid = document.querySelector(`[data-spot-grid="${lot.lot_id}"]`);
+            if (grid) {
+                drawSpotGrid(grid, lot);
+            }
+        });
+    }
+    catch (error) {
+        console.error("Error:", error.message);
+    }
+}
+
+loadSpotGrids([...document.querySelectorAll('[data-spot-grid]')].map(grid => grid.dataset.spotGrid));
+
+
+// Live availability: patch lot counters and spot buttons in place from the server-sent event stream.
+function startAvailabilityFeed() {
+    if (!window.EventSource || !document.querySelector('[data-live-availability]')) {
+        return;
+    }
+
+    const source = new EventSource('/user/api/availability/stream');
+
+    source.addEventListener('lot', event => {
+        const lot = JSON.parse(event.data);
+
+        if (!lot.active) {
+            document.querySelectorAll(`[data-lot-card="${lot.lot_id}"], [data-lot-row="${lot.lot_id}"]`)
+                .forEach(el => el.remove());
+            return;
+        }
+
+        const maxspots = document.querySelector(`[data-lot-maxspots="${lot.lot_id}"]`);
+        if (maxspots && maxspots.textContent !== String(lot.maxspots)) {
+            loadSpotGrids([lot.lot_id]);   // resized, spots were added or removed
+        }
+
+        document.querySelectorAll(`[data-lot-occupied="${lot.lot_id}"]`).forEach(el => el.textContent = lot.occupied);
+        document.querySelectorAll(`[data-lot-maxspots="${lot.lot_id}"]`).forEach(el => el.textContent = lot.maxspots);
+        document.querySelectorAll(`[data-lot-available="${lot.lot_id}"]`).forEach(el => el.textContent = lot.available);
+        document.querySelectorAll(`[data-lot-book="${lot.lot_id}"]`)
+            .forEach(el => setBookButton(el, lot.lot_id, lot.available));
+    });
+
+    source.addEventListener('spot', event => {
+        const spot = JSON.parse(event.data);
+
+        document.querySelectorAll(`[data-spot-id="${spot.spot_id}"]`).forEach(el => {
+            if (spot.status === null) {
+                el.remove();
+                return;
+            }
+            el.textContent = spot.status;
+            el.classList.toggle('btn-success', spot.status === 'A');
+            el.classList.toggle('btn-danger', spot.status === 'O');
+        });
+    });
+
+    // the server could not replay everything missed while disconnected
+    source.addEventListener('reset', () => window.location.reload());
+}
+
+startAvailabilityFeed();
+
+
+if (usrdashlot) {
+  usrdashlot.addEventListener("click", () => {
+    const query = document.getElementById('searchQuery').value; 
+    document.getElementById('lotResults').innerHTML = "";
+    loadLotPage(query, null);
   });
 }
 
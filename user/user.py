@@ -1,18 +1,28 @@
-from flask import Blueprint, redirect, flash, url_for, render_template, request, jsonify, current_app
+from flask import Blueprint, redirect, flash, url_for, render_template, request, jsonify, current_app, Response
 from flask_security import auth_required, current_user
-from models.models import db, ParkingLots, ParkingSpot, ReservedSpots
-from sqlalchemy.exc import SQLAlchemyError
+from models.models import (db, ParkingLots, ReservedSpots, ReservationHistory, normalize_vehicle_number,
+                           VEHICLE_NUMBER_PATTERN)
+from sqlalchemy import update
+from sqlalchemy.exc import SQLAlchemyError, IntegrityError
 from forms.forms import ReleaseSpotForm, BookSpotFrom
 from datetime import datetime
 from pytz import timezone, UTC
 import re
-from decimal import Decimal
-from sqlalchemy import func
+from services.allocation import claim_spot, preview_spot, release_spot
+from services.revenue import record_revenue
+from services.search import ranked_lot_ids, pincode_entries, lots_in_order
+from services.pagination import keyset_page, list_page, page_size, InvalidCursor
+from services.metrics import booking_outcome, release_outcome
+from services.livefeed import feed
+from services.tariff import tariff_for, charge, estimate_open
+from services.replica import read_replica
+from services.versions import conditional, tag, global_version
+from services.summarycache import invalidate
 
 ist = timezone('Asia/Kolkata')
 user_bp = Blueprint('user', __name__, url_prefix='/user' , template_folder = 'templates/user'  )
 
-numberplte_pat = r'^(?:[A-Z]{2}\d{2}[A-Z]{1,2}\d{1,4}|\d{2}BH\d{4}[A-Z]{2})$'
+numberplte_pat = VEHICLE_NUMBER_PATTERN
 
 
 @user_bp.route('/spot/release/<int:rev_id>' , methods = ['GET' , 'POST'])
@@ -25,29 +35,51 @@ def spot_release(rev_id):
     form.parking_time.data =  UTC.localize(reservation.parking_time).astimezone(ist)
     form.spot_no.data = reservation.spot.spot_no    # not available in reservation table
 
-    elapsed_time =  form.leaving_time.data - form.parking_time.data
-    form.total_cost.data = (Decimal(elapsed_time.total_seconds()) /  Decimal(3600)) * reservation.rate_at_booking
+    tariff = tariff_for(reservation.spot.lot_id, reservation.rate_at_booking)
+    form.total_cost.data = charge(tariff, reservation.parking_time, form.leaving_time.data)
 
 
     if form.validate_on_submit():
-        reservation.leaving_time = datetime.now(UTC)
-        elapsed_seconds = (reservation.leaving_time - UTC.localize(reservation.parking_time)).total_seconds()
-        elapsed_hours = Decimal(elapsed_seconds) / Decimal(3600)
-        reservation.total_cost = elapsed_hours * reservation.rate_at_booking  # re-caulculated twice to prevent error due to delayed submission
-        spot = ParkingSpot.query.get(reservation.spot_id)
-        spot.status = 'A'
+        if reservation.leaving_time is not None:
+            release_outcome('already_released')
+            flash('Spot already released', 'danger')
+            return redirect(url_for('user.user_dashboard'))
+
+        leaving_time = datetime.now(UTC)
+        total_cost = charge(tariff, reservation.parking_time, leaving_time)  # re-caulculated twice to prevent error due to delayed submission
 
         try:
-            db.session.add(reservation)
+            # only an open reservation is closed, a concurrent release of the same reservation finds nothing to update
+            closed = db.session.execute(
+                update(ReservedSpots)
+                .where(ReservedSpots.id == rev_id, ReservedSpots.leaving_time == None)
+                .values(leaving_time = leaving_time, total_cost = total_cost)
+                .execution_options(synchronize_session = False)
+            ).rowcount
+
+            if closed != 1:
+                db.session.rollback()
+                release_outcome('already_released')
+                flash('Spot already released', 'danger')
+                return redirect(url_for('user.user_dashboard'))
+
+            # the reservation is closed either way; a spot that is not occupied is left as it is, like checkout does
+            if not release_spot(reservation.spot):
+                current_app.logger.warning("Reservation %s released but spot %s was not occupied",
+                                           rev_id, reservation.spot_id)
+
+            record_revenue(reservation.spot_id, reservation.spot.lot_id, leaving_time, total_cost)
             db.session.commit()
 
 
         except SQLAlchemyError:
             current_app.logger.exception("Failed to release spot")
             db.session.rollback()
+            release_outcome('error')
             flash('Error Spot not released' , 'danger')
-            return redirect(url_for('user.spot_release'))
+            return redirect(url_for('user.spot_release', rev_id = rev_id))
 
+        release_outcome('success')
         return redirect(url_for('user.user_dashboard'))
 
     return render_template('release_spot.html' , form = form , reservation = reservation)
@@ -61,12 +93,10 @@ def book_spot(lot_id):
 
     if request.method == 'GET':
         
-        available_spots = [spot for spot in lot.spots if spot.status == 'A']
-        if available_spots:
-            first_spot = sorted(available_spots, key=lambda spot: spot.id)[0]
-            first_spot.price = lot.price 
-            first_spot.user_id = current_user.id 
-            form = BookSpotFrom(obj = first_spot)
+        next_spot = preview_spot(lot.id) if lot.available_spots > 0 else None
+        if next_spot:
+            spot_id, spot_no = next_spot
+            form = BookSpotFrom(id = spot_id, spot_no = spot_no, price = lot.price, user_id = current_user.id)
 
         else:
             flash('No available spots choose another Lot', 'danger')
@@ -76,24 +106,35 @@ def book_spot(lot_id):
         form = BookSpotFrom()
 
         if form.validate_on_submit():
-            spot = ParkingSpot.query.filter_by(id=form.id.data.strip(), active=True).first_or_404()
+            _vehicle_number = normalize_vehicle_number(form.vehicle_number.data)
 
-            if spot.status == 'A':
-                _vehicle_number = form.vehicle_number.data.strip().upper()
+            if not re.match(numberplte_pat, _vehicle_number):
+                booking_outcome('invalid')
+                flash("Invalid vehicle number format", "danger")
+                return render_template('book_spot.html' , form = form, lot = lot )
 
-                if not re.match(numberplte_pat, _vehicle_number):
-                    flash("Invalid vehicle number format", "danger")
-                    return render_template('book_spot.html' , form = form, lot = lot )
+            #check for vehicle with same number parked (served by the partial unique index)
+            if ReservedSpots.query.filter(ReservedSpots.vehicle_number == _vehicle_number , 
+                ReservedSpots.leaving_time == None).first(): 
+                booking_outcome('duplicate')
+                flash("Vehicle With the Same Number is Already Parked, Enter New Number", "danger")
+                return render_template('book_spot.html' , form = form, lot = lot )
 
-                #check for vehicle with same number parked 
-                if ReservedSpots.query.filter(func.upper(ReservedSpots.vehicle_number) == _vehicle_number , 
-                    ReservedSpots.leaving_time == None).first(): 
-                    flash("Vehicle With the Same Number is Already Parked, Enter New Number", "danger")
-                    return render_template('book_spot.html' , form = form, lot = lot )
+            preferred = form.id.data.strip() if form.id.data else ''
 
+            try:
+                # the spot shown on GET is only a suggestion, another user may have taken it meanwhile
+                claimed = claim_spot(lot.id, preferred_id = int(preferred) if preferred.isdigit() else None)
 
+                if claimed is None:
+                    db.session.rollback()
+                    booking_outcome('no_spot')
+                    flash('No available spots choose another Lot', 'danger')
+                    return redirect(url_for('user.user_dashboard'))
+
+                spot_id, spot_no = claimed
                 reserved_spot = ReservedSpots (
-                    spot_id = spot.id,
+                    spot_id = spot_id,
                     user_id = current_user.id,
                     vehicle_number = _vehicle_number,
                     rate_at_booking = lot.price,
@@ -101,24 +142,23 @@ def book_spot(lot_id):
                     primename_at_booking = lot.primename,
                     ) 
 
-                try:
-                    spot.status = 'O'
-                    db.session.add(reserved_spot)
-                    db.session.commit()
-                    flash('Spot successfully reserved!', 'success')
-                    return redirect(url_for('user.user_dashboard'))
-
-                except SQLAlchemyError:
-                    current_app.logger.exception("Failed to reserve spot")
-                    db.session.rollback()
-                    flash('Spot not Reserved Due to Error', 'danger')
-
-            else:
-                flash('Spot not available choose another Spot', 'danger')
+                db.session.add(reserved_spot)
+                invalidate(f'usage:{current_user.id}')
+                db.session.commit()
+                booking_outcome('success')
+                flash(f'Spot {spot_no} successfully reserved!', 'success')
                 return redirect(url_for('user.user_dashboard'))
 
-            flash('Spot Successfully Booked' , 'success')
-            return redirect(url_for('user.user_dashboard'))
+            except IntegrityError:   # same vehicle booked concurrently, the index refused the second one
+                db.session.rollback()
+                booking_outcome('duplicate')
+                flash("Vehicle With the Same Number is Already Parked, Enter New Number", "danger")
+
+            except SQLAlchemyError:
+                current_app.logger.exception("Failed to reserve spot")
+                db.session.rollback()
+                booking_outcome('error')
+                flash('Spot not Reserved Due to Error', 'danger')
 
 
     return render_template('book_spot.html' , form = form, lot = lot )
@@ -128,42 +168,81 @@ def book_spot(lot_id):
 @user_bp.route('/dashboard' , methods = ['GET' , 'POST'])
 @auth_required()
 def user_dashboard():
-    parking_lots = ParkingLots.query.all()
+    try:
+        # archived reservations included, see services.archive
+        reservations, next_cursor = keyset_page(ReservationHistory.query.filter_by(user_id = current_user.id),
+                                                [ReservationHistory.id], request.args.get('cursor'),
+                                                page_size(request.args.get('size')), descending = True)
+    except InvalidCursor:
+        return redirect(url_for('user.user_dashboard'))
+
+    estimates = estimate_open([r.id for r in reservations if r.leaving_time is None])   # one batch for the page
+
+    return render_template('user_dash.html' ,  user = current_user , reservations = reservations ,
+                           estimates = estimates , next_cursor = next_cursor , paged = 'cursor' in request.args)
+
+
+@user_bp.route('/api/availability/stream', methods = ['GET'])
+@auth_required()
+def availability_stream():
+    last_event_id = request.headers.get('Last-Event-ID', '')
+    subscription = feed.subscribe(current_app._get_current_object(),
+                                  int(last_event_id) if last_event_id.isdigit() else None)
+
+    def stream():   # runs after the request context (and its DB session) is gone
+        try:
+            yield from subscription.messages()
+        finally:
+            feed.unsubscribe(subscription)
 
-    for lot in parking_lots:
-        lot.availability  = sum(1 for spot in lot.spots if spot.status == 'A')
+    return Response(stream(), mimetype = 'text/event-stream',
+                    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 
-    reservations = ReservedSpots.query.filter_by(user_id = current_user.id).all()
+@user_bp.app_template_filter('ist')
+def ist_time(value):
+    if value.tzinfo is None:
+        value = UTC.localize(value)
+    return value.astimezone(ist)
 
-    for reservation in reservations:
-        utc_time = UTC.localize(reservation.parking_time)
-        reservation.parking_time = utc_time.astimezone(ist)
-        reservation.location = reservation.location_at_booking
 
-    return render_template('user_dash.html' ,  user = current_user , reservations = reservations)
+def _search_etag():
+    return tag('search', sorted(request.args.items(multi = True)), global_version())
 
 
-@user_bp.route('/api/parking-search', methods = ['POST'])   # put /user when acessing 
+@user_bp.route('/api/parking-search', methods = ['GET', 'POST'])   # put /user when acessing 
 @auth_required()
+@read_replica
+@conditional(_search_etag)
 def parking_search():
-    data = request.get_json()
+    # GET takes the same fields as query parameters, so browsers can revalidate with If-None-Match
+    data = request.args if request.method == 'GET' else (request.get_json(silent = True) or {})
     query = data.get('query', '').strip()
+    cursor = data.get('cursor')
+    size = page_size(data.get('limit'))
 
-    if not query:
-        results = ParkingLots.query.all()
+    try:
+        if not query:
+            results, next_cursor = keyset_page(ParkingLots.query.filter_by(active = True), [ParkingLots.id], cursor, size)
 
+        elif query.isdigit():
+            # pages follow pincode order, a key that bookings cannot move; availability only reorders a page
+            ids, next_cursor = list_page(pincode_entries(query), cursor, size)
+            results = lots_in_order(ids)
+            if data.get('order') == 'availability':
+                results.sort(key = lambda lot: -lot.available_spots)
 
-    if query.isdigit():
-        results = ParkingLots.query.filter(ParkingLots.pincode.ilike(f"%{query}%")).all()
-    else:
-        results = ParkingLots.query.filter(ParkingLots.address.ilike(f"%{query}%")).all()
+        else:
+            ids, next_cursor = list_page(ranked_lot_ids(query), cursor, size)   # ranked, best match first
+            results = lots_in_order(ids)
+
+    except InvalidCursor:
+        return jsonify({'error': 'Invalid cursor'}), 400
 
 
     response = []
     for lot in results:
-        available_spots = sum(1 for spot in lot.spots if spot.status == 'A' )
-        response.append({'id': lot.id,  'address': lot.address,  'pincode': lot.pincode, 'availability':available_spots })
+        response.append({'id': lot.id,  'address': lot.address,  'pincode': lot.pincode, 'availability':lot.available_spots })
 
 
-    return jsonify( {"parking_lots" : response } )
+    return jsonify( {"parking_lots" : response , "next_cursor" : next_cursor } )